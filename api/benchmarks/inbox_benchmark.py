@@ -0,0 +1,148 @@
+"""Benchmark de la boîte de réception (CRUDMessage.get_user_conversations).
+
+Usage :
+    python benchmarks/inbox_benchmark.py [--sizes 10 50 200] [--messages 20] [--runs 20]
+
+Crée une base SQLite temporaire, y insère un utilisateur possédant N
+conversations (gardes et conseils, M messages chacune), puis mesure le nombre
+de requêtes SQL et la durée d'une page de boîte de réception contenant les N
+conversations.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from models.user import User
+from models.plant import Plant
+from models.plant_care import PlantCare
+from models.advice import Advice
+from models.message import Conversation, ConversationParticipant, Message, ConversationType
+from crud.message import message as message_crud
+
+
+def seed(db, conversations_count: int, messages_per_conversation: int) -> int:
+    """Insère les données du benchmark et retourne l'ID de l'utilisateur"""
+    owner = User(email="owner@example.com", nom="Martin", prenom="Julie")
+    db.add(owner)
+    db.flush()
+    plant = Plant(nom="Rose", espece="Rosa", owner_id=owner.id)
+    db.add(plant)
+    db.flush()
+
+    now = datetime.utcnow()
+    for i in range(conversations_count):
+        other = User(email=f"user{i}@example.com", nom="Dubois", prenom=f"Pierre {i}")
+        db.add(other)
+        db.flush()
+
+        if i % 2:
+            related = Advice(texte="Arroser peu", plant_id=plant.id, botanist_id=other.id)
+            conversation_type = ConversationType.BOTANICAL_ADVICE
+        else:
+            related = PlantCare(
+                plant_id=plant.id,
+                owner_id=owner.id,
+                caretaker_id=other.id,
+                start_date=now,
+                end_date=now + timedelta(days=7)
+            )
+            conversation_type = ConversationType.PLANT_CARE
+        db.add(related)
+        db.flush()
+
+        conversation = Conversation(type=conversation_type, related_id=related.id)
+        db.add(conversation)
+        db.flush()
+        db.add_all([
+            ConversationParticipant(conversation_id=conversation.id, user_id=owner.id),
+            ConversationParticipant(conversation_id=conversation.id, user_id=other.id)
+        ])
+        db.add_all([
+            Message(
+                content=f"Message {j} de la conversation {i}",
+                conversation_id=conversation.id,
+                sender_id=other.id if j % 2 else owner.id,
+                created_at=now + timedelta(seconds=j)
+            )
+            for j in range(messages_per_conversation)
+        ])
+    db.commit()
+    # Les messages sont insérés directement : remplir les résumés
+    message_crud.rebuild_summaries(db)
+    return owner.id
+
+
+def run(conversations_count: int, messages_per_conversation: int, runs: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{tmp_dir}/inbox_benchmark.db")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        user_id = seed(db, conversations_count, messages_per_conversation)
+
+        query_count = 0
+
+        def count_queries(*args):
+            nonlocal query_count
+            query_count += 1
+
+        event.listen(engine, "before_cursor_execute", count_queries)
+
+        durations = []
+        for _ in range(runs):
+            db.expire_all()
+            query_count = 0
+            start = time.perf_counter()
+            message_crud.get_user_conversations(db, user_id=user_id, limit=conversations_count)
+            durations.append((time.perf_counter() - start) * 1000)
+
+        db.close()
+        engine.dispose()
+
+    return {
+        "conversations": conversations_count,
+        "queries": query_count,
+        "median_ms": statistics.median(durations),
+        "max_ms": max(durations)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--messages", type=int, default=20, help="Messages par conversation")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    # Les logs DEBUG de la boîte de réception faussent les mesures
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+    try:
+        results = [run(size, args.messages, args.runs) for size in args.sizes]
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print(f"{'conversations':>13} | {'requêtes':>8} | {'médiane (ms)':>12} | {'max (ms)':>9}")
+    for result in results:
+        print(
+            f"{result['conversations']:>13} | {result['queries']:>8} | "
+            f"{result['median_ms']:>12.2f} | {result['max_ms']:>9.2f}"
+        )
+
+    if len({result["queries"] for result in results}) > 1:
+        print("ERREUR : le nombre de requêtes dépend du nombre de conversations")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
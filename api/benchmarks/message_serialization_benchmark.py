@@ -0,0 +1,135 @@
+"""Benchmark de la sérialisation d'une page de messages.
+
+Usage :
+    python benchmarks/message_serialization_benchmark.py [--page-sizes 20 50 200] [--runs 200]
+
+Compare, sur une base SQLite temporaire, le chemin historique de
+`GET /messages/conversations/{id}/messages` (objets ORM, `to_dict()`,
+conversions `int(float(...))`, validation par `List[Message]` puis
+`json.dumps`) au chemin actuel (tuples de colonnes encodés par orjson).
+Les deux corps de réponse doivent être identiques octet pour octet.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from models.user import User
+from models.message import Message, ConversationType
+from schemas.message import Message as MessageSchema
+from crud.message import message as message_crud
+
+messages_adapter = TypeAdapter(List[MessageSchema])
+
+
+def seed(db, messages_count: int) -> int:
+    """Insère une conversation de `messages_count` messages et retourne son ID"""
+    owner = User(email="owner@example.com", nom="Martin", prenom="Julie")
+    caretaker = User(email="caretaker@example.com", nom="Dubois", prenom="Pierre")
+    db.add_all([owner, caretaker])
+    db.flush()
+    conversation = message_crud.create_conversation(
+        db,
+        participant_ids=[owner.id, caretaker.id],
+        conversation_type=ConversationType.PLANT_CARE
+    )
+    now = datetime.utcnow()
+    db.add_all([
+        Message(
+            content=f"Message {i} : arrosage, exposition et rempotage de la plante",
+            conversation_id=conversation.id,
+            sender_id=caretaker.id if i % 2 else owner.id,
+            created_at=now + timedelta(seconds=i),
+            updated_at=now + timedelta(seconds=i)
+        )
+        for i in range(messages_count)
+    ])
+    db.commit()
+    message_crud.rebuild_summaries(db)
+    message_crud.mark_messages_as_read(db, conversation.id, caretaker.id)
+    return conversation.id
+
+
+def legacy_page(db, conversation_id: int, limit: int) -> bytes:
+    """Chemin historique : ORM, to_dict(), validation Pydantic puis json.dumps"""
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+        .all()
+    )
+    watermarks = message_crud.get_read_watermarks(db, conversation_id)
+    result = []
+    for message in messages:
+        msg_dict = message_crud._message_dict(message, watermarks)
+        msg_dict["id"] = int(float(msg_dict["id"]))
+        msg_dict["conversation_id"] = int(float(msg_dict["conversation_id"]))
+        if msg_dict["sender_id"]:
+            msg_dict["sender_id"] = int(float(msg_dict["sender_id"]))
+        result.append(msg_dict)
+    # Ce que FastAPI fait avec `response_model=List[Message]` et JSONResponse
+    validated = messages_adapter.validate_python(result)
+    content = messages_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_page(db, conversation_id: int, limit: int) -> bytes:
+    """Chemin actuel : tuples de colonnes encodés par orjson"""
+    return ORJSONResponse(message_crud.get_conversation_messages(db, conversation_id, limit=limit)).body
+
+
+def measure(function, db, conversation_id: int, limit: int, runs: int) -> float:
+    durations = []
+    for _ in range(runs):
+        db.expire_all()
+        start = time.perf_counter()
+        function(db, conversation_id, limit)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[20, 50, 200])
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{tmp_dir}/serialization_benchmark.db")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        conversation_id = seed(db, max(args.page_sizes))
+
+        print(f"{'messages':>8} | {'historique (ms)':>15} | {'orjson (ms)':>11} | {'gain':>6}")
+        identical = True
+        for page_size in args.page_sizes:
+            identical &= legacy_page(db, conversation_id, page_size) == fast_page(db, conversation_id, page_size)
+            legacy_ms = measure(legacy_page, db, conversation_id, page_size, args.runs)
+            fast_ms = measure(fast_page, db, conversation_id, page_size, args.runs)
+            print(f"{page_size:>8} | {legacy_ms:>15.3f} | {fast_ms:>11.3f} | {legacy_ms / fast_ms:>5.1f}x")
+
+        db.close()
+        engine.dispose()
+
+    if not identical:
+        print("ERREUR : les deux chemins ne produisent pas le même JSON")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
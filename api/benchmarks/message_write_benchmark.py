@@ -0,0 +1,124 @@
+"""Benchmark de l'écriture des messages WebSocket, avec et sans écriture groupée.
+
+Usage :
+    python benchmarks/message_write_benchmark.py [--senders 50] [--messages 20] [--conversations 25]
+                                                 [--windows 0 2 5] [--database-url postgresql://...]
+
+Simule `--senders` sockets qui envoient chacune `--messages` messages à la
+suite (une socket attend l'écriture de son message avant le suivant), via
+`MessageWriteCoalescer` comme `ConnectionManager.handle_messages`. Pour
+chaque fenêtre (en millisecondes, 0 : un commit par message), affiche le
+débit, la latence d'écriture p50/p99, le nombre de commits et la taille
+moyenne des lots. Sans `--database-url`, une base SQLite temporaire sur
+disque est utilisée (un fsync par commit) ; une base PostgreSQL doit être vide.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from utils.db_executor import run_in_session
+from scripts.upgrade_schema import upgrade_schema
+from models.user import User
+from models.message import Conversation, ConversationParticipant, ConversationType
+from schemas.message import MessageBatchItem
+from services.websocket.write_coalescer import MessageWriteCoalescer
+
+
+def seed(db, senders: int, conversations_count: int):
+    """Insère les expéditeurs et leurs conversations ; retourne (sender_id, conversation_id) par socket"""
+    users = [User(email=f"sender{i}@example.com", nom="Dubois", prenom=f"Pierre {i}") for i in range(senders)]
+    db.add_all(users)
+    conversations = [Conversation(type=ConversationType.PLANT_CARE) for _ in range(conversations_count)]
+    db.add_all(conversations)
+    db.flush()
+    sockets = []
+    for i, user in enumerate(users):
+        conversation = conversations[i % conversations_count]
+        db.add(ConversationParticipant(conversation_id=conversation.id, user_id=user.id))
+        sockets.append((user.id, conversation.id))
+    db.commit()
+    return sockets
+
+
+async def run(session_factory, sockets, messages: int, window: float) -> dict:
+    coalescer = MessageWriteCoalescer(
+        lambda func, *args, **kwargs: run_in_session(session_factory, func, *args, **kwargs),
+        window=window
+    )
+    latencies = []
+
+    async def send(sender_id: int, conversation_id: int):
+        for i in range(messages):
+            started = time.perf_counter()
+            await coalescer.create_messages(
+                conversation_id,
+                [MessageBatchItem(content=f"Message {i} de {sender_id}", client_msg_id=f"{window}-{sender_id}-{i}")],
+                sender_id
+            )
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(sender_id, conversation_id) for sender_id, conversation_id in sockets))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--senders", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=25)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 2, 5])
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(
+            args.database_url or f"sqlite:///{tmp_dir}/message_write_benchmark.db",
+            pool_size=10,
+            max_overflow=0
+        )
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        sockets = seed(db, args.senders, args.conversations)
+        db.close()
+
+        commits = [0]
+
+        @event.listens_for(session_factory, "after_commit")
+        def count_commit(session):
+            commits[0] += 1
+
+        total = args.senders * args.messages
+        print(f"{args.senders} sockets × {args.messages} messages, {args.conversations} conversations ({engine.dialect.name})")
+        print(f"{'fenêtre':>8} {'msg/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'commits':>8} {'lot moyen':>10}")
+        for window_ms in args.windows:
+            commits[0] = 0
+            result = asyncio.run(run(session_factory, sockets, args.messages, window_ms / 1000))
+            print(
+                f"{window_ms:>6g}ms {result['throughput']:>9.0f} {result['p50']:>9.1f} {result['p99']:>9.1f} "
+                f"{commits[0]:>8} {total / max(commits[0], 1):>10.1f}"
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
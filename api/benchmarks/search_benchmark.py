@@ -0,0 +1,138 @@
+"""Benchmark de la recherche plein texte (CRUDMessage.search_messages).
+
+Usage :
+    python benchmarks/search_benchmark.py [--messages 1000000] [--conversations 5000]
+                                          [--database-url postgresql://...] [--runs 20]
+
+Génère un jeu de messages synthétiques (vocabulaire de jardinage) répartis
+sur N conversations, dont 50 appartiennent à l'utilisateur mesuré, puis
+mesure la recherche d'un terme fréquent, d'un terme rare et d'une page
+suivante (curseur). Sans `--database-url`, une base SQLite temporaire
+(FTS5) est utilisée ; une base PostgreSQL doit être vide (index GIN).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from scripts.upgrade_schema import upgrade_schema
+from models.user import User
+from models.message import Conversation, ConversationParticipant, Message, ConversationType
+from crud.message import message as message_crud
+
+VOCABULARY = (
+    "arrosage arroser plante feuille feuilles racine racines terreau pot rempotage "
+    "soleil ombre lumière engrais fleur fleurs tige bouture taille tailler eau pluie "
+    "semaine matin soir balcon fenêtre cactus orchidée basilic monstera ficus "
+    "humidité substrat drainage parasite cochenille jaunissement arrosée bien merci"
+).split()
+RARE_TERM = "kalanchoé"
+INSERT_BATCH_SIZE = 10000
+USER_CONVERSATIONS = 50
+
+
+def seed(db, messages_count: int, conversations_count: int) -> int:
+    """Insère le jeu de données et retourne l'ID de l'utilisateur mesuré"""
+    rng = random.Random(42)
+    users = [User(email=f"user{i}@example.com", nom="Dubois", prenom=f"Pierre {i}") for i in range(100)]
+    db.add_all(users)
+    db.flush()
+    user_ids = [user.id for user in users]
+
+    conversations = [Conversation(type=ConversationType.PLANT_CARE) for _ in range(conversations_count)]
+    db.add_all(conversations)
+    db.flush()
+    participants = []
+    for i, conversation in enumerate(conversations):
+        first = user_ids[0] if i < USER_CONVERSATIONS else rng.choice(user_ids[1:])
+        second = rng.choice([user_id for user_id in user_ids[1:] if user_id != first])
+        participants += [
+            {"conversation_id": conversation.id, "user_id": first},
+            {"conversation_id": conversation.id, "user_id": second}
+        ]
+    db.execute(insert(ConversationParticipant), participants)
+    db.commit()
+
+    conversation_ids = [conversation.id for conversation in conversations]
+    start = datetime.utcnow() - timedelta(days=365)
+    for offset in range(0, messages_count, INSERT_BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + INSERT_BATCH_SIZE, messages_count)):
+            words = rng.choices(VOCABULARY, k=rng.randint(5, 25))
+            conversation_id = rng.choice(conversation_ids)
+            if i % 10000 == 0:
+                words.append(RARE_TERM)
+                conversation_id = conversation_ids[i % USER_CONVERSATIONS]
+            created_at = start + timedelta(seconds=i * 30)
+            rows.append({
+                "content": " ".join(words),
+                "conversation_id": conversation_id,
+                "sender_id": rng.choice(user_ids),
+                "created_at": created_at,
+                "updated_at": created_at,
+                "is_read": False
+            })
+        db.execute(insert(Message), rows)
+        db.commit()
+        print(f"  {min(offset + INSERT_BATCH_SIZE, messages_count)} / {messages_count} messages", end="\r")
+    print()
+    return user_ids[0]
+
+
+def measure(db, user_id: int, query: str, runs: int, before_id=None):
+    durations = []
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        results = message_crud.search_messages(db, user_id=user_id, query=query, before_id=before_id, limit=20)
+        durations.append((time.perf_counter() - start) * 1000)
+    return len(results), statistics.median(durations), max(durations), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(args.database_url or f"sqlite:///{tmp_dir}/search_benchmark.db")
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        db = sessionmaker(bind=engine)()
+
+        print(f"Génération de {args.messages} messages ({engine.dialect.name})...")
+        start = time.perf_counter()
+        user_id = seed(db, args.messages, args.conversations)
+        print(f"Données et index générés en {time.perf_counter() - start:.1f} s")
+
+        print(f"{'recherche':>22} | {'résultats':>9} | {'médiane (ms)':>12} | {'max (ms)':>9}")
+        count, median_ms, max_ms, results = measure(db, user_id, "arrosage", args.runs)
+        print(f"{'terme fréquent':>22} | {count:>9} | {median_ms:>12.2f} | {max_ms:>9.2f}")
+        if results:
+            count, median_ms, max_ms, _ = measure(db, user_id, "arrosage", args.runs, before_id=results[-1]["id"])
+            print(f"{'page suivante':>22} | {count:>9} | {median_ms:>12.2f} | {max_ms:>9.2f}")
+        count, median_ms, max_ms, _ = measure(db, user_id, "arrosage racines terreau", args.runs)
+        print(f"{'plusieurs termes':>22} | {count:>9} | {median_ms:>12.2f} | {max_ms:>9.2f}")
+        count, median_ms, max_ms, _ = measure(db, user_id, RARE_TERM, args.runs)
+        print(f"{'terme rare':>22} | {count:>9} | {median_ms:>12.2f} | {max_ms:>9.2f}")
+
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Test de charge des WebSockets de messagerie (un worker d'API).
+
+Usage :
+    python benchmarks/websocket_load_benchmark.py [--clients 200] [--conversations 50]
+        [--duration 30] [--message-rate 0.2] [--typing-rate 0.5]
+        [--database-url postgresql://...] [--redis-host 127.0.0.1]
+        [--url http://127.0.0.1:8000]
+
+Crée N utilisateurs répartis dans M conversations, ouvre pour chacun une
+socket `/ws/{conversation_id}` authentifiée, puis envoie pendant
+`--duration` secondes des messages et des trames de frappe selon des
+processus de Poisson (taux par client et par seconde). Le rapport donne :
+
+- les percentiles p50/p95/p99 du délai entre l'envoi d'un message et sa
+  réception par chacun des autres participants ;
+- les messages jamais reçus, et les trames abandonnées ou sockets fermées
+  côté serveur (`/metrics`) ;
+- le CPU et la mémoire (RSS) du worker, lus dans `/metrics`.
+
+Sans `--url`, un worker uvicorn est lancé sur une base SQLite temporaire
+(ou sur `--database-url`, à fournir vide) ; `--redis-host` active la
+diffusion Redis. Avec `--url`, le serveur doit utiliser la même base
+(`--database-url`) et la même SECRET_KEY que ce script.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List
+
+# Ajouter le répertoire parent au PYTHONPATH
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(API_DIR)
+
+import websockets
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from utils.database import Base
+from utils.security import create_access_token
+from scripts.upgrade_schema import upgrade_schema
+from models.user import User
+from models.message import Conversation, ConversationParticipant, ConversationType
+
+CONNECT_CONCURRENCY = 50  # ouvertures de sockets simultanées
+SERVER_METRICS = {
+    "cpu_seconds": "process_cpu_seconds_total",
+    "rss_bytes": "process_resident_memory_bytes",
+    "dropped_frames": "arosaje_websocket_dropped_frames_total",
+    "slow_consumer_disconnects": "arosaje_websocket_slow_consumer_disconnects_total"
+}
+
+
+class LoadStats:
+    """Mesures côté clients, partagées par toutes les sockets"""
+
+    def __init__(self):
+        # {client_msg_id: (instant d'envoi, destinataires attendus)}
+        self.sent: Dict[str, tuple] = {}
+        self.latencies: List[float] = []
+        self.delivered = 0
+        self.typing_sent = 0
+        self.typing_received = 0
+        self.errors = 0
+        self.closed = 0
+        # Mesures du worker, lues dans /metrics
+        self.elapsed = 0.0
+        self.cpu_percent = 0.0
+        self.peak_rss = 0.0
+        self.dropped_frames = 0.0
+        self.slow_consumer_disconnects = 0.0
+
+
+def seed(database_url: str, clients: int, conversations: int):
+    """Crée les utilisateurs et conversations ; retourne [(user_id, conversation_id)]"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = sessionmaker(bind=engine)()
+    users = [
+        User(email=f"load{i}@example.com", nom="Charge", prenom=f"Client {i}", is_verified=True)
+        for i in range(clients)
+    ]
+    db.add_all(users)
+    db.flush()
+    rows = [Conversation(type=ConversationType.PLANT_CARE) for _ in range(conversations)]
+    db.add_all(rows)
+    db.flush()
+    placement = [(user.id, rows[i % conversations].id) for i, user in enumerate(users)]
+    db.execute(insert(ConversationParticipant), [
+        {"conversation_id": conversation_id, "user_id": user_id}
+        for user_id, conversation_id in placement
+    ])
+    db.commit()
+    db.close()
+    engine.dispose()
+    return placement
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, redis_host: str, port: int) -> subprocess.Popen:
+    """Lance un worker uvicorn, sans sortie console ni SMTP joignable"""
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        MAIL_USERNAME="load@example.com",
+        MAIL_PASSWORD="load",
+        MAIL_FROM="load@example.com",
+        MAIL_SERVER="127.0.0.1",
+        MAIL_PORT="1",
+        WEBSOCKET_FANOUT_BACKEND="redis" if redis_host else "memory"
+    )
+    if redis_host:
+        env["REDIS_HOST"] = redis_host
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", "1"],
+        cwd=API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def read_metrics(base_url: str) -> Dict[str, float]:
+    """Somme des séries des métriques suivies dans `/metrics`"""
+    with urllib.request.urlopen(f"{base_url}/metrics", timeout=5) as response:
+        text = response.read().decode()
+    values = dict.fromkeys(SERVER_METRICS, 0.0)
+    for line in text.splitlines():
+        for key, name in SERVER_METRICS.items():
+            if line.startswith(name) and line[len(name)] in " {":
+                values[key] += float(line.rsplit(" ", 1)[1])
+    return values
+
+
+def wait_for_server(base_url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return read_metrics(base_url)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+async def run_client(ws_url, user_id, conversation_id, peers, args, stats, ready, start, stop, connect_slots):
+    token = create_access_token({"sub": str(user_id)})
+    async with connect_slots:
+        websocket = await websockets.connect(
+            f"{ws_url}/ws/{conversation_id}?token={token}",
+            max_size=None,
+            ping_interval=None,
+            open_timeout=30
+        )
+    ready()
+
+    async def receive():
+        async for raw in websocket:
+            frame = json.loads(raw)
+            if frame.get("type") == "new_message":
+                client_msg_id = frame["message"].get("client_msg_id")
+                if frame["message"]["sender_id"] != user_id and client_msg_id in stats.sent:
+                    stats.latencies.append(time.perf_counter() - stats.sent[client_msg_id][0])
+                    stats.delivered += 1
+            elif frame.get("type") == "typing_status":
+                stats.typing_received += 1
+            elif frame.get("type") == "error":
+                stats.errors += 1
+
+    async def send():
+        rng = random.Random(user_id)
+        next_message = next_typing = time.perf_counter()
+        next_message += rng.expovariate(args.message_rate) if args.message_rate else float("inf")
+        next_typing += rng.expovariate(args.typing_rate) if args.typing_rate else float("inf")
+        sequence = 0
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now >= next_message:
+                sequence += 1
+                client_msg_id = f"load-{user_id}-{sequence}"
+                stats.sent[client_msg_id] = (time.perf_counter(), peers - 1)
+                await websocket.send(json.dumps({
+                    "type": "message",
+                    "content": f"Message de charge {sequence} : arrosage du basilic",
+                    "client_msg_id": client_msg_id
+                }))
+                next_message += rng.expovariate(args.message_rate)
+            elif now >= next_typing:
+                stats.typing_sent += 1
+                await websocket.send(json.dumps({"type": "typing", "is_typing": True}))
+                next_typing += rng.expovariate(args.typing_rate)
+            else:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=min(next_message, next_typing) - now)
+                except asyncio.TimeoutError:
+                    pass
+
+    receiver = asyncio.create_task(receive())
+    try:
+        await start.wait()
+        await send()
+        await asyncio.sleep(args.drain)  # Laisser arriver les derniers messages
+    except websockets.ConnectionClosed:
+        stats.closed += 1
+    finally:
+        receiver.cancel()
+        await websocket.close()
+
+
+async def run_load(base_url: str, placement, args) -> LoadStats:
+    stats = LoadStats()
+    ws_url = base_url.replace("http", "ws", 1)
+    peers: Dict[int, int] = {}
+    for _, conversation_id in placement:
+        peers[conversation_id] = peers.get(conversation_id, 0) + 1
+
+    connected = {"count": 0}
+    all_ready, start, stop = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+    def ready():
+        connected["count"] += 1
+        if connected["count"] == len(placement):
+            all_ready.set()
+
+    connect_slots = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    started = time.perf_counter()
+    clients = [
+        asyncio.create_task(run_client(
+            ws_url, user_id, conversation_id, peers[conversation_id],
+            args, stats, ready, start, stop, connect_slots
+        ))
+        for user_id, conversation_id in placement
+    ]
+    await asyncio.wait_for(all_ready.wait(), timeout=120)
+    print(f"{len(placement)} sockets ouvertes en {time.perf_counter() - started:.1f} s")
+    await asyncio.sleep(1)  # Fin des accès base des connexions
+
+    metrics_before = await asyncio.to_thread(read_metrics, base_url)
+    peak_rss = metrics_before["rss_bytes"]
+    started = time.perf_counter()
+    start.set()
+    while time.perf_counter() - started < args.duration:
+        await asyncio.sleep(1)
+        peak_rss = max(peak_rss, (await asyncio.to_thread(read_metrics, base_url))["rss_bytes"])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*clients, return_exceptions=True)
+    metrics_after = await asyncio.to_thread(read_metrics, base_url)
+
+    stats.elapsed = elapsed
+    stats.cpu_percent = 100 * (metrics_after["cpu_seconds"] - metrics_before["cpu_seconds"]) / elapsed
+    stats.peak_rss = max(peak_rss, metrics_after["rss_bytes"])
+    stats.dropped_frames = metrics_after["dropped_frames"] - metrics_before["dropped_frames"]
+    stats.slow_consumer_disconnects = metrics_after["slow_consumer_disconnects"] - metrics_before["slow_consumer_disconnects"]
+    return stats
+
+
+def report(stats: LoadStats):
+    expected = sum(recipients for _, recipients in stats.sent.values())
+    print(f"Messages envoyés          : {len(stats.sent)} ({len(stats.sent) / stats.elapsed:.1f}/s)")
+    print(f"Réceptions attendues      : {expected}")
+    print(f"Réceptions                : {stats.delivered} ({stats.delivered / stats.elapsed:.1f}/s)")
+    print(f"Réceptions manquantes     : {expected - stats.delivered}")
+    print(f"Trames de frappe          : {stats.typing_sent} envoyées, {stats.typing_received} diffusions reçues")
+    if len(stats.latencies) >= 2:
+        percentiles = statistics.quantiles(stats.latencies, n=100)
+        print(
+            "Latence envoi → réception : "
+            f"p50 {percentiles[49] * 1000:.1f} ms | p95 {percentiles[94] * 1000:.1f} ms | "
+            f"p99 {percentiles[98] * 1000:.1f} ms | max {max(stats.latencies) * 1000:.1f} ms"
+        )
+    print(f"Trames abandonnées        : {stats.dropped_frames:.0f} (serveur)")
+    print(f"Sockets lentes fermées    : {stats.slow_consumer_disconnects:.0f} (serveur), {stats.closed} côté clients")
+    print(f"Erreurs reçues            : {stats.errors}")
+    print(f"CPU du worker             : {stats.cpu_percent:.0f} %")
+    print(f"Mémoire du worker (pic)   : {stats.peak_rss / 1024 / 1024:.0f} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="secondes d'envoi")
+    parser.add_argument("--message-rate", type=float, default=0.2, help="messages par client et par seconde")
+    parser.add_argument("--typing-rate", type=float, default=0.5, help="trames de frappe par client et par seconde")
+    parser.add_argument("--drain", type=float, default=5, help="secondes d'attente des derniers messages")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--redis-host", default=None)
+    parser.add_argument("--url", default=None, help="serveur déjà lancé (sinon un worker est démarré)")
+    args = parser.parse_args()
+    if args.clients < 2 * args.conversations:
+        parser.error("il faut au moins deux clients par conversation")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_url = args.database_url or f"sqlite:///{tmp_dir}/load_benchmark.db"
+        placement = seed(database_url, args.clients, args.conversations)
+        print(f"{args.clients} clients dans {args.conversations} conversations ({database_url.split(':')[0]})")
+
+        server = None
+        base_url = args.url
+        if base_url is None:
+            port = free_port()
+            server = start_server(database_url, args.redis_host, port)
+            base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_for_server(base_url)
+            stats = asyncio.run(run_load(base_url, placement, args))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+        report(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,42 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
-from models.message import Message, Conversation, ConversationParticipant, ConversationType
-from schemas.message import MessageCreate, ConversationCreate
+from typing import List, Optional, Dict, Any, Tuple, Union
+from collections import Counter
+import html
+import re
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import desc, func, select, insert, or_, and_, false, table, column, literal_column
+from sqlalchemy.exc import IntegrityError
+from models.message import Message, Conversation, ConversationParticipant, ConversationType, ConversationSummary, MessageArchive
+from schemas.message import MessageCreate, MessageBatchItem, ConversationCreate
 from datetime import datetime, timedelta
 from models.user import User
-from models.user_status import UserTypingStatus, UserPresence, UserStatus
+from models.user_status import UserPresence, UserStatus
 from models.plant import Plant
 from models.plant_care import PlantCare
+from models.advice import Advice
+from utils.message_archive import pack_messages, unpack_messages, archive_cache
+from utils.message_buffer import message_buffer
+from utils.membership_cache import membership_cache
+
+SUMMARY_PREVIEW_LENGTH = 200  # caractères
+REBUILD_BATCH_SIZE = 500  # conversations par lot
+INSERT_BATCH_SIZE = 500  # lignes par INSERT multi-lignes de messages
+SYNC_MAX_CONVERSATIONS = 500  # conversations par réponse de synchronisation
+SEARCH_SNIPPET_WORDS = 16  # mots par extrait de recherche
+SEARCH_HIGHLIGHT = ("<mark>", "</mark>")
+# Posés par la base autour des termes trouvés, remplacés par SEARCH_HIGHLIGHT
+# une fois l'extrait échappé (caractères à usage privé, absents des messages)
+SEARCH_MARKERS = ("\ue000", "\ue001")
+
+# Colonnes lues par les chemins de lecture des messages, dans l'ordre du schéma `Message`
+MESSAGE_COLUMNS = (
+    Message.content,
+    Message.id,
+    Message.sender_id,
+    Message.conversation_id,
+    Message.created_at,
+    Message.updated_at,
+    Message.client_msg_id
+)
 
 class CRUDMessage:
     def create_conversation(
@@ -33,7 +62,11 @@ class CRUDMessage:
             )
             db.add(participant)
 
+        db.add(ConversationSummary(conversation_id=db_conversation.id, message_count=0))
+
         db.commit()
+        # Un refus mis en cache avant la création ne doit plus être servi
+        membership_cache.invalidate(db_conversation.id, participant_ids)
         db.refresh(db_conversation)
         return db_conversation
 
@@ -46,64 +79,66 @@ class CRUDMessage:
         db: Session,
         user_id: int,
         skip: int = 0,
-        limit: int = 50
+        limit: int = 50,
+        updated_since: Optional[datetime] = None
     ) -> List[Dict[str, Any]]:
-        """Récupère toutes les conversations d'un utilisateur avec leurs détails"""
+        """Récupère toutes les conversations d'un utilisateur avec leurs détails
+
+        Avec `updated_since`, seules les conversations créées ou modifiées
+        depuis cette date sont renvoyées. Le dernier message et le compteur de non lus proviennent du résumé
+        dénormalisé (`conversation_summaries`) et de la ligne participant,
+        lus avec la page elle-même. Les participants et les informations
+        plante / garde / conseil sont ensuite chargés en une requête chacun,
+        quel que soit le nombre de conversations.
+        """
         try:
             print(f"DEBUG: Getting conversations for user_id={user_id}, skip={skip}, limit={limit}")
             
-            # Récupérer les conversations de l'utilisateur
-            conversations = (
-                db.query(Conversation)
+            # Récupérer les conversations de l'utilisateur avec leur résumé
+            query = (
+                db.query(Conversation, ConversationParticipant.unread_count, Message, ConversationSummary)
                 .join(ConversationParticipant)
+                .outerjoin(ConversationSummary, ConversationSummary.conversation_id == Conversation.id)
+                .outerjoin(Message, Message.id == ConversationSummary.last_message_id)
                 .filter(ConversationParticipant.user_id == user_id)
-                .order_by(Conversation.updated_at.desc())
+            )
+            if updated_since is not None:
+                query = query.filter(Conversation.updated_at > updated_since)
+            rows = (
+                query.order_by(Conversation.updated_at.desc(), Conversation.id.desc())
                 .offset(skip)
                 .limit(limit)
                 .all()
             )
             
-            print(f"DEBUG: Found {len(conversations)} conversations for user {user_id}")
+            print(f"DEBUG: Found {len(rows)} conversations for user {user_id}")
+            if not rows:
+                return []
+            
+            conversations = [conversation for conversation, _, _, _ in rows]
+            conversation_ids = [conversation.id for conversation in conversations]
+            plant_care_ids = [
+                conversation.related_id for conversation in conversations
+                if conversation.type == ConversationType.PLANT_CARE and conversation.related_id
+            ]
+            advice_ids = [
+                conversation.related_id for conversation in conversations
+                if conversation.type == ConversationType.BOTANICAL_ADVICE and conversation.related_id
+            ]
+            
+            # Chargements groupés pour toute la page
+            participants, watermarks = self._get_participants(db, user_id, conversation_ids)
+            plant_cares = self._get_plant_care_infos(db, plant_care_ids)
+            advices = self._get_advice_infos(db, advice_ids)
             
             result = []
-            for i, conversation in enumerate(conversations):
-                print(f"DEBUG: Processing conversation {i+1}/{len(conversations)}: id={conversation.id}, type={conversation.type}")
-                # Récupérer le dernier message
-                last_message = (
-                    db.query(Message)
-                    .filter(Message.conversation_id == conversation.id)
-                    .order_by(Message.created_at.desc())
-                    .first()
-                )
-                
-                # Compter les messages non lus pour cette conversation
-                unread_count = (
-                    db.query(Message)
-                    .join(ConversationParticipant, ConversationParticipant.conversation_id == Message.conversation_id)
-                    .filter(
-                        ConversationParticipant.user_id == user_id,
-                        Message.conversation_id == conversation.id,
-                        Message.sender_id != user_id,
-                        Message.sender_id.isnot(None),
-                        Message.is_read == False,
-                        (
-                            (ConversationParticipant.last_read_at.is_(None)) |
-                            (Message.created_at > ConversationParticipant.last_read_at)
-                        )
-                    )
-                    .count()
-                )
-                
-                # Récupérer les participants (pour obtenir l'autre personne)
-                participants = (
-                    db.query(User)
-                    .join(ConversationParticipant)
-                    .filter(
-                        ConversationParticipant.conversation_id == conversation.id,
-                        ConversationParticipant.user_id != user_id  # Exclure l'utilisateur actuel
-                    )
-                    .all()
-                )
+            for conversation, unread_count, last_message, summary in rows:
+                conversation_watermarks = watermarks.get(conversation.id, {})
+                if last_message:
+                    last_message_dict = self._message_dict(last_message, conversation_watermarks)
+                else:
+                    # Dernier message archivé : reconstitué depuis le résumé
+                    last_message_dict = self._summary_message_dict(summary, conversation_watermarks)
                 
                 # Construire le dictionnaire de la conversation
                 conv_dict = {
@@ -112,143 +147,927 @@ class CRUDMessage:
                     "related_id": conversation.related_id,
                     "created_at": conversation.created_at.isoformat(),
                     "updated_at": conversation.updated_at.isoformat(),
-                    "unread_count": unread_count,
-                    "last_message": None,
-                    "participants": [],
+                    "unread_count": unread_count or 0,
+                    "last_message": last_message_dict,
+                    "participants": participants.get(conversation.id, []),
                     "plant_info": None,
-                    "plant_care_info": None
+                    "plant_care_info": None,
+                    "advice_info": None
                 }
                 
-                # Ajouter les informations des participants
-                for participant in participants:
-                    conv_dict["participants"].append({
-                        "id": participant.id,
-                        "nom": participant.nom,
-                        "prenom": participant.prenom,
-                        "email": participant.email
-                    })
-                
-                # Si c'est une conversation de type plant_care, récupérer les infos de la plante
-                if conversation.type.value == "plant_care" and conversation.related_id:
-                    # Récupérer la garde de plante
-                    plant_care = db.query(PlantCare).filter(PlantCare.id == conversation.related_id).first()
-                    if plant_care:
-                        # Récupérer la plante
-                        plant = db.query(Plant).filter(Plant.id == plant_care.plant_id).first()
-                        if plant:
-                            conv_dict["plant_info"] = {
-                                "id": plant.id,
-                                "nom": plant.nom,
-                                "espece": plant.espece
-                            }
-                        
-                        conv_dict["plant_care_info"] = {
-                            "id": plant_care.id,
-                            "start_date": plant_care.start_date.isoformat(),
-                            "end_date": plant_care.end_date.isoformat(),
-                            "owner_id": plant_care.owner_id,
-                            "caretaker_id": plant_care.caretaker_id
-                        }
-                
-                # Ajouter le dernier message s'il existe
-                if last_message:
-                    conv_dict["last_message"] = {
-                        "id": last_message.id,
-                        "content": last_message.content,
-                        "sender_id": last_message.sender_id,
-                        "conversation_id": last_message.conversation_id,
-                        "created_at": last_message.created_at.isoformat(),
-                        "updated_at": last_message.updated_at.isoformat(),
-                        "is_read": last_message.is_read
-                    }
-                    print(f"DEBUG: Added last message for conversation {conversation.id}: '{last_message.content}'")
+                if conversation.type == ConversationType.PLANT_CARE and conversation.related_id in plant_cares:
+                    conv_dict["plant_care_info"], conv_dict["plant_info"] = plant_cares[conversation.related_id]
+                elif conversation.type == ConversationType.BOTANICAL_ADVICE and conversation.related_id in advices:
+                    conv_dict["advice_info"], conv_dict["plant_info"] = advices[conversation.related_id]
                 
                 result.append(conv_dict)
             
             print(f"DEBUG: Returning {len(result)} conversations")
-            if result:
-                print(f"DEBUG: First conversation: {result[0]['id']} - {result[0].get('last_message', {}).get('content', 'No message')}")
-            
             return result
             
         except Exception as e:
             print(f"Error in get_user_conversations: {e}")
             raise
 
+    def _summary_message_dict(
+        self,
+        summary: Optional[ConversationSummary],
+        watermarks: Dict[int, Optional[int]]
+    ) -> Optional[Dict[str, Any]]:
+        """Dernier message au format `Message.to_dict()` à partir du résumé (aperçu tronqué)"""
+        if not summary or summary.last_message_id is None or summary.last_message_at is None:
+            return None
+        return {
+            "id": summary.last_message_id,
+            "content": summary.last_message_preview or "",
+            "sender_id": summary.last_message_sender_id,
+            "conversation_id": summary.conversation_id,
+            "created_at": summary.last_message_at.isoformat(),
+            "updated_at": summary.last_message_at.isoformat(),
+            "is_read": self._is_read(summary.last_message_id, summary.last_message_sender_id, watermarks),
+            "client_msg_id": None
+        }
+
+    def _get_participants(
+        self,
+        db: Session,
+        user_id: int,
+        conversation_ids: List[int]
+    ) -> Tuple[Dict[int, List[Dict[str, Any]]], Dict[int, Dict[int, Optional[int]]]]:
+        """Récupère les participants de plusieurs conversations en une seule requête
+
+        Retourne les autres participants de chaque conversation et les
+        filigranes de lecture de tous les participants (utilisateur compris).
+        """
+        rows = (
+            db.query(
+                ConversationParticipant.conversation_id,
+                ConversationParticipant.last_read_message_id,
+                User
+            )
+            .join(User, User.id == ConversationParticipant.user_id)
+            .filter(ConversationParticipant.conversation_id.in_(conversation_ids))
+            .all()
+        )
+        
+        participants: Dict[int, List[Dict[str, Any]]] = {}
+        watermarks: Dict[int, Dict[int, Optional[int]]] = {}
+        for conversation_id, last_read_message_id, participant in rows:
+            watermarks.setdefault(conversation_id, {})[participant.id] = last_read_message_id
+            if participant.id == user_id:
+                continue  # Exclure l'utilisateur actuel
+            participants.setdefault(conversation_id, []).append({
+                "id": participant.id,
+                "nom": participant.nom,
+                "prenom": participant.prenom,
+                "email": participant.email
+            })
+        return participants, watermarks
+
+    def _get_plant_care_infos(self, db: Session, plant_care_ids: List[int]) -> Dict[int, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Récupère les gardes et leurs plantes en une seule requête"""
+        if not plant_care_ids:
+            return {}
+        
+        rows = (
+            db.query(PlantCare, Plant)
+            .outerjoin(Plant, Plant.id == PlantCare.plant_id)
+            .filter(PlantCare.id.in_(plant_care_ids))
+            .all()
+        )
+        
+        return {
+            plant_care.id: (
+                {
+                    "id": plant_care.id,
+                    "start_date": plant_care.start_date.isoformat(),
+                    "end_date": plant_care.end_date.isoformat(),
+                    "owner_id": plant_care.owner_id,
+                    "caretaker_id": plant_care.caretaker_id
+                },
+                self._plant_info(plant)
+            )
+            for plant_care, plant in rows
+        }
+
+    def _get_advice_infos(self, db: Session, advice_ids: List[int]) -> Dict[int, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Récupère les conseils et leurs plantes en une seule requête"""
+        if not advice_ids:
+            return {}
+        
+        rows = (
+            db.query(Advice, Plant)
+            .outerjoin(Plant, Plant.id == Advice.plant_id)
+            .filter(Advice.id.in_(advice_ids))
+            .all()
+        )
+        
+        return {
+            advice.id: (
+                {
+                    "id": advice.id,
+                    "status": advice.status.value if advice.status else None,
+                    "botanist_id": advice.botanist_id,
+                    "plant_id": advice.plant_id
+                },
+                self._plant_info(plant)
+            )
+            for advice, plant in rows
+        }
+
+    @staticmethod
+    def _plant_info(plant: Optional[Plant]) -> Optional[Dict[str, Any]]:
+        if not plant:
+            return None
+        return {
+            "id": plant.id,
+            "nom": plant.nom,
+            "espece": plant.espece
+        }
+
     def create_message(self, db: Session, *, message: MessageCreate, sender_id: Optional[int] = None) -> Message:
-        """Crée un nouveau message"""
+        """Crée un nouveau message
+
+        Si `message.client_msg_id` a déjà été reçu de cet expéditeur dans la
+        conversation, le message existant est renvoyé au lieu d'en créer un doublon.
+        """
+        messages, _ = self.create_messages(
+            db,
+            conversation_id=message.conversation_id,
+            messages=[message],
+            sender_id=sender_id
+        )
+        return messages[0]
+
+    def create_messages(
+        self,
+        db: Session,
+        *,
+        conversation_id: int,
+        messages: List[Union[MessageCreate, MessageBatchItem]],
+        sender_id: Optional[int] = None
+    ) -> Tuple[List[Message], List[Message]]:
+        """Crée plusieurs messages d'un expéditeur en une seule transaction
+
+        Les messages dont le `client_msg_id` existe déjà pour cet expéditeur
+        dans la conversation (renvois du client) sont ignorés : une seule
+        requête sur l'index unique (conversation_id, sender_id, client_msg_id)
+        suffit à les retrouver. Le même ID client envoyé par un autre
+        participant est un autre message.
+
+        Returns:
+            Les messages dans l'ordre de la demande (existants compris) et la
+            liste des messages réellement créés.
+        """
         try:
-            db_message = Message(
-                content=message.content,
-                conversation_id=message.conversation_id,
-                sender_id=sender_id,
-                is_read=False
-            )
-            db.add(db_message)
-            
-            conversation = self.get_conversation(db, message.conversation_id)
-            if not conversation:
-                raise ValueError("Conversation non trouvée")
-            
-            conversation.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(db_message)
-            
-            if not db_message.id:
-                raise ValueError("Le message n'a pas été créé correctement")
-            
-            return db_message
-            
+            return self._create_messages(db, conversation_id, messages, sender_id)
+        except IntegrityError:
+            # Renvoi concurrent : l'autre transaction a inséré les mêmes IDs client
+            db.rollback()
+            try:
+                return self._create_messages(db, conversation_id, messages, sender_id)
+            except Exception as e:
+                db.rollback()
+                raise ValueError(f"Erreur lors de la création du message: {str(e)}")
         except Exception as e:
             db.rollback()
             raise ValueError(f"Erreur lors de la création du message: {str(e)}")
 
+    def create_message_groups(
+        self,
+        db: Session,
+        groups: List[Tuple[int, List[Union[MessageCreate, MessageBatchItem]], Optional[int]]]
+    ) -> List[Tuple[List[Message], List[Message]]]:
+        """Crée les messages de plusieurs expéditeurs et conversations en une seule transaction
+
+        Chaque groupe `(conversation_id, messages, sender_id)` est traité comme
+        par `create_messages`, mais tous les messages sont insérés en un seul
+        flush (INSERT multi-lignes) et validés par un seul commit. Une erreur
+        annule tout le lot : l'appelant réessaie alors groupe par groupe.
+
+        Returns:
+            Le résultat de `create_messages` de chaque groupe, dans l'ordre.
+        """
+        try:
+            return self._create_message_groups(db, groups)
+        except Exception as e:
+            db.rollback()
+            raise ValueError(f"Erreur lors de la création des messages: {str(e)}")
+
+    def _create_messages(
+        self,
+        db: Session,
+        conversation_id: int,
+        messages: List[Union[MessageCreate, MessageBatchItem]],
+        sender_id: Optional[int]
+    ) -> Tuple[List[Message], List[Message]]:
+        return self._create_message_groups(db, [(conversation_id, messages, sender_id)])[0]
+
+    def _create_message_groups(
+        self,
+        db: Session,
+        groups: List[Tuple[int, List[Union[MessageCreate, MessageBatchItem]], Optional[int]]]
+    ) -> List[Tuple[List[Message], List[Message]]]:
+        conversations = {
+            conversation.id: conversation
+            for conversation in db.query(Conversation).filter(Conversation.id.in_({group[0] for group in groups}))
+        }
+        
+        # {(conversation_id, sender_id, client_msg_id): message}, renvois de tous les groupes en une requête
+        known: Dict[Tuple[int, Optional[int], str], Message] = {}
+        client_msg_ids = {item.client_msg_id for _, messages, _ in groups for item in messages if item.client_msg_id}
+        if client_msg_ids:
+            known = {
+                (db_message.conversation_id, db_message.sender_id, db_message.client_msg_id): db_message
+                for db_message in db.query(Message).filter(
+                    Message.conversation_id.in_(list(conversations)),
+                    Message.client_msg_id.in_(client_msg_ids)
+                )
+            }
+        
+        created_by_conversation: Dict[int, List[Message]] = {}
+        results: List[Tuple[List[Message], List[Message]]] = []
+        for conversation_id, messages, sender_id in groups:
+            if conversation_id not in conversations:
+                raise ValueError("Conversation non trouvée")
+            result: List[Message] = []
+            created: List[Message] = []
+            for item in messages:
+                key = (conversation_id, sender_id, item.client_msg_id)
+                if item.client_msg_id and key in known:
+                    result.append(known[key])
+                    continue
+                db_message = Message(
+                    content=item.content,
+                    conversation_id=conversation_id,
+                    sender_id=sender_id,
+                    client_msg_id=item.client_msg_id,
+                    is_read=False
+                )
+                if item.client_msg_id:
+                    known[key] = db_message  # Doublon au sein du même lot
+                result.append(db_message)
+                created.append(db_message)
+            if created:
+                created_by_conversation.setdefault(conversation_id, []).extend(created)
+            results.append((result, created))
+        
+        if not created_by_conversation:
+            return results
+        # Verrous (seq, résumés, participants) pris par conversation_id croissant :
+        # deux lots concurrents sur les mêmes conversations ne s'interbloquent pas
+        created_by_conversation = dict(sorted(created_by_conversation.items()))
+        
+        # Un seul INSERT multi-lignes ; (conversation_id, seq) identifie chaque ligne retournée
+        now = datetime.utcnow()
+        all_created: Dict[Tuple[int, int], Message] = {}
+        for conversation_id, created in created_by_conversation.items():
+            first_seq = self.allocate_seq(db, conversation_id, len(created))
+            for seq, db_message in enumerate(created, start=first_seq):
+                db_message.seq = seq
+                db_message.created_at = db_message.updated_at = now
+                all_created[(conversation_id, seq)] = db_message
+            conversations[conversation_id].updated_at = now
+        rows = [
+            {
+                "content": db_message.content,
+                "conversation_id": db_message.conversation_id,
+                "sender_id": db_message.sender_id,
+                "client_msg_id": db_message.client_msg_id,
+                "is_read": False,
+                "seq": db_message.seq,
+                "created_at": now,
+                "updated_at": now
+            }
+            for db_message in all_created.values()
+        ]
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            inserted = db.execute(
+                insert(Message).values(rows[start:start + INSERT_BATCH_SIZE])
+                .returning(Message.id, Message.conversation_id, Message.seq)
+            )
+            for message_id, conversation_id, seq in inserted:
+                all_created[(conversation_id, seq)].id = message_id
+        for conversation_id, created in created_by_conversation.items():
+            self._record_new_messages(db, conversation_id, created)
+        result_ids = [[db_message.id for db_message in result] for result, _ in results]
+        db.commit()
+        
+        # Charger les messages en une requête (le commit a expiré ceux déjà connus)
+        loaded = {
+            db_message.id: db_message
+            for db_message in db.query(Message).filter(Message.id.in_({
+                message_id for message_ids in result_ids for message_id in message_ids
+            }))
+        }
+        for conversation_id, created in created_by_conversation.items():
+            message_buffer.append(conversation_id, [
+                (
+                    db_message.content,
+                    db_message.id,
+                    db_message.sender_id,
+                    db_message.conversation_id,
+                    db_message.created_at,
+                    db_message.updated_at,
+                    db_message.client_msg_id
+                )
+                for db_message in created
+            ])
+        return [
+            (
+                [loaded[message_id] for message_id in message_ids],
+                [loaded[db_message.id] for db_message in created]
+            )
+            for message_ids, (_, created) in zip(result_ids, results)
+        ]
+
+    def allocate_seq(self, db: Session, conversation_id: int, count: int = 1) -> int:
+        """Réserve `count` numéros de séquence dans la transaction en cours et retourne le premier
+
+        La mise à jour du résumé verrouille sa ligne jusqu'au commit : les
+        numéros d'une conversation sont attribués sans trou ni doublon, dans
+        l'ordre des commits.
+        """
+        summary_filter = ConversationSummary.conversation_id == conversation_id
+        updated = db.query(ConversationSummary).filter(summary_filter).update(
+            {"last_seq": ConversationSummary.last_seq + count},
+            synchronize_session=False
+        )
+        if not updated:
+            # Conversation antérieure aux résumés : le créer avant de réserver
+            self.rebuild_summaries(db, conversation_ids=[conversation_id], commit=False)
+            db.query(ConversationSummary).filter(summary_filter).update(
+                {"last_seq": ConversationSummary.last_seq + count},
+                synchronize_session=False
+            )
+        return db.query(ConversationSummary.last_seq).filter(summary_filter).scalar() - count + 1
+
+    def get_last_seq(self, db: Session, conversation_id: int) -> int:
+        """Dernier numéro de séquence attribué dans une conversation"""
+        return db.query(ConversationSummary.last_seq)\
+            .filter(ConversationSummary.conversation_id == conversation_id)\
+            .scalar() or 0
+
+    def get_messages_after_seq(self, db: Session, conversation_id: int, after_seq: int, limit: int) -> List[Message]:
+        """Messages d'une conversation de numéro supérieur à `after_seq`, dans l'ordre"""
+        return db.query(Message)\
+            .filter(Message.conversation_id == conversation_id, Message.seq > after_seq)\
+            .order_by(Message.seq)\
+            .limit(limit)\
+            .all()
+
+    def _record_new_messages(self, db: Session, conversation_id: int, db_messages: List[Message]) -> None:
+        """Met à jour le résumé et les compteurs de non lus dans la transaction en cours"""
+        last_message = db_messages[-1]
+        updated = (
+            db.query(ConversationSummary)
+            .filter(ConversationSummary.conversation_id == conversation_id)
+            .update({
+                "last_message_id": last_message.id,
+                "last_message_preview": last_message.content[:SUMMARY_PREVIEW_LENGTH],
+                "last_message_sender_id": last_message.sender_id,
+                "last_message_at": last_message.created_at,
+                "message_count": ConversationSummary.message_count + len(db_messages),
+                "updated_at": datetime.utcnow()
+            }, synchronize_session=False)
+        )
+        if not updated:
+            # Conversation antérieure aux résumés : le reconstruire entièrement
+            self.rebuild_summaries(db, conversation_ids=[conversation_id], commit=False)
+            return
+        
+        # Les messages système (sans expéditeur) ne comptent pas comme non lus
+        senders = Counter(db_message.sender_id for db_message in db_messages if db_message.sender_id is not None)
+        for sender_id, count in senders.items():
+            (
+                db.query(ConversationParticipant)
+                .filter(
+                    ConversationParticipant.conversation_id == conversation_id,
+                    ConversationParticipant.user_id != sender_id
+                )
+                .update(
+                    {"unread_count": ConversationParticipant.unread_count + count},
+                    synchronize_session=False
+                )
+            )
+
     def get_conversation_messages(
         self,
         db: Session,
         conversation_id: int,
         skip: int = 0,
-        limit: int = 50
+        limit: int = 50,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Récupère les messages d'une conversation avec pagination"""
-        try:
-            conversation = self.get_conversation(db, conversation_id)
-            if not conversation:
-                raise ValueError(f"Conversation {conversation_id} non trouvée")
+        """Récupère les messages d'une conversation avec pagination
+
+        Les messages sont renvoyés du plus récent au plus ancien. `before_id`
+        et `after_id` activent la pagination par clé sur l'index
+        (conversation_id, created_at, id) : seuls les messages plus anciens
+        (resp. plus récents) que le message de référence sont renvoyés.
+        `skip` reste supporté pour les anciennes versions de l'application.
+
+        Seules les colonnes utiles sont lues (sans objets ORM) ; les dates
+        restent des `datetime`, sérialisées directement par l'encodeur JSON.
+
+        Si la conversation a été archivée (`message_archives`), les messages
+        archivés, tous plus anciens que ceux de la table `messages`, prennent
+        le relais de façon transparente ; l'archive n'est lue que lorsque la
+        page dépasse les messages récents.
 
+        La première page (sans `skip` ni référence) est servie par le tampon
+        `message_buffer` lorsqu'il correspond au résumé de la conversation.
+        """
+        conversation = (
+            db.query(
+                Conversation.id,
+                MessageArchive.last_message_id.label("archived_last_message_id"),
+                MessageArchive.archived_at,
+                ConversationSummary.last_message_id,
+                ConversationSummary.message_count
+            )
+            .outerjoin(MessageArchive, MessageArchive.conversation_id == Conversation.id)
+            .outerjoin(ConversationSummary, ConversationSummary.conversation_id == Conversation.id)
+            .filter(Conversation.id == conversation_id)
+            .first()
+        )
+        if not conversation:
+            raise ValueError(f"Conversation {conversation_id} non trouvée")
+        
+        # Première page : servie par le tampon des derniers messages s'il est à jour
+        first_page = skip == 0 and before_id is None and after_id is None and conversation.message_count is not None
+        if first_page:
+            messages = message_buffer.get(
+                conversation_id, conversation.last_message_id, conversation.message_count, limit
+            )
+            if messages is not None:
+                watermarks = {conversation_id: self.get_read_watermarks(db, conversation_id)}
+                return self._message_rows_to_dicts(messages, watermarks)
+        
+        archived_rows: List[Tuple] = []
+        references: Dict[int, Optional[Tuple[datetime, int]]] = {}
+        if conversation.archived_last_message_id is not None:
+            archived_rows = self._load_archived_rows(db, conversation_id, conversation.archived_at)
+            # Référence archivée : sa clé est lue dans l'archive
+            for reference_id in (before_id, after_id):
+                if reference_id is not None and reference_id <= conversation.archived_last_message_id:
+                    references[reference_id] = next(
+                        ((row[4], row[1]) for row in archived_rows if row[1] == reference_id), None
+                    )
+
+        query = db.query(*MESSAGE_COLUMNS).filter(Message.conversation_id == conversation_id)
+        
+        if before_id is not None:
+            query = query.filter(self._keyset_condition(before_id, older=True, reference=references))
+        if after_id is not None:
+            query = query.filter(self._keyset_condition(after_id, older=False, reference=references))
+        
+        if archived_rows:
+            archived_rows = [
+                row for row in archived_rows
+                if (before_id is None or self._archived_before(row, before_id, references))
+                and (after_id is None or self._archived_after(row, after_id, references))
+            ]
+        
+        if after_id is not None and before_id is None:
+            # Les messages les plus proches de la référence sont les plus anciens
+            messages = archived_rows[:limit]
+            if len(messages) < limit:
+                messages += (
+                    query.order_by(Message.created_at.asc(), Message.id.asc())
+                    .limit(limit - len(messages))
+                    .all()
+                )
+            messages.reverse()
+        else:
+            offset = skip if before_id is None else 0
             messages = (
-                db.query(Message)
-                .filter(Message.conversation_id == conversation_id)
-                .order_by(Message.created_at.desc())
-                .offset(skip)
+                query.order_by(Message.created_at.desc(), Message.id.desc())
+                .offset(offset)
                 .limit(limit)
                 .all()
             )
-            
-            result = []
-            for message in messages:
-                msg_dict = message.to_dict()
-                msg_dict["id"] = int(float(msg_dict["id"]))
-                msg_dict["conversation_id"] = int(float(msg_dict["conversation_id"]))
-                if msg_dict["sender_id"]:
-                    msg_dict["sender_id"] = int(float(msg_dict["sender_id"]))
-                result.append(msg_dict)
-            
-            return result
-            
-        except Exception as e:
-            raise
+            if archived_rows and len(messages) < limit:
+                # Page incomplète : poursuivre dans l'archive
+                if offset:
+                    recent_count = offset + len(messages) if messages else query.count()
+                    offset = max(0, offset - recent_count)
+                archived_rows.reverse()
+                messages += archived_rows[offset:offset + limit - len(messages)]
+        
+        if first_page and messages and messages[0][1] == conversation.last_message_id:
+            message_buffer.fill(
+                conversation_id, messages, conversation.message_count, complete=len(messages) < limit
+            )
+        
+        if not messages:
+            return []
+        
+        watermarks = {conversation_id: self.get_read_watermarks(db, conversation_id)}
+        return self._message_rows_to_dicts(messages, watermarks)
 
-    def mark_messages_as_read(self, db: Session, conversation_id: int, user_id: int) -> None:
-        """Marque tous les messages d'une conversation comme lus pour un utilisateur"""
-        try:
-            db.query(Message)\
+    @staticmethod
+    def _keyset_condition(message_id: int, older: bool, reference: Optional[Dict] = None):
+        """Condition (created_at, id) < ou > celle du message de référence
+
+        La date du message de référence est lue en sous-requête, sauf s'il
+        figure dans `reference` (message archivé).
+        """
+        if reference and message_id in reference:
+            if reference[message_id] is None:
+                return false()  # Référence inconnue
+            reference_created_at = reference[message_id][0]
+        else:
+            reference_message = aliased(Message)
+            reference_created_at = (
+                select(reference_message.created_at)
+                .where(reference_message.id == message_id)
+                .scalar_subquery()
+            )
+        if older:
+            return or_(
+                Message.created_at < reference_created_at,
+                and_(Message.created_at == reference_created_at, Message.id < message_id)
+            )
+        return or_(
+            Message.created_at > reference_created_at,
+            and_(Message.created_at == reference_created_at, Message.id > message_id)
+        )
+
+    @staticmethod
+    def _archived_before(row: Tuple, message_id: int, references: Dict) -> bool:
+        """Ligne archivée plus ancienne que la référence (toujours vrai si elle est récente)"""
+        if message_id not in references:
+            return True
+        return references[message_id] is not None and (row[4], row[1]) < references[message_id]
+
+    @staticmethod
+    def _archived_after(row: Tuple, message_id: int, references: Dict) -> bool:
+        """Ligne archivée plus récente que la référence (toujours faux si elle est récente)"""
+        return (
+            message_id in references
+            and references[message_id] is not None
+            and (row[4], row[1]) > references[message_id]
+        )
+
+    def _load_archived_rows(self, db: Session, conversation_id: int, archived_at: datetime) -> List[Tuple]:
+        """Lit (ou reprend du cache) les messages archivés d'une conversation, du plus ancien au plus récent"""
+        rows = archive_cache.get(conversation_id, archived_at)
+        if rows is None:
+            payload = db.query(MessageArchive.payload)\
+                .filter(MessageArchive.conversation_id == conversation_id)\
+                .scalar()
+            rows = unpack_messages(payload, conversation_id) if payload else []
+            archive_cache.put(conversation_id, archived_at, rows)
+        return rows
+
+    def archive_conversation(self, db: Session, conversation_id: int) -> int:
+        """Déplace les messages d'une conversation vers son archive compressée
+
+        Les messages déjà archivés sont conservés : les nouveaux sont ajoutés
+        à la suite. Retourne le nombre de messages déplacés.
+        """
+        rows = (
+            db.query(*MESSAGE_COLUMNS)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.asc(), Message.id.asc())
+            .all()
+        )
+        if not rows:
+            return 0
+        
+        archive = db.query(MessageArchive).filter(MessageArchive.conversation_id == conversation_id).first()
+        archived_rows = self._load_archived_rows(db, conversation_id, archive.archived_at) if archive else []
+        all_rows = archived_rows + [tuple(row) for row in rows]
+        
+        if not archive:
+            archive = MessageArchive(conversation_id=conversation_id)
+            db.add(archive)
+        archive.payload = pack_messages(all_rows)
+        archive.message_count = len(all_rows)
+        archive.first_message_at = all_rows[0][4]
+        archive.last_message_at = all_rows[-1][4]
+        archive.last_message_id = max(row[1] for row in all_rows)
+        archive.archived_at = datetime.utcnow()
+        
+        # Un message arrivé pendant l'archivage a un ID plus grand : il reste en place
+        db.query(Message)\
+            .filter(Message.conversation_id == conversation_id, Message.id <= archive.last_message_id)\
+            .delete(synchronize_session=False)
+        db.commit()
+        return len(rows)
+
+    def archive_finished_conversations(
+        self,
+        db: Session,
+        older_than_months: int,
+        now: Optional[datetime] = None
+    ) -> Dict[int, int]:
+        """Archive les conversations des gardes terminées depuis plus de `older_than_months` mois
+
+        Une conversation encore active (dernier message plus récent que la
+        limite) n'est pas archivée. Retourne {conversation_id: messages déplacés}.
+        """
+        cutoff = (now or datetime.utcnow()) - timedelta(days=30 * older_than_months)
+        has_messages = select(Message.id).where(Message.conversation_id == Conversation.id).exists()
+        conversation_ids = [
+            conversation_id for conversation_id, in (
+                db.query(Conversation.id)
+                .join(PlantCare, PlantCare.id == Conversation.related_id)
                 .filter(
-                    Message.conversation_id == conversation_id,
-                    Message.is_read == False
-                )\
-                .update({"is_read": True})
+                    Conversation.type == ConversationType.PLANT_CARE,
+                    PlantCare.end_date < cutoff,
+                    Conversation.updated_at < cutoff,
+                    has_messages
+                )
+                .all()
+            )
+        ]
+        return {
+            conversation_id: self.archive_conversation(db, conversation_id)
+            for conversation_id in conversation_ids
+        }
+
+    def get_sync_changes(
+        self,
+        db: Session,
+        user_id: int,
+        since: Optional[datetime],
+        until: datetime,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 200
+    ) -> Dict[str, Any]:
+        """Récupère les changements de toutes les conversations d'un utilisateur
+
+        Les messages créés ou modifiés dans l'intervalle ]since, until] sont
+        parcourus par clé (updated_at, id) à partir de `after`, au plus
+        `limit` à la fois. Les filigranes de lecture et les conversations
+        créées ou modifiées depuis `since` ne sont renvoyés qu'avec la
+        première page (`after` absent) : ils reflètent l'état courant.
+        """
+        user_conversations = (
+            select(ConversationParticipant.conversation_id)
+            .where(ConversationParticipant.user_id == user_id)
+        )
+        
+        query = db.query(*MESSAGE_COLUMNS).filter(
+            Message.conversation_id.in_(user_conversations),
+            Message.updated_at <= until
+        )
+        if since is not None:
+            query = query.filter(Message.updated_at > since)
+        if after is not None:
+            after_updated_at, after_id = after
+            query = query.filter(or_(
+                Message.updated_at > after_updated_at,
+                and_(Message.updated_at == after_updated_at, Message.id > after_id)
+            ))
+        messages = (
+            query.order_by(Message.updated_at.asc(), Message.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        
+        watermarks = self._get_watermarks_by_conversation(
+            db, list({row.conversation_id for row in messages})
+        )
+        changes = {
+            "messages": self._message_rows_to_dicts(messages, watermarks),
+            "has_more": has_more,
+            "last_position": (messages[-1].updated_at, messages[-1].id) if messages else after,
+            "read_watermarks": [],
+            "conversations": []
+        }
+        if after is not None:
+            return changes
+        
+        participants = db.query(ConversationParticipant).filter(
+            ConversationParticipant.conversation_id.in_(user_conversations)
+        )
+        if since is not None:
+            participants = participants.filter(ConversationParticipant.last_read_at > since)
+        changes["read_watermarks"] = [
+            {
+                "conversation_id": participant.conversation_id,
+                "user_id": participant.user_id,
+                "last_read_message_id": participant.last_read_message_id,
+                "last_read_at": participant.last_read_at.isoformat() if participant.last_read_at else None
+            }
+            for participant in participants.all()
+        ]
+        changes["conversations"] = self.get_user_conversations(
+            db,
+            user_id=user_id,
+            limit=SYNC_MAX_CONVERSATIONS,
+            updated_since=since
+        )
+        return changes
+
+    def _get_watermarks_by_conversation(
+        self,
+        db: Session,
+        conversation_ids: List[int]
+    ) -> Dict[int, Dict[int, Optional[int]]]:
+        """Récupère les filigranes de lecture de plusieurs conversations en une requête"""
+        if not conversation_ids:
+            return {}
+        watermarks: Dict[int, Dict[int, Optional[int]]] = {}
+        for conversation_id, user_id, last_read_message_id in (
+            db.query(
+                ConversationParticipant.conversation_id,
+                ConversationParticipant.user_id,
+                ConversationParticipant.last_read_message_id
+            )
+            .filter(ConversationParticipant.conversation_id.in_(conversation_ids))
+            .all()
+        ):
+            watermarks.setdefault(conversation_id, {})[user_id] = last_read_message_id
+        return watermarks
+
+    def search_messages(
+        self,
+        db: Session,
+        user_id: int,
+        query: str,
+        before_id: Optional[int] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Recherche plein texte dans les conversations d'un utilisateur
+
+        Utilise l'index GIN `to_tsvector('french', content)` sur PostgreSQL et
+        la table FTS5 `messages_fts` sur SQLite (voir `scripts/upgrade_schema.py`).
+        Les résultats vont du plus récent au plus ancien et se paginent par
+        ID via `before_id` : l'ordre des ID suit celui des insertions et
+        permet à FTS5 de parcourir les correspondances sans tri, en
+        s'arrêtant à `limit`. Chaque message est accompagné d'un extrait
+        `snippet` échappé pour HTML, où seuls les termes trouvés sont
+        entourés de <mark>.
+        """
+        user_conversations = (
+            select(ConversationParticipant.conversation_id)
+            .where(ConversationParticipant.user_id == user_id)
+        )
+        filters = [Message.conversation_id.in_(user_conversations)]
+        if before_id is not None:
+            filters.append(Message.id < before_id)
+        
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            rows = self._search_postgres(db, query, filters, limit)
+        elif dialect == "sqlite":
+            rows = self._search_sqlite(db, query, filters, limit)
+        else:
+            rows = self._search_like(db, query, filters, limit)
+        
+        watermarks = self._get_watermarks_by_conversation(db, list({row.conversation_id for row in rows}))
+        results = self._message_rows_to_dicts([tuple(row)[:-1] for row in rows], watermarks)
+        for result, row in zip(results, rows):
+            result["snippet"] = self._highlight(row.snippet)
+        return results
+
+    @staticmethod
+    def _highlight(snippet: Optional[str]) -> str:
+        """Échappe l'extrait puis remplace les marqueurs de la base par <mark>"""
+        escaped = html.escape(snippet or "")
+        for marker, tag in zip(SEARCH_MARKERS, SEARCH_HIGHLIGHT):
+            escaped = escaped.replace(marker, tag)
+        return escaped
+
+    def _search_postgres(self, db: Session, query: str, filters: List, limit: int) -> List:
+        ts_config = literal_column("'french'::regconfig")
+        ts_query = func.websearch_to_tsquery(ts_config, query)
+        matching_ids = (
+            select(Message.id)
+            .where(func.to_tsvector(ts_config, Message.content).op("@@")(ts_query), *filters)
+            .order_by(Message.id.desc())
+            .limit(limit)
+        )
+        # ts_headline est coûteux : ne le calculer que pour la page
+        start_sel, stop_sel = SEARCH_MARKERS
+        headline_options = (
+            f"StartSel={start_sel}, StopSel={stop_sel}, "
+            f"MaxWords={SEARCH_SNIPPET_WORDS}, MinWords={SEARCH_SNIPPET_WORDS // 2}"
+        )
+        return (
+            db.query(*MESSAGE_COLUMNS, func.ts_headline(ts_config, Message.content, ts_query, headline_options).label("snippet"))
+            .filter(Message.id.in_(matching_ids))
+            .order_by(Message.id.desc())
+            .all()
+        )
+
+    def _search_sqlite(self, db: Session, query: str, filters: List, limit: int) -> List:
+        # Chaque mot devient une chaîne FTS5 (pas d'injection de syntaxe),
+        # le dernier est cherché par préfixe pour la recherche à la frappe
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        fts_query = " ".join(f'"{term}"' for term in terms) + "*"
+        
+        messages_fts = table("messages_fts", column("rowid"))
+        fts = literal_column("messages_fts")
+        start_sel, stop_sel = SEARCH_MARKERS
+        return (
+            db.query(*MESSAGE_COLUMNS, func.snippet(fts, 0, start_sel, stop_sel, "…", SEARCH_SNIPPET_WORDS).label("snippet"))
+            .select_from(messages_fts)
+            .join(Message, Message.id == messages_fts.c.rowid)
+            .filter(fts.op("MATCH")(fts_query), *filters)
+            .order_by(messages_fts.c.rowid.desc())  # Parcours FTS5 sans tri
+            .limit(limit)
+            .all()
+        )
+
+    def _search_like(self, db: Session, query: str, filters: List, limit: int) -> List:
+        """Repli sans index plein texte (autres bases)"""
+        # %, _ et \ de la requête sont cherchés tels quels
+        pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return (
+            db.query(*MESSAGE_COLUMNS, Message.content.label("snippet"))
+            .filter(Message.content.ilike(f"%{pattern}%", escape="\\"), *filters)
+            .order_by(Message.id.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def get_read_watermarks(self, db: Session, conversation_id: int) -> Dict[int, Optional[int]]:
+        """Récupère le dernier message lu de chaque participant d'une conversation"""
+        return dict(
+            db.query(ConversationParticipant.user_id, ConversationParticipant.last_read_message_id)
+            .filter(ConversationParticipant.conversation_id == conversation_id)
+            .all()
+        )
+
+    @staticmethod
+    def _is_read(message_id: int, sender_id: Optional[int], watermarks: Dict[int, Optional[int]]) -> bool:
+        """Vrai si un participant autre que l'expéditeur a lu le message"""
+        for user_id, last_read_message_id in watermarks.items():
+            if user_id != sender_id and last_read_message_id is not None and last_read_message_id >= message_id:
+                return True
+        return False
+
+    def _message_rows_to_dicts(
+        self,
+        rows: List[Tuple],
+        watermarks: Dict[int, Dict[int, Optional[int]]]
+    ) -> List[Dict[str, Any]]:
+        """Convertit des lignes `MESSAGE_COLUMNS` au format du schéma `Message`"""
+        is_read = self._is_read
+        no_watermarks: Dict[int, Optional[int]] = {}
+        return [
+            {
+                "content": content,
+                "id": message_id,
+                "sender_id": sender_id,
+                "conversation_id": conversation_id,
+                "created_at": created_at,
+                "updated_at": updated_at,
+                "is_read": is_read(message_id, sender_id, watermarks.get(conversation_id, no_watermarks)),
+                "client_msg_id": client_msg_id
+            }
+            for content, message_id, sender_id, conversation_id, created_at, updated_at, client_msg_id in rows
+        ]
+
+    def messages_to_dicts(self, db: Session, conversation_id: int, db_messages: List[Message]) -> List[Dict[str, Any]]:
+        """Sérialise des messages d'une conversation avec leur état de lecture"""
+        watermarks = self.get_read_watermarks(db, conversation_id) if db_messages else {}
+        return [self._message_dict(db_message, watermarks) for db_message in db_messages]
+
+    @staticmethod
+    def _read_by(message_id: int, sender_id: Optional[int], watermarks: Dict[int, Optional[int]]) -> List[int]:
+        """Participants (hors expéditeur) dont le filigrane couvre le message"""
+        return [
+            user_id for user_id, last_read_message_id in watermarks.items()
+            if user_id != sender_id
+            and last_read_message_id is not None
+            and last_read_message_id >= message_id
+        ]
+
+    def _message_dict(self, db_message: Message, watermarks: Dict[int, Optional[int]]) -> Dict[str, Any]:
+        """Sérialise un message, `is_read` étant déduit des filigranes de lecture"""
+        msg_dict = db_message.to_dict()
+        msg_dict["is_read"] = self._is_read(db_message.id, db_message.sender_id, watermarks)
+        return msg_dict
+
+    def mark_messages_as_read(
+        self,
+        db: Session,
+        conversation_id: int,
+        user_id: int,
+        up_to_message_id: Optional[int] = None
+    ) -> Optional[int]:
+        """Marque les messages d'une conversation comme lus pour un utilisateur
 
+        Seul le filigrane du participant (`last_read_message_id`) avance :
+        les lignes de messages ne sont plus modifiées. Sans `up_to_message_id`,
+        toute la conversation est marquée comme lue. Le filigrane ne recule
+        jamais. Retourne le filigrane obtenu.
+
+        Raises:
+            ValueError: Si `up_to_message_id` n'est pas un message de la conversation
+        """
+        try:
             participant = (
                 db.query(ConversationParticipant)
                 .filter(
@@ -257,43 +1076,130 @@ class CRUDMessage:
                 )
                 .first()
             )
-            if participant:
-                participant.last_read_at = datetime.utcnow()
-                
+            if not participant:
+                return None
+            
+            if up_to_message_id is not None:
+                self._check_conversation_message(db, conversation_id, up_to_message_id)
+            
+            target = db.query(ConversationSummary.last_message_id)\
+                .filter(ConversationSummary.conversation_id == conversation_id)\
+                .scalar()
+            if target is None:
+                target = db.query(func.max(Message.id))\
+                    .filter(Message.conversation_id == conversation_id)\
+                    .scalar()
+            if up_to_message_id is not None and (target is None or up_to_message_id < target):
+                # Jamais au-delà du dernier message de la conversation
+                target = up_to_message_id
+            
+            if target is not None and (
+                participant.last_read_message_id is None or target > participant.last_read_message_id
+            ):
+                participant.last_read_message_id = target
+            participant.last_read_at = datetime.utcnow()
+            
+            if up_to_message_id is None:
+                participant.unread_count = 0
+            else:
+                # Lecture partielle : recompter les messages au-delà du filigrane
+                participant.unread_count = (
+                    db.query(func.count(Message.id))
+                    .filter(
+                        Message.conversation_id == conversation_id,
+                        Message.id > func.coalesce(participant.last_read_message_id, 0),
+                        Message.sender_id != user_id,
+                        Message.sender_id.isnot(None)
+                    )
+                    .scalar()
+                )
+            
             db.commit()
+            return participant.last_read_message_id
             
         except Exception as e:
             db.rollback()
             raise
 
+    def _check_conversation_message(self, db: Session, conversation_id: int, message_id: Any) -> None:
+        """Vérifie que `message_id` est l'ID d'un message de la conversation, archivé compris
+
+        Raises:
+            ValueError: Si l'ID n'est pas un entier ou désigne un message d'une autre conversation
+        """
+        # bool est un int en Python : refusé explicitement
+        if not isinstance(message_id, int) or isinstance(message_id, bool):
+            raise ValueError("L'ID de message doit être un entier")
+        found = db.query(Message.id)\
+            .filter(Message.id == message_id, Message.conversation_id == conversation_id)\
+            .first()
+        if found:
+            return
+        archive = db.query(MessageArchive.last_message_id, MessageArchive.archived_at)\
+            .filter(MessageArchive.conversation_id == conversation_id)\
+            .first()
+        if archive and message_id <= archive.last_message_id and any(
+            row[1] == message_id for row in self._load_archived_rows(db, conversation_id, archive.archived_at)
+        ):
+            return
+        raise ValueError("Message non trouvé dans cette conversation")
+
+    def get_read_receipts(
+        self,
+        db: Session,
+        conversation_id: int,
+        message_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Accusés de lecture d'une conversation, éventuellement pour un message
+
+        Raises:
+            ValueError: Si le message n'appartient pas à la conversation
+        """
+        participants = (
+            db.query(ConversationParticipant)
+            .filter(ConversationParticipant.conversation_id == conversation_id)
+            .all()
+        )
+        receipts = {
+            "conversation_id": conversation_id,
+            "participants": [
+                {
+                    "user_id": participant.user_id,
+                    "last_read_message_id": participant.last_read_message_id,
+                    "last_read_at": participant.last_read_at.isoformat() if participant.last_read_at else None
+                }
+                for participant in participants
+            ]
+        }
+        if message_id is not None:
+            db_message = db.query(Message)\
+                .filter(Message.id == message_id, Message.conversation_id == conversation_id)\
+                .first()
+            if not db_message:
+                raise ValueError("Message non trouvé dans cette conversation")
+            watermarks = {participant.user_id: participant.last_read_message_id for participant in participants}
+            receipts["message_id"] = message_id
+            receipts["read_by"] = self._read_by(message_id, db_message.sender_id, watermarks)
+        return receipts
+
     def get_unread_count(self, db: Session, user_id: int) -> List[Dict[str, Any]]:
         """Récupère le nombre total de messages non lus pour un utilisateur"""
         try:
-            unread_query = (
-                db.query(Message.conversation_id, func.count(Message.id).label('count'))
-                .join(ConversationParticipant, ConversationParticipant.conversation_id == Message.conversation_id)
+            unread_messages = (
+                db.query(ConversationParticipant.conversation_id, ConversationParticipant.unread_count)
                 .filter(
                     ConversationParticipant.user_id == user_id,
-                    Message.sender_id != user_id,
-                    Message.sender_id.isnot(None),
-                    Message.is_read == False,
-                    (
-                        (ConversationParticipant.last_read_at.is_(None)) |
-                        (Message.created_at > ConversationParticipant.last_read_at)
-                    )
+                    ConversationParticipant.unread_count > 0
                 )
-                .group_by(Message.conversation_id)
+                .all()
             )
             
-            unread_messages = unread_query.all()
-            
             result = []
             for conversation_id, count in unread_messages:
-                if count > 0:
-                    result.append({
-                        "conversation_id": int(conversation_id),
-                        "unread_count": int(count)
-                    })
+                result.append({
+                    "conversation_id": int(conversation_id),
+                    "unread_count": int(count)
+                })
             
             if not result:
                 result.append({
@@ -306,51 +1212,175 @@ class CRUDMessage:
         except Exception as e:
             return [{"conversation_id": 0, "unread_count": 0}]
 
+    def get_unread_changes(
+        self,
+        db: Session,
+        conversation_id: int,
+        user_ids: Optional[List[int]] = None,
+        exclude_user_ids: Optional[List[int]] = None
+    ) -> List[Dict[str, int]]:
+        """Compteurs de non lus d'une conversation et totaux de ses participants, en une requête
+
+        Les totaux additionnent les compteurs `unread_count` tenus à jour à
+        l'écriture (via l'index (user_id, conversation_id)), sans recompter
+        les messages.
+        """
+        other = aliased(ConversationParticipant)
+        query = (
+            db.query(
+                ConversationParticipant.user_id,
+                ConversationParticipant.unread_count,
+                func.sum(other.unread_count)
+            )
+            .join(other, other.user_id == ConversationParticipant.user_id)
+            .filter(ConversationParticipant.conversation_id == conversation_id)
+        )
+        if user_ids is not None:
+            query = query.filter(ConversationParticipant.user_id.in_(user_ids))
+        if exclude_user_ids:
+            query = query.filter(ConversationParticipant.user_id.notin_(exclude_user_ids))
+        rows = query.group_by(ConversationParticipant.user_id, ConversationParticipant.unread_count).all()
+        return [
+            {"user_id": int(user_id), "unread_count": int(unread_count or 0), "total": int(total or 0)}
+            for user_id, unread_count, total in rows
+        ]
+
     def get_conversation_messages_count(self, db: Session, conversation_id: int) -> int:
         """Compte le nombre total de messages dans une conversation"""
+        count = db.query(ConversationSummary.message_count)\
+            .filter(ConversationSummary.conversation_id == conversation_id)\
+            .scalar()
+        if count is not None:
+            return count
         return db.query(Message)\
             .filter(Message.conversation_id == conversation_id)\
             .count()
 
     def get_unread_count_by_conversation(self, db: Session, user_id: int) -> List[Dict[str, Any]]:
         """Compte les messages non lus par conversation"""
-        try:
-            unread_messages = (
-                db.query(Message.conversation_id, db.func.count(Message.id).label('count'))
-                .join(ConversationParticipant, ConversationParticipant.conversation_id == Message.conversation_id)
-                .filter(
-                    ConversationParticipant.user_id == user_id,
-                    Message.sender_id != user_id,
-                    (
-                        (ConversationParticipant.last_read_at.is_(None)) |
-                        (Message.created_at > ConversationParticipant.last_read_at)
-                    )
-                )
+        return self.get_unread_count(db, user_id)
+
+    def rebuild_summaries(
+        self,
+        db: Session,
+        conversation_ids: Optional[List[int]] = None,
+        commit: bool = True
+    ) -> int:
+        """Reconstruit les résumés et compteurs de non lus à partir des messages
+
+        Sert au remplissage initial et à la réparation des résumés. Sans
+        `conversation_ids`, toutes les conversations sont traitées.
+        Retourne le nombre de conversations reconstruites.
+        """
+        conversation_query = db.query(Conversation.id)
+        if conversation_ids is not None:
+            conversation_query = conversation_query.filter(Conversation.id.in_(conversation_ids))
+        ids = [conversation_id for conversation_id, in conversation_query.all()]
+        
+        for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+            batch = ids[start:start + REBUILD_BATCH_SIZE]
+            
+            counts = dict(
+                db.query(Message.conversation_id, func.count(Message.id))
+                .filter(Message.conversation_id.in_(batch))
                 .group_by(Message.conversation_id)
                 .all()
             )
             
-            result = []
-            for conversation_id, count in unread_messages:
-                if conversation_id is not None and count is not None:
-                    try:
-                        result.append({
-                            "conversation_id": int(conversation_id),
-                            "unread_count": int(count)
-                        })
-                    except (ValueError, TypeError):
-                        continue
+            max_seqs = dict(
+                db.query(Message.conversation_id, func.max(Message.seq))
+                .filter(Message.conversation_id.in_(batch))
+                .group_by(Message.conversation_id)
+                .all()
+            )
             
-            if not result:
-                result.append({
-                    "conversation_id": 0,
-                    "unread_count": 0
-                })
+            ranked = (
+                select(
+                    Message,
+                    func.row_number().over(
+                        partition_by=Message.conversation_id,
+                        order_by=(Message.created_at.desc(), Message.id.desc())
+                    ).label("rank")
+                )
+                .where(Message.conversation_id.in_(batch))
+                .subquery()
+            )
+            last_message = aliased(Message, ranked)
+            last_messages = {
+                row.conversation_id: row
+                for row in db.execute(select(last_message).where(ranked.c.rank == 1)).scalars()
+            }
+            
+            unread = {
+                (conversation_id, user_id): count
+                for conversation_id, user_id, count in (
+                    db.query(
+                        ConversationParticipant.conversation_id,
+                        ConversationParticipant.user_id,
+                        func.count(Message.id)
+                    )
+                    .join(Message, Message.conversation_id == ConversationParticipant.conversation_id)
+                    .filter(
+                        ConversationParticipant.conversation_id.in_(batch),
+                        Message.sender_id != ConversationParticipant.user_id,
+                        Message.sender_id.isnot(None),
+                        Message.id > func.coalesce(ConversationParticipant.last_read_message_id, 0)
+                    )
+                    .group_by(ConversationParticipant.conversation_id, ConversationParticipant.user_id)
+                    .all()
+                )
+            }
+            
+            archives = {
+                conversation_id: (message_count, archived_at)
+                for conversation_id, message_count, archived_at in (
+                    db.query(MessageArchive.conversation_id, MessageArchive.message_count, MessageArchive.archived_at)
+                    .filter(MessageArchive.conversation_id.in_(batch))
+                    .all()
+                )
+            }
+            
+            summaries = {
+                summary.conversation_id: summary
+                for summary in db.query(ConversationSummary)
+                .filter(ConversationSummary.conversation_id.in_(batch))
+                .all()
+            }
+            for conversation_id in batch:
+                summary = summaries.get(conversation_id)
+                if not summary:
+                    summary = ConversationSummary(conversation_id=conversation_id)
+                    db.add(summary)
+                archived_count, archived_at = archives.get(conversation_id, (0, None))
+                summary.message_count = counts.get(conversation_id, 0) + archived_count
+                summary.last_seq = max(summary.last_seq or 0, max_seqs.get(conversation_id) or 0)
                 
-            return result
+                message = last_messages.get(conversation_id)
+                if message:
+                    last = (message.id, message.content, message.sender_id, message.created_at)
+                elif archived_at is not None:
+                    # Tous les messages sont archivés : le dernier est le plus récent de l'archive
+                    row = self._load_archived_rows(db, conversation_id, archived_at)[-1]
+                    last = (row[1], row[0], row[2], row[4])
+                else:
+                    last = (None, None, None, None)
+                summary.last_message_id = last[0]
+                summary.last_message_preview = last[1][:SUMMARY_PREVIEW_LENGTH] if last[1] is not None else None
+                summary.last_message_sender_id = last[2]
+                summary.last_message_at = last[3]
             
-        except Exception as e:
-            return [{"conversation_id": 0, "unread_count": 0}]
+            for participant in (
+                db.query(ConversationParticipant)
+                .filter(ConversationParticipant.conversation_id.in_(batch))
+                .all()
+            ):
+                participant.unread_count = unread.get((participant.conversation_id, participant.user_id), 0)
+            
+            db.flush()
+        
+        if commit:
+            db.commit()
+        return len(ids)
 
     def get_conversation_participants(self, db: Session, conversation_id: int) -> List[User]:
         """Récupère la liste des participants d'une conversation"""
@@ -359,16 +1389,33 @@ class CRUDMessage:
             .filter(ConversationParticipant.conversation_id == conversation_id)\
             .all()
 
-    def get_typing_users(self, db: Session, conversation_id: int) -> List[UserTypingStatus]:
-        """Récupère la liste des utilisateurs en train d'écrire"""
-        thirty_seconds_ago = datetime.utcnow() - timedelta(seconds=30)
-        return db.query(UserTypingStatus)\
-            .filter(
-                UserTypingStatus.conversation_id == conversation_id,
-                UserTypingStatus.is_typing == True,
-                UserTypingStatus.last_typed_at >= thirty_seconds_ago
-            )\
+    def get_contact_ids(self, db: Session, user_id: int, user_ids: List[int]) -> List[int]:
+        """Parmi `user_ids`, ceux qui partagent au moins une conversation avec `user_id` (lui compris)"""
+        other = aliased(ConversationParticipant)
+        rows = (
+            db.query(other.user_id)
+            .join(ConversationParticipant, ConversationParticipant.conversation_id == other.conversation_id)
+            .filter(ConversationParticipant.user_id == user_id, other.user_id.in_(user_ids))
+            .distinct()
             .all()
+        )
+        return [contact_id for contact_id, in rows]
+
+    def is_participant(self, db: Session, conversation_id: int, user_id: int) -> bool:
+        """Vérifie qu'un utilisateur participe à une conversation, sans requête si la réponse est en cache"""
+        is_member = membership_cache.get(user_id, conversation_id)
+        if is_member is None:
+            is_member = self.load_membership(db, conversation_id, user_id)
+        return is_member
+
+    def load_membership(self, db: Session, conversation_id: int, user_id: int) -> bool:
+        """Lit l'appartenance en base et la met en cache"""
+        is_member = db.query(ConversationParticipant.user_id).filter(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id
+        ).first() is not None
+        membership_cache.set(user_id, conversation_id, is_member)
+        return is_member
 
 # Créer une instance du CRUD
 message = CRUDMessage() 
\ No newline at end of file
@@ -5,10 +5,12 @@ from utils.database import Base, engine, SessionLocal
 from routers import auth, plant, monitoring, photo, plant_care, advice, message, debug, ws, admin, metrics
 import os
 from scripts.init_data import init_data
+from scripts.upgrade_schema import upgrade_schema
 from models.user import User
 
 from utils.settings import CORS_ALLOW_ORIGINS, CORS_ALLOW_METHODS, CORS_ALLOW_HEADERS, PROJECT_NAME, VERSION
 from utils.monitoring import monitoring_middleware
+from services.websocket.ws_manager import manager as websocket_manager
 
 app = FastAPI(
     title=PROJECT_NAME,
@@ -18,6 +20,7 @@ app = FastAPI(
 # Créer les tables si elles n'existent pas
 print("🔧 Création des tables...")
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 print("✅ Tables créées avec succès")
 
 # Vérifier si c'est le premier lancement en cherchant l'utilisateur root
@@ -72,6 +75,10 @@ app.include_router(ws.router)
 app.include_router(admin.router)
 app.include_router(metrics.router)
 
+@app.on_event("shutdown")
+async def stop_websocket_fanout():
+    await websocket_manager.shutdown()
+
 @app.get("/")
 def read_root():
     return {"message": "API A'rosa-je prête !"}
@@ -1,6 +1,6 @@
 from .user import User, UserRole
-from .user_status import UserStatus, UserPresence, UserTypingStatus
-from .message import Message, Conversation, ConversationParticipant, ConversationType
+from .user_status import UserStatus, UserPresence
+from .message import Message, Conversation, ConversationParticipant, ConversationType, ConversationSummary, MessageArchive
 from .plant import Plant
 from .plant_care import PlantCare, CareStatus
 from .advice import Advice
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Enum, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 from utils.database import Base
 import enum
@@ -21,7 +21,8 @@ class Conversation(Base):
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
     participants = relationship("ConversationParticipant", back_populates="conversation", cascade="all, delete-orphan")
     plant_care = relationship("PlantCare", back_populates="conversation", uselist=False)
-    typing_users = relationship("UserTypingStatus", back_populates="conversation", cascade="all, delete-orphan")
+    summary = relationship("ConversationSummary", back_populates="conversation", uselist=False, cascade="all, delete-orphan")
+    archive = relationship("MessageArchive", back_populates="conversation", uselist=False, cascade="all, delete-orphan")
 
 class ConversationParticipant(Base):
     __tablename__ = "conversation_participants"
@@ -30,6 +31,12 @@ class ConversationParticipant(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     last_read_at = Column(DateTime, default=datetime.utcnow)
+    last_read_message_id = Column(Integer, nullable=True)  # Dernier message lu (filigrane de lecture)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")  # Maintenu à l'écriture
+
+    __table_args__ = (
+        Index("ix_conversation_participants_user_conversation", "user_id", "conversation_id"),
+    )
 
     # Relations
     conversation = relationship("Conversation", back_populates="participants")
@@ -41,7 +48,9 @@ class ConversationParticipant(Base):
             "id": int(self.id),
             "conversation_id": int(self.conversation_id),
             "user_id": int(self.user_id),
-            "last_read_at": self.last_read_at.isoformat() if self.last_read_at else None
+            "last_read_at": self.last_read_at.isoformat() if self.last_read_at else None,
+            "last_read_message_id": int(self.last_read_message_id) if self.last_read_message_id else None,
+            "unread_count": int(self.unread_count or 0)
         }
 
 class Message(Base):
@@ -53,7 +62,22 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    is_read = Column(Boolean, default=False)
+    is_read = Column(Boolean, default=False)  # Historique : la lecture est portée par last_read_message_id
+    client_msg_id = Column(String(64), nullable=True)  # ID généré par le client pour les renvois
+    seq = Column(Integer, nullable=True)  # Numéro de séquence dans la conversation (reprise des WebSockets)
+
+    __table_args__ = (
+        # Pagination par clé de l'historique : (conversation_id, created_at, id)
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+        # Synchronisation différentielle : (conversation_id, updated_at, id)
+        Index("ix_messages_conversation_updated_id", "conversation_id", "updated_at", "id"),
+        # Idempotence des envois : un même ID client n'est inséré qu'une fois par expéditeur et conversation
+        Index("ux_messages_conversation_client_msg_id", "conversation_id", "sender_id", "client_msg_id", unique=True),
+        # Reprise d'un flux WebSocket : messages d'une conversation après un numéro de séquence
+        Index("ix_messages_conversation_seq", "conversation_id", "seq"),
+        # SQLite : ne jamais réutiliser l'ID d'un message archivé (ordre des références)
+        {"sqlite_autoincrement": True},
+    )
 
     # Relations
     sender = relationship("User", back_populates="messages")
@@ -68,5 +92,48 @@ class Message(Base):
             "conversation_id": int(self.conversation_id),
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
-            "is_read": bool(self.is_read)
-        } 
\ No newline at end of file
+            "is_read": bool(self.is_read),
+            "client_msg_id": self.client_msg_id
+        } 
+
+class ConversationSummary(Base):
+    """Résumé dénormalisé d'une conversation, mis à jour à chaque écriture"""
+    __tablename__ = "conversation_summaries"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    # Sans clé étrangère : le message peut être archivé ou vivre dans une partition
+    last_message_id = Column(Integer, nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_message_sender_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Dernier numéro de séquence attribué (messages et accusés de lecture)
+    last_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relations
+    conversation = relationship("Conversation", back_populates="summary")
+    last_message = relationship(
+        "Message",
+        primaryjoin="foreign(ConversationSummary.last_message_id) == Message.id",
+        viewonly=True
+    )
+
+class MessageArchive(Base):
+    """Messages d'une conversation terminée, compressés hors de la table `messages`
+
+    `payload` contient les messages en JSON compressé (zlib), du plus ancien
+    au plus récent, au format des colonnes `MESSAGE_COLUMNS` du CRUD.
+    """
+    __tablename__ = "message_archives"
+
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True)
+    message_count = Column(Integer, nullable=False, default=0)
+    last_message_id = Column(Integer, nullable=False)  # Les messages plus récents sont dans `messages`
+    first_message_at = Column(DateTime, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    payload = deferred(Column(LargeBinary, nullable=False))
+    archived_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relations
+    conversation = relationship("Conversation", back_populates="archive")
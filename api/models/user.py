@@ -30,7 +30,6 @@ class User(Base):
     conversations = relationship("ConversationParticipant", back_populates="user")
 
     # Relations pour le statut
-    typing_status = relationship("UserTypingStatus", back_populates="user", uselist=True)
     presence = relationship("UserPresence", back_populates="user", uselist=False)
 
     def get_full_name(self) -> str:
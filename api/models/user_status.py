@@ -9,19 +9,6 @@ class UserStatus(str, enum.Enum):
     OFFLINE = "offline"
     AWAY = "away"
 
-class UserTypingStatus(Base):
-    __tablename__ = "user_typing_status"
-
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
-    is_typing = Column(Boolean, default=False)
-    last_typed_at = Column(DateTime, default=datetime.utcnow)
-
-    # Relations
-    user = relationship("User", back_populates="typing_status")
-    conversation = relationship("Conversation", back_populates="typing_users")
-
 class UserPresence(Base):
     __tablename__ = "user_presence"
 
@@ -1,19 +1,24 @@
-from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from utils.database import get_db
 from utils.security import get_current_user
 from utils.rate_limiter import RateLimiter
+from utils.cursor import encode_cursor, decode_cursor, decode_id_cursor
+from utils.settings import MESSAGE_PAGE_SIZE
 from crud.message import message
 from models.message import ConversationType, Message as MessageModel, ConversationParticipant
 from schemas.message import (
     Message,
     MessageCreate,
+    MessageBatchCreate,
     Conversation,
     ConversationCreate
 )
 from schemas.user import User
-from services.email.email_service import EmailService
+from services.websocket.ws_manager import manager as websocket_manager
 
 router = APIRouter(
     prefix="/messages",
@@ -22,8 +27,21 @@ router = APIRouter(
 
 MESSAGE_RATE_LIMIT = 10  # messages par minute
 TIME_WINDOW = 60  # secondes
+SYNC_PAGE_SIZE = 200  # messages par réponse de synchronisation
+SYNC_MAX_PAGE_SIZE = 500
+SYNC_OVERLAP = timedelta(seconds=5)  # recouvrement entre deux synchronisations
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+PRESENCE_MAX_USERS = 200  # utilisateurs par requête de présence
 
-email_service = EmailService()
+
+def require_participant(db: Session, conversation_id: int, user_id: int):
+    """Refuse l'accès à un utilisateur qui ne participe pas à la conversation (appartenance en cache)"""
+    if not message.is_participant(db, conversation_id, user_id):
+        raise HTTPException(
+            status_code=403,
+            detail="Vous ne participez pas à cette conversation"
+        )
 
 @router.post("/conversations", response_model=Conversation)
 async def create_conversation(
@@ -31,13 +49,18 @@ async def create_conversation(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Créer une nouvelle conversation"""
-    return message.create_conversation(
+    """Créer une nouvelle conversation
+
+    Chaque participant connecté en est informé sur sa socket.
+    """
+    db_conversation = message.create_conversation(
         db=db,
         participant_ids=conversation.participant_ids,
         conversation_type=conversation.type,
         related_id=conversation.related_id
     )
+    await websocket_manager.notify_conversation_created(db_conversation, conversation.participant_ids)
+    return db_conversation
 
 @router.get("/conversations/{conversation_id}", response_model=Conversation)
 async def get_conversation(
@@ -56,6 +79,7 @@ async def get_conversation(
     conversation = message.get_conversation(db, conv_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation non trouvée")
+    require_participant(db, conv_id, current_user.id)
     
     return conversation
 
@@ -64,10 +88,18 @@ async def get_conversation_messages(
     conversation_id: str,
     skip: int = 0,
     limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Récupérer les messages d'une conversation"""
+    """Récupérer les messages d'une conversation
+
+    `before_id` / `after_id` paginent par clé à partir d'un message ;
+    `skip` est conservé pour les anciennes versions de l'application.
+    Les lignes sont encodées directement en JSON : `response_model` ne sert
+    qu'à la documentation.
+    """
     if not conversation_id or not conversation_id.isdigit():
         raise HTTPException(
             status_code=400,
@@ -75,12 +107,15 @@ async def get_conversation_messages(
         )
     
     conv_id = int(conversation_id)
-    return message.get_conversation_messages(
+    require_participant(db, conv_id, current_user.id)
+    return ORJSONResponse(message.get_conversation_messages(
         db,
         conversation_id=conv_id,
         skip=skip,
-        limit=limit
-    )
+        limit=limit,
+        before_id=before_id,
+        after_id=after_id
+    ))
 
 @router.post("/conversations/{conversation_id}/messages", response_model=Message)
 async def create_message(
@@ -116,31 +151,25 @@ async def create_message(
                 status_code=404,
                 detail="Conversation non trouvée"
             )
+        require_participant(db, conv_id, current_user.id)
         
-        # Créer le message
-        new_message = message.create_message(
+        # Créer le message (un renvoi du même client_msg_id renvoie l'existant)
+        messages, created = message.create_messages(
             db=db,
-            message=message_in,
+            conversation_id=conv_id,
+            messages=[message_in],
             sender_id=current_user.id
         )
         
-        # Récupérer les autres participants de la conversation
-        participants = message.get_conversation_participants(db, conv_id)
-        
-        # Envoyer une notification par email à chaque participant (sauf l'expéditeur)
-        for participant in participants:
-            if participant.id != current_user.id:
-                try:
-                    await email_service.send_new_message_notification(
-                        recipient_email=participant.email,
-                        sender_name=f"{current_user.prenom} {current_user.nom}",
-                        conversation_id=str(conv_id)
-                    )
-                except Exception as e:
-                    pass  # Ignorer les erreurs d'envoi d'email
+        if created:
+            await websocket_manager.broadcast_new_messages(conv_id, created)
+            await websocket_manager.push_unread_counts(conv_id, exclude_user_ids=[current_user.id])
+            websocket_manager.notifications.notify(conv_id, current_user.id, len(created))
         
-        return new_message
+        return messages[0]
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(
             status_code=400,
@@ -152,13 +181,68 @@ async def create_message(
             detail=f"Erreur lors de la création du message: {str(e)}"
         )
 
+@router.post("/conversations/{conversation_id}/messages/batch", response_model=dict)
+async def create_messages_batch(
+    conversation_id: int,
+    batch: MessageBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Envoyer plusieurs messages en une requête (file d'attente hors ligne)
+
+    Chaque message porte un `client_msg_id` : les renvois sont ignorés et
+    `duplicates` liste les IDs client déjà reçus. Les messages sont renvoyés
+    dans l'ordre de la demande avec leur ID serveur.
+    """
+    RateLimiter.check_rate_limit(
+        user_id=current_user.id,
+        action="send_message",
+        max_requests=MESSAGE_RATE_LIMIT,
+        time_window=TIME_WINDOW
+    )
+    
+    if not message.get_conversation(db, conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation non trouvée")
+    require_participant(db, conversation_id, current_user.id)
+    
+    try:
+        messages, created = message.create_messages(
+            db=db,
+            conversation_id=conversation_id,
+            messages=batch.messages,
+            sender_id=current_user.id
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Erreur de validation: {str(e)}"
+        )
+    
+    if created:
+        await websocket_manager.broadcast_new_messages(conversation_id, created)
+        await websocket_manager.push_unread_counts(conversation_id, exclude_user_ids=[current_user.id])
+        websocket_manager.notifications.notify(conversation_id, current_user.id, len(created))
+    
+    created_ids = {db_message.id for db_message in created}
+    return ORJSONResponse({
+        "messages": message.messages_to_dicts(db, conversation_id, messages),
+        "duplicates": [
+            db_message.client_msg_id for db_message in messages
+            if db_message.id not in created_ids
+        ]
+    })
+
 @router.post("/conversations/{conversation_id}/read", response_model=dict)
 async def mark_conversation_as_read(
     conversation_id: str,
+    up_to_message_id: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Marquer tous les messages d'une conversation comme lus"""
+    """Marquer les messages d'une conversation comme lus
+
+    Sans `up_to_message_id`, toute la conversation est marquée comme lue.
+    """
     if not conversation_id or not conversation_id.isdigit():
         raise HTTPException(
             status_code=400,
@@ -166,8 +250,37 @@ async def mark_conversation_as_read(
         )
     
     conv_id = int(conversation_id)
-    message.mark_messages_as_read(db, conv_id, current_user.id)
-    return {"status": "success"}
+    try:
+        last_read_message_id = message.mark_messages_as_read(
+            db,
+            conv_id,
+            current_user.id,
+            up_to_message_id=up_to_message_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if last_read_message_id is not None:
+        # Badges des autres appareils de l'utilisateur
+        await websocket_manager.push_unread_counts(conv_id, user_ids=[current_user.id])
+    return {"status": "success", "last_read_message_id": last_read_message_id}
+
+@router.get("/conversations/{conversation_id}/read-receipts", response_model=dict)
+async def get_read_receipts(
+    conversation_id: int,
+    message_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Récupérer les accusés de lecture d'une conversation
+
+    Chaque participant est accompagné de son dernier message lu. Avec
+    `message_id`, `read_by` liste les participants ayant lu ce message.
+    """
+    require_participant(db, conversation_id, current_user.id)
+    try:
+        return message.get_read_receipts(db, conversation_id, message_id=message_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 @router.get("/unread-count", response_model=List[Dict[str, int]])
 def get_unread_messages_count(
@@ -190,7 +303,11 @@ async def get_user_conversations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Récupérer toutes les conversations de l'utilisateur"""
+    """Récupérer toutes les conversations de l'utilisateur
+
+    Chaque participant porte sa présence (`status`, `last_seen_at`), lue en
+    un seul lot pour toute la page.
+    """
     try:
         conversations = message.get_user_conversations(
             db,
@@ -198,6 +315,15 @@ async def get_user_conversations(
             skip=skip,
             limit=limit
         )
+        presence = await websocket_manager.presence.get_presence(db, [
+            participant["id"]
+            for conversation in conversations
+            for participant in conversation["participants"]
+        ])
+        for conversation in conversations:
+            for participant in conversation["participants"]:
+                participant["status"] = presence[participant["id"]]["status"]
+                participant["last_seen_at"] = presence[participant["id"]]["last_seen_at"]
         return conversations
     except Exception as e:
         print(f"Error in get_user_conversations endpoint: {e}")
@@ -210,28 +336,81 @@ async def get_user_conversations(
 async def get_conversation_history(
     conversation_id: int,
     page: int = 1,
-    page_size: int = 50,
+    page_size: int = MESSAGE_PAGE_SIZE,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Récupérer l'historique complet d'une conversation avec pagination"""
-    total_messages = message.get_conversation_messages_count(db, conversation_id)
-    total_pages = (total_messages + page_size - 1) // page_size
+    """Récupérer l'historique complet d'une conversation avec pagination
+
+    Deux modes sont disponibles :
+    - par curseur (`cursor`, `before_id` ou `after_id`) : la réponse contient
+      `next_cursor` (messages plus anciens) et `prev_cursor` (plus récents) ;
+    - par page (`page`), conservé pour les anciennes versions de l'application.
+
+    Le total de messages est lu dans le résumé de la conversation. En mode
+    curseur, il n'est renvoyé que si `include_total` est vrai.
+    """
+    if cursor:
+        try:
+            position = decode_id_cursor(cursor, ("before_id", "after_id"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if position["before_id"] is None and position["after_id"] is None:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        before_id, after_id = position["before_id"], position["after_id"]
+    
+    require_participant(db, conversation_id, current_user.id)
+    keyset = before_id is not None or after_id is not None
     
+    # Une ligne de plus pour savoir s'il reste des messages après la page
     messages = message.get_conversation_messages(
         db,
         conversation_id=conversation_id,
-        skip=(page - 1) * page_size,
-        limit=page_size
+        skip=0 if keyset else (page - 1) * page_size,
+        limit=page_size + 1,
+        before_id=before_id,
+        after_id=after_id
     )
+    has_more = len(messages) > page_size
+    if has_more:
+        # Retirer le message en trop du côté opposé à la référence
+        messages = messages[1:] if after_id is not None and before_id is None else messages[:-1]
     
-    return {
+    if after_id is not None and before_id is None:
+        has_older, has_newer = True, has_more
+    else:
+        has_older, has_newer = has_more, keyset or page > 1
+    
+    next_cursor = None
+    prev_cursor = None
+    if messages and has_older:
+        next_cursor = encode_cursor({"before_id": messages[-1]["id"]})
+    if messages and has_newer:
+        prev_cursor = encode_cursor({"after_id": messages[0]["id"]})
+    
+    if include_total is None:
+        include_total = not keyset
+    total_messages = message.get_conversation_messages_count(db, conversation_id) if include_total else None
+    
+    response = {
         "messages": messages,
+        "page_size": page_size,
+        "has_more": has_older,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
         "total_messages": total_messages,
-        "current_page": page,
-        "total_pages": total_pages,
-        "page_size": page_size
+        "current_page": None,
+        "total_pages": None
     }
+    if not keyset:
+        response["current_page"] = page
+        if total_messages is not None:
+            response["total_pages"] = (total_messages + page_size - 1) // page_size
+    return ORJSONResponse(response)
 
 @router.get("/conversations/unread", response_model=Dict[str, int])
 async def get_unread_messages_by_conversation(
@@ -241,6 +420,113 @@ async def get_unread_messages_by_conversation(
     """Récupérer le nombre de messages non lus par conversation"""
     return message.get_unread_count_by_conversation(db, current_user.id)
 
+@router.get("/sync", response_model=dict)
+async def sync_messages(
+    since: Optional[str] = None,
+    limit: int = SYNC_PAGE_SIZE,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Synchroniser toutes les conversations de l'utilisateur en une requête
+
+    `since` est le jeton `next_token` de la réponse précédente ; sans jeton,
+    toutes les données sont renvoyées. Tant que `has_more` est vrai, le client
+    rappelle l'endpoint avec `next_token` pour obtenir la suite des messages.
+    Deux synchronisations successives se recouvrent de quelques secondes pour
+    ne manquer aucune écriture concurrente : les messages sont à dédoublonner
+    par ID côté client.
+    """
+    limit = max(1, min(limit, SYNC_MAX_PAGE_SIZE))
+    since_at = None
+    until_at = datetime.utcnow()
+    after = None
+    if since:
+        try:
+            token = decode_cursor(since)
+            since_at = datetime.fromisoformat(token["since"]) if token.get("since") else None
+            if token.get("until"):
+                until_at = datetime.fromisoformat(token["until"])
+            if token.get("after"):
+                after = (datetime.fromisoformat(token["after"][0]), int(token["after"][1]))
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise HTTPException(status_code=400, detail="Jeton de synchronisation invalide")
+    
+    changes = message.get_sync_changes(
+        db,
+        user_id=current_user.id,
+        since=since_at,
+        until=until_at,
+        after=after,
+        limit=limit
+    )
+    
+    if changes["has_more"]:
+        last_updated_at, last_id = changes["last_position"]
+        next_token = encode_cursor({
+            "since": since_at.isoformat() if since_at else None,
+            "until": until_at.isoformat(),
+            "after": [last_updated_at.isoformat(), last_id]
+        })
+    else:
+        next_token = encode_cursor({"since": (until_at - SYNC_OVERLAP).isoformat()})
+    
+    return ORJSONResponse({
+        "messages": changes["messages"],
+        "read_watermarks": changes["read_watermarks"],
+        "conversations": changes["conversations"],
+        "has_more": changes["has_more"],
+        "next_token": next_token
+    })
+
+@router.get("/search", response_model=dict)
+async def search_messages(
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = SEARCH_PAGE_SIZE,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rechercher dans les messages des conversations de l'utilisateur
+
+    Les résultats vont du plus récent au plus ancien ; chacun contient un
+    extrait `snippet` où les termes trouvés sont entourés de <mark>.
+    `next_cursor` permet d'obtenir les résultats suivants.
+    """
+    q = q.strip()
+    if len(q) < 2:
+        raise HTTPException(
+            status_code=400,
+            detail="La recherche doit contenir au moins 2 caractères"
+        )
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    
+    before_id = None
+    if cursor:
+        try:
+            before_id = decode_id_cursor(cursor, ("before_id",))["before_id"]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        if before_id is None:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+    
+    # Une ligne de plus pour savoir s'il reste des résultats
+    results = message.search_messages(
+        db,
+        user_id=current_user.id,
+        query=q,
+        before_id=before_id,
+        limit=limit + 1
+    )
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor({"before_id": results[-1]["id"]})
+    
+    return ORJSONResponse({
+        "results": results,
+        "next_cursor": next_cursor
+    })
+
 @router.get("/conversations/{conversation_id}/participants", response_model=List[User])
 async def get_conversation_participants(
     conversation_id: int,
@@ -248,23 +534,45 @@ async def get_conversation_participants(
     current_user: User = Depends(get_current_user)
 ):
     """Récupérer la liste des participants d'une conversation"""
+    require_participant(db, conversation_id, current_user.id)
     return message.get_conversation_participants(db, conversation_id)
 
+@router.get("/presence", response_model=List[dict])
+async def get_presence(
+    user_ids: List[int] = Query(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Récupérer la présence de plusieurs utilisateurs (`?user_ids=1&user_ids=2`)
+
+    Seuls les utilisateurs qui partagent une conversation avec l'appelant
+    sont renvoyés ; les autres identifiants sont ignorés.
+    """
+    if len(user_ids) > PRESENCE_MAX_USERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Au plus {PRESENCE_MAX_USERS} utilisateurs par requête"
+        )
+    contact_ids = message.get_contact_ids(db, current_user.id, user_ids)
+    presence = await websocket_manager.presence.get_presence(db, contact_ids)
+    return list(presence.values())
+
 @router.get("/conversations/{conversation_id}/typing", response_model=List[dict])
 async def get_typing_users(
     conversation_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Récupérer la liste des utilisateurs en train d'écrire"""
-    typing_users = message.get_typing_users(db, conversation_id)
+    """Récupérer la liste des utilisateurs en train d'écrire (état éphémère des WebSockets)"""
+    require_participant(db, conversation_id, current_user.id)
+    typing_users = await websocket_manager.typing.get_typing_users(conversation_id)
     return [
         {
-            "user_id": status.user_id,
-            "is_typing": status.is_typing,
-            "last_typed_at": status.last_typed_at
+            "user_id": user_id,
+            "is_typing": True,
+            "last_typed_at": last_typed_at
         }
-        for status in typing_users
+        for user_id, last_typed_at in typing_users
     ]
 
 @router.get("/auth/test")
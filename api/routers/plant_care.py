@@ -16,6 +16,7 @@ from crud.message import message
 from models.message import ConversationType
 from schemas.message import MessageCreate
 from services.email.email_service import EmailService
+from services.websocket.ws_manager import manager as websocket_manager
 
 router = APIRouter(
     prefix="/plant-care",
@@ -130,6 +131,8 @@ async def update_plant_care_status(
     db.commit()
     db.refresh(db_care)
 
+    await websocket_manager.notify_conversation_created(conversation, [db_care.owner_id, current_user.id])
+
     # Récupérer les informations nécessaires pour l'email
     owner = user_crud.get(db, id=db_care.owner_id)
     caretaker = user_crud.get(db, id=current_user.id)
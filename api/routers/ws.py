@@ -1,131 +1,242 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Header
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Header
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from typing import Optional
 import json
+import time
 import uuid
 
-from utils.database import get_db
 from utils.security import get_current_user_ws
+from utils.platform import detect_platform
 from services.websocket.ws_manager import manager
-from models.user_status import UserPresence, UserStatus
+from services.websocket.connection import ClientConnection, serialize_frame
 from crud.message import message as message_crud
+from schemas.message import MessageBatchCreate
 
 router = APIRouter(tags=["websocket"])
 
-@router.websocket("/ws/{conversation_id}")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    conversation_id: int,
-    token: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    print(f"WebSocket connection attempt for conversation {conversation_id}")
+def load_user(db: Session, token: str):
+    return get_current_user_ws(token, db)
+
+async def authenticate(websocket: WebSocket, token: Optional[str]):
+    """Authentifie la socket ; la ferme (1008) et retourne None en cas d'échec"""
     print(f"Token provided: {token is not None}")
-    
+
     if token is None:
         print("No token provided, closing connection")
         await websocket.close(code=1008)  # Policy Violation
-        return
+        return None
 
-    # Authentifier l'utilisateur
     try:
-        current_user = await get_current_user_ws(token, db)
+        current_user = await manager.run_in_session(load_user, token)
         print(f"User authenticated: {current_user.id}")
+        return current_user
     except Exception as e:
         print(f"Authentication failed: {e}")
         await websocket.close(code=1008)
-        return
+        return None
 
+async def open_connection(websocket: WebSocket, user_id: int) -> ClientConnection:
+    """Accepte la socket et marque l'utilisateur en ligne"""
     # Générer un ID unique pour cette connexion
     socket_id = str(uuid.uuid4())
+    connection = await manager.connect(websocket, user_id, socket_id, detect_platform(websocket).value)
+    print(f"WebSocket connected for user {user_id}")
+    # État initial des badges, tenu à jour ensuite par les événements `unread_changed`
+    await manager.send_unread_snapshot(connection)
+    return connection
 
-    try:
-        # Accepter la connexion
-        await manager.connect(websocket, current_user.id, socket_id)
-        print(f"WebSocket connected for user {current_user.id}")
-
-        # Mettre à jour ou créer le statut de présence
-        presence = db.query(UserPresence).filter(UserPresence.user_id == current_user.id).first()
-        if not presence:
-            presence = UserPresence(user_id=current_user.id)
-            db.add(presence)
-        
-        presence.status = UserStatus.ONLINE
-        presence.socket_id = socket_id
-        db.commit()
+async def close_connection(connection: ClientConnection):
+    """Retire la socket et notifie les participants de ses conversations"""
+    print(f"WebSocket disconnected for user {connection.user_id}")
+    await manager.release(connection)
 
-        # Ajouter l'utilisateur aux participants de la conversation
-        if conversation_id not in manager.conversation_participants:
-            manager.conversation_participants[conversation_id] = set()
-        manager.conversation_participants[conversation_id].add(current_user.id)
+def send_error(connection: ClientConnection, detail: str, conversation_id: Optional[int] = None):
+    connection.enqueue(serialize_frame({"type": "error", "conversation_id": conversation_id, "detail": detail}))
+
+async def handle_frame(connection: ClientConnection, data: dict):
+    """Traite une trame reçue d'un client
 
+    Toute trame prouve que le client est vivant (voir `sweep_connections`) ;
+    `pong` répond au ping du serveur et `ping` renouvelle la présence de la
+    socket ; `subscribe` / `unsubscribe` gèrent les abonnements ; les autres
+    trames portent un `conversation_id` auquel la socket doit être abonnée.
+    Chaque accès base ouvre sa propre session hors de la boucle : une
+    écriture lente ne bloque pas les autres sockets du worker, et une
+    socket inactive ne garde aucune connexion du pool.
+    """
+    received_at = time.time()  # Début de la mesure de livraison d'un message
+    user_id = connection.user_id
+    message_type = data.get("type")
+    conversation_id = data.get("conversation_id")
+    connection.touch()
+
+    if message_type == "pong":
+        return
+
+    if message_type == "ping":
+        # Battement du client : la socket reste présente
+        await manager.heartbeat(connection)
+        connection.enqueue(serialize_frame({"type": "pong"}))
+        return
+
+    if message_type == "subscribe":
+        last_seq = data.get("last_seq")
+        if not isinstance(conversation_id, int):
+            send_error(connection, "conversation_id manquant ou invalide")
+            return
+        if not await manager.is_participant(user_id, conversation_id):
+            send_error(connection, "Vous ne participez pas à cette conversation", conversation_id)
+        elif isinstance(last_seq, int):
+            # Reconnexion : rejouer les événements manqués avant le direct
+            connection.enqueue(serialize_frame({"type": "subscribed", "conversation_id": conversation_id}))
+            await manager.resume_conversation(connection, conversation_id, last_seq)
+        else:
+            await manager.join_conversation(connection, conversation_id)
+            current_seq = await manager.run_in_session(message_crud.get_last_seq, conversation_id)
+            connection.enqueue(serialize_frame({"type": "subscribed", "conversation_id": conversation_id, "seq": current_seq}))
+        return
+
+    if message_type == "unsubscribe":
+        await manager.leave_conversation(connection, conversation_id)
+        connection.enqueue(serialize_frame({"type": "unsubscribed", "conversation_id": conversation_id}))
+        return
+
+    if conversation_id not in connection.conversations:
+        send_error(connection, "Socket non abonnée à cette conversation", conversation_id)
+        return
+
+    if message_type == "message":
+        # Envoyer un nouveau message
+        content = data.get("content")
+        if content:
+            try:
+                await manager.handle_message(
+                    user_id=user_id,
+                    conversation_id=conversation_id,
+                    content=content,
+                    client_msg_id=data.get("client_msg_id"),
+                    received_at=received_at
+                )
+            except ValidationError:
+                # Message mal formé : seule la trame est refusée, la socket reste ouverte
+                send_error(connection, "Message invalide", conversation_id)
+            except ValueError as e:
+                send_error(connection, str(e), conversation_id)
+
+    elif message_type == "messages":
+        # Envoyer un lot de messages (file d'attente hors ligne)
         try:
-            while True:
-                data = await websocket.receive_json()
-                print(f"Received WebSocket data: {data}")
-                
-                # Gérer les différents types de messages
-                message_type = data.get("type")
-                
-                if message_type == "message":
-                    # Envoyer un nouveau message
-                    content = data.get("content")
-                    if content:
-                        await manager.handle_message(
-                            user_id=current_user.id,
-                            conversation_id=conversation_id,
-                            content=content,
-                            db=db
-                        )
-
-                elif message_type == "typing":
-                    # Mettre à jour le statut de frappe
-                    is_typing = data.get("is_typing", False)
-                    await manager.handle_typing_status(
-                        user_id=current_user.id,
-                        conversation_id=conversation_id,
-                        is_typing=is_typing,
-                        db=db
-                    )
-
-                elif message_type == "read":
-                    # Marquer les messages comme lus
-                    message_crud.mark_messages_as_read(
-                        db,
-                        conversation_id=conversation_id,
-                        user_id=current_user.id
-                    )
-                    # Notifier les autres participants
-                    await manager.broadcast_to_conversation(
-                        {
-                            "type": "messages_read",
-                            "user_id": current_user.id,
-                            "conversation_id": conversation_id
-                        },
-                        conversation_id,
-                        exclude_user_id=current_user.id
-                    )
-
-        except WebSocketDisconnect:
-            print(f"WebSocket disconnected for user {current_user.id}")
-            # Gérer la déconnexion
-            if conversation_id in manager.conversation_participants:
-                manager.conversation_participants[conversation_id].discard(current_user.id)
-                if not manager.conversation_participants[conversation_id]:
-                    del manager.conversation_participants[conversation_id]
-
-            await manager.disconnect(current_user.id, socket_id, db)
-
-            # Notifier les autres participants de la déconnexion
-            await manager.broadcast_to_conversation(
-                {
-                    "type": "user_offline",
-                    "user_id": current_user.id
-                },
-                conversation_id,
-                exclude_user_id=current_user.id
+            batch = MessageBatchCreate(messages=data.get("messages", []))
+            await manager.handle_messages(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                items=batch.messages,
+                received_at=received_at
             )
+        except ValidationError:
+            # Lot mal formé : seule la trame est refusée, la socket reste ouverte
+            send_error(connection, "Lot de messages invalide", conversation_id)
+        except ValueError as e:
+            send_error(connection, str(e), conversation_id)
+
+    elif message_type == "typing":
+        # Mettre à jour le statut de frappe
+        is_typing = data.get("is_typing", False)
+        await manager.handle_typing_status(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            is_typing=is_typing
+        )
+
+    elif message_type == "read":
+        # Marquer les messages comme lus et notifier les autres participants
+        try:
+            await manager.handle_read(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                message_id=data.get("message_id")
+            )
+        except ValueError as e:
+            send_error(connection, str(e), conversation_id)
+
+@router.websocket("/ws")
+async def multiplexed_websocket_endpoint(
+    websocket: WebSocket,
+    token: Optional[str] = None
+):
+    """Socket unique par utilisateur, multiplexée entre ses conversations
+
+    Le client s'abonne aux conversations par des trames
+    `{"type": "subscribe", "conversation_id": ...}` et reçoit sur la même
+    socket les événements qui lui sont propres (`conversation_created`).
+    Les messages et accusés de lecture portent un numéro `seq` croissant
+    par conversation ; après une reconnexion, `"last_seq"` dans la trame
+    `subscribe` rejoue les événements manqués.
+    """
+    print("Multiplexed WebSocket connection attempt")
+    current_user = await authenticate(websocket, token)
+    if current_user is None:
+        return
+
+    connection = None
+    try:
+        connection = await open_connection(websocket, current_user.id)
+        while True:
+            data = await websocket.receive_json()
+            await handle_frame(connection, data)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Erreur WebSocket: {e}")
+        await websocket.close(code=1011)  # Internal Error
+    finally:
+        if connection is not None:
+            await close_connection(connection)
+
+@router.websocket("/ws/{conversation_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    conversation_id: int,
+    token: Optional[str] = None,
+    last_seq: Optional[int] = None
+):
+    """Compatibilité : socket abonnée d'office à une seule conversation
+
+    Les trames sans `conversation_id` visent la conversation du chemin. La
+    socket est fermée (1008) si l'utilisateur n'y participe pas. Un client
+    qui se reconnecte passe `?last_seq=` (dernier numéro reçu) pour
+    recevoir les événements manqués.
+    """
+    print(f"WebSocket connection attempt for conversation {conversation_id}")
+    current_user = await authenticate(websocket, token)
+    if current_user is None:
+        return
+    if not await manager.is_participant(current_user.id, conversation_id):
+        print(f"User {current_user.id} is not a participant of conversation {conversation_id}")
+        await websocket.close(code=1008)  # Policy Violation
+        return
+
+    connection = None
+    try:
+        connection = await open_connection(websocket, current_user.id)
+
+        # Ajouter l'utilisateur aux participants de la conversation
+        if last_seq is not None:
+            await manager.resume_conversation(connection, conversation_id, last_seq)
+        else:
+            await manager.join_conversation(connection, conversation_id)
 
+        while True:
+            data = await websocket.receive_json()
+            data.setdefault("conversation_id", conversation_id)
+            await handle_frame(connection, data)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print(f"Erreur WebSocket: {e}")
-        await websocket.close(code=1011)  # Internal Error 
\ No newline at end of file
+        await websocket.close(code=1011)  # Internal Error
+    finally:
+        # Socket retirée du gestionnaire quelle que soit la cause de la fermeture
+        if connection is not None:
+            await close_connection(connection)
@@ -7,11 +7,20 @@ class ConversationType(str, Enum):
     PLANT_CARE = "plant_care"  # Conversation propriétaire ↔ gardien
     BOTANICAL_ADVICE = "botanical_advice"  # Conversation avec un botaniste
 
+MESSAGE_BATCH_MAX_SIZE = 50  # messages par envoi groupé
+
 class MessageBase(BaseModel):
     content: str = Field(..., max_length=2000)
 
 class MessageCreate(MessageBase):
     conversation_id: int
+    client_msg_id: Optional[str] = Field(None, min_length=1, max_length=64)
+
+class MessageBatchItem(MessageBase):
+    client_msg_id: str = Field(..., min_length=1, max_length=64)
+
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageBatchItem] = Field(..., min_length=1, max_length=MESSAGE_BATCH_MAX_SIZE)
 
 class Message(MessageBase):
     id: int
@@ -20,6 +29,7 @@ class Message(MessageBase):
     created_at: datetime
     updated_at: datetime
     is_read: bool
+    client_msg_id: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -27,6 +37,7 @@ class Message(MessageBase):
 class ConversationParticipant(BaseModel):
     user_id: int
     last_read_at: Optional[datetime] = None
+    last_read_message_id: Optional[int] = None
 
     class Config:
         from_attributes = True
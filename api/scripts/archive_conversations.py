@@ -0,0 +1,40 @@
+"""Script d'archivage des conversations de gardes terminées.
+
+Usage :
+    python scripts/archive_conversations.py [mois]
+
+Déplace les messages des conversations dont la garde est terminée depuis
+plus de `mois` mois (MESSAGE_ARCHIVE_AFTER_MONTHS par défaut) vers la table
+compressée `message_archives`. Les messages restent consultables via
+l'historique de la conversation. Il peut être relancé sans risque, par
+exemple chaque nuit.
+"""
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.database import Base, SessionLocal, engine
+from utils.settings import MESSAGE_ARCHIVE_AFTER_MONTHS
+from scripts.upgrade_schema import upgrade_schema
+from crud.message import message
+
+def archive_conversations(older_than_months: int = MESSAGE_ARCHIVE_AFTER_MONTHS) -> dict:
+    """Archive les conversations terminées et retourne {conversation_id: messages archivés}"""
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        return message.archive_finished_conversations(db, older_than_months)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else MESSAGE_ARCHIVE_AFTER_MONTHS
+    archived = archive_conversations(months)
+    print(f"✅ {len(archived)} conversation(s) archivée(s), {sum(archived.values())} message(s) déplacé(s)")
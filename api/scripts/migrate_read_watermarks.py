@@ -0,0 +1,68 @@
+"""Script de migration vers les filigranes de lecture.
+
+Usage :
+    python scripts/migrate_read_watermarks.py
+
+La lecture n'est plus portée par `messages.is_read` mais par
+`conversation_participants.last_read_message_id`. Ce script ajoute la
+colonne si besoin, puis déduit le filigrane de chaque participant qui n'en a
+pas encore : le plus grand ID de message déjà lu, d'après `is_read` ou
+`last_read_at`. Les compteurs de non lus sont ensuite recalculés. Il peut
+être relancé sans risque.
+"""
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import func, select, or_, and_
+from sqlalchemy.orm import Session
+
+from utils.database import Base, SessionLocal, engine
+from scripts.upgrade_schema import upgrade_schema
+from models.message import Message, ConversationParticipant
+from crud.message import message
+
+def derive_read_watermarks(db: Session) -> int:
+    """Renseigne les filigranes manquants et retourne le nombre de participants traités"""
+    last_read_message_id = (
+        select(func.max(Message.id))
+        .where(
+            Message.conversation_id == ConversationParticipant.conversation_id,
+            or_(
+                Message.is_read == True,
+                and_(
+                    ConversationParticipant.last_read_at.isnot(None),
+                    Message.created_at <= ConversationParticipant.last_read_at
+                )
+            )
+        )
+        .scalar_subquery()
+    )
+    updated = (
+        db.query(ConversationParticipant)
+        .filter(ConversationParticipant.last_read_message_id.is_(None))
+        .update({"last_read_message_id": last_read_message_id}, synchronize_session=False)
+    )
+    message.rebuild_summaries(db, commit=False)
+    db.commit()
+    return updated
+
+def migrate_read_watermarks() -> int:
+    """Met le schéma à jour puis dérive les filigranes de lecture"""
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        return derive_read_watermarks(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    count = migrate_read_watermarks()
+    print(f"✅ Filigrane de lecture calculé pour {count} participant(s)")
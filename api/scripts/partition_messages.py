@@ -0,0 +1,236 @@
+"""Partitionnement mensuel de la table des messages (PostgreSQL uniquement).
+
+Usage :
+    python scripts/partition_messages.py convert
+    python scripts/partition_messages.py ensure [--months-ahead 3]
+    python scripts/partition_messages.py drop-empty --before 2024-01
+
+`convert` transforme la table `messages` en table partitionnée par mois sur
+`created_at` (partitions `messages_AAAA_MM` et `messages_default`) et recopie
+les messages existants. `ensure` crée les partitions des mois à venir ; il
+est aussi appelé à chaque démarrage par `upgrade_schema`. `drop-empty`
+supprime les partitions vides antérieures à un mois donné, typiquement après
+l'archivage des conversations terminées.
+
+Contraintes d'une table partitionnée : la clé primaire devient
+(id, created_at) et l'index sur (conversation_id, sender_id, client_msg_id)
+ne peut plus être unique. L'unicité des IDs client est alors portée par la
+table `message_client_ids`, tenue à jour par un trigger sur `messages` : deux
+renvois concurrents d'un même `client_msg_id` échouent toujours sur une
+violation d'unicité, comme avec l'index unique.
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime
+from typing import List, Optional
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from utils.database import engine as default_engine
+from utils.settings import MESSAGE_PARTITIONS_AHEAD
+from models.message import Message
+from scripts.upgrade_schema import create_search_index
+
+# Unicité de (conversation_id, sender_id, client_msg_id) sur la table partitionnée.
+# Le trigger AFTER ROW est hérité par toutes les partitions, y compris
+# celles créées plus tard par `ensure`.
+CLIENT_MSG_ID_DDL = [
+    "CREATE TABLE message_client_ids ("
+    "conversation_id INTEGER NOT NULL REFERENCES conversations (id) ON DELETE CASCADE, "
+    "sender_id INTEGER NOT NULL, "
+    "client_msg_id VARCHAR(64) NOT NULL, "
+    "PRIMARY KEY (conversation_id, sender_id, client_msg_id))",
+    "CREATE OR REPLACE FUNCTION messages_client_msg_id_unique() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN "
+    "IF NEW.client_msg_id IS NOT NULL AND NEW.sender_id IS NOT NULL THEN "
+    "INSERT INTO message_client_ids (conversation_id, sender_id, client_msg_id) "
+    "VALUES (NEW.conversation_id, NEW.sender_id, NEW.client_msg_id); "
+    "END IF; "
+    "RETURN NEW; "
+    "END IF; "
+    "DELETE FROM message_client_ids "
+    "WHERE conversation_id = OLD.conversation_id AND sender_id = OLD.sender_id "
+    "AND client_msg_id = OLD.client_msg_id; "
+    "RETURN OLD; "
+    "END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER messages_client_msg_id_unique AFTER INSERT OR DELETE ON messages "
+    "FOR EACH ROW EXECUTE FUNCTION messages_client_msg_id_unique()",
+]
+
+def _month_start(value: date, months: int = 0) -> date:
+    """Premier jour du mois de `value`, décalé de `months` mois"""
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+def _partition_name(month: date) -> str:
+    return f"messages_{month.year:04d}_{month.month:02d}"
+
+def is_partitioned(conn: Connection) -> bool:
+    """Indique si la table `messages` est déjà partitionnée"""
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('messages')"
+    )).first() is not None
+
+def list_partitions(conn: Connection) -> List[str]:
+    """Noms des partitions de la table `messages`"""
+    return [
+        name for name, in conn.execute(text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('messages') "
+            "ORDER BY child.relname"
+        ))
+    ]
+
+def ensure_message_partitions(
+    conn: Connection,
+    months_ahead: int = MESSAGE_PARTITIONS_AHEAD,
+    start: Optional[date] = None
+) -> List[str]:
+    """Crée les partitions mensuelles manquantes de `start` (mois courant) à `months_ahead` mois
+
+    Les partitions sont créées à l'avance : une partition ne peut plus être
+    ajoutée si `messages_default` contient déjà des messages de ce mois.
+    Retourne les noms des partitions créées.
+    """
+    existing = set(list_partitions(conn))
+    first_month = _month_start(start or datetime.utcnow().date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _month_start(first_month, offset)
+        name = _partition_name(month)
+        if name in existing:
+            continue
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month_start(month, 1).isoformat()}')"
+        ))
+        created.append(name)
+    if "messages_default" not in existing:
+        conn.execute(text("CREATE TABLE messages_default PARTITION OF messages DEFAULT"))
+    return created
+
+def drop_empty_message_partitions(conn: Connection, before: date) -> List[str]:
+    """Supprime les partitions mensuelles vides entièrement antérieures à `before`"""
+    limit = _month_start(before)
+    dropped = []
+    for name in list_partitions(conn):
+        if name == "messages_default":
+            continue
+        year, month = (int(part) for part in name.rsplit("_", 2)[1:])
+        if _month_start(date(year, month, 1), 1) > limit:
+            continue
+        if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is not None:
+            continue
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+def partition_messages(engine: Engine = default_engine, months_ahead: int = MESSAGE_PARTITIONS_AHEAD) -> bool:
+    """Convertit la table `messages` en table partitionnée par mois
+
+    L'opération se fait dans une seule transaction et recopie tous les
+    messages : prévoir une fenêtre de maintenance. Retourne False si la table
+    est déjà partitionnée.
+    """
+    if engine.dialect.name != "postgresql":
+        raise ValueError("Le partitionnement des messages nécessite PostgreSQL")
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return False
+
+        conn.execute(text("ALTER TABLE messages RENAME TO messages_unpartitioned"))
+        conn.execute(text(
+            "ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey"
+        ))
+        for index in Message.__table__.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_messages_content_fts"))
+
+        # Une clé étrangère ne peut pas viser une table partitionnée sur `id` seul
+        foreign_keys = conn.execute(text(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = 'messages_unpartitioned'::regclass"
+        )).all()
+        for table_name, constraint_name in foreign_keys:
+            print(f"🔧 Suppression de la clé étrangère {table_name}.{constraint_name}")
+            conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{constraint_name}"'))
+
+        conn.execute(text(
+            "CREATE TABLE messages (LIKE messages_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (created_at)"
+        ))
+        conn.execute(text("ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL"))
+        conn.execute(text("ALTER TABLE messages ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text(
+            "ALTER TABLE messages ADD FOREIGN KEY (conversation_id) "
+            "REFERENCES conversations (id) ON DELETE CASCADE"
+        ))
+        conn.execute(text(
+            "ALTER TABLE messages ADD FOREIGN KEY (sender_id) REFERENCES users (id) ON DELETE SET NULL"
+        ))
+
+        oldest = conn.execute(text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+        current = _month_start(datetime.utcnow().date())
+        first_month = _month_start(oldest.date()) if oldest else current
+        months = (current.year - first_month.year) * 12 + current.month - first_month.month
+        created = ensure_message_partitions(conn, months + months_ahead, start=first_month)
+        print(f"🔧 {len(created)} partitions mensuelles créées")
+
+        # Avant la recopie : les IDs client existants sont enregistrés par le trigger
+        for ddl in CLIENT_MSG_ID_DDL:
+            conn.execute(text(ddl))
+        print("🔧 Unicité des IDs client reportée sur la table message_client_ids")
+
+        # La date est la clé de partitionnement : elle ne peut plus être nulle
+        conn.execute(text("UPDATE messages_unpartitioned SET created_at = now() WHERE created_at IS NULL"))
+        conn.execute(text("INSERT INTO messages SELECT * FROM messages_unpartitioned"))
+
+        # La séquence appartient à l'ancienne colonne : la détacher avant suppression
+        conn.execute(text("ALTER SEQUENCE messages_id_seq OWNED BY NONE"))
+        conn.execute(text("DROP TABLE messages_unpartitioned"))
+        conn.execute(text("ALTER SEQUENCE messages_id_seq OWNED BY messages.id"))
+
+        for index in Message.__table__.indexes:
+            # Un index unique doit inclure la clé de partitionnement ; l'index
+            # (conversation_id, sender_id, client_msg_id) reste utile à la recherche des renvois
+            unique = "UNIQUE " if index.unique and "created_at" in index.columns else ""
+            columns = ", ".join(column.name for column in index.columns)
+            conn.execute(text(f"CREATE {unique}INDEX {index.name} ON messages ({columns})"))
+        create_search_index(conn)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("convert")
+    ensure_parser = subparsers.add_parser("ensure")
+    ensure_parser.add_argument("--months-ahead", type=int, default=MESSAGE_PARTITIONS_AHEAD)
+    drop_parser = subparsers.add_parser("drop-empty")
+    drop_parser.add_argument("--before", required=True, help="Mois au format AAAA-MM")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        if partition_messages():
+            print("✅ Table des messages partitionnée")
+        else:
+            print("✅ Table des messages déjà partitionnée")
+    elif args.command == "ensure":
+        with default_engine.begin() as conn:
+            created = ensure_message_partitions(conn, args.months_ahead)
+        print(f"✅ {len(created)} partitions créées")
+    else:
+        before = datetime.strptime(args.before, "%Y-%m").date()
+        with default_engine.begin() as conn:
+            dropped = drop_empty_message_partitions(conn, before)
+        print(f"✅ {len(dropped)} partitions vides supprimées")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Script de reconstruction des résumés de conversation.
+
+Usage :
+    python scripts/rebuild_conversation_summaries.py [conversation_id ...]
+
+Recalcule `conversation_summaries` et les compteurs de non lus des
+participants à partir des tables `messages` et `conversation_participants`.
+Sans argument, toutes les conversations sont reconstruites.
+"""
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.database import Base, SessionLocal, engine
+from scripts.upgrade_schema import upgrade_schema
+from crud.message import message
+
+def rebuild_conversation_summaries(conversation_ids=None) -> int:
+    """Reconstruit les résumés des conversations données (toutes par défaut)"""
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+
+    db = SessionLocal()
+    try:
+        return message.rebuild_summaries(db, conversation_ids=conversation_ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    count = rebuild_conversation_summaries(ids)
+    print(f"✅ {count} résumé(s) de conversation reconstruit(s)")
@@ -0,0 +1,95 @@
+"""Script de mise à niveau du schéma d'une base existante."""
+import os
+import sys
+
+# Ajouter le répertoire parent au PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+import models  # noqa: F401  Enregistre tous les modèles dans Base.metadata
+from utils.database import Base, engine as default_engine
+
+def upgrade_schema(engine: Engine = default_engine) -> None:
+    """Ajoute les colonnes et index manquants aux tables existantes.
+
+    `Base.metadata.create_all` crée les nouvelles tables mais ne modifie pas
+    celles qui existent déjà. Cette fonction est idempotente et peut être
+    appelée à chaque démarrage.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    default = default.text if hasattr(default, "text") else f"'{default}'"
+                    ddl += f" DEFAULT {default}"
+                print(f"🔧 Ajout de la colonne {table.name}.{column.name}")
+                conn.execute(text(ddl))
+
+            # Un index dont les colonnes ont changé est recréé sous le même nom
+            existing_indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                columns = [column.name for column in index.columns]
+                if index.name in existing_indexes and existing_indexes[index.name] != columns:
+                    print(f"🔧 Recréation de l'index {index.name} ({', '.join(columns)})")
+                    index.drop(conn)
+                index.create(conn, checkfirst=True)
+
+        create_search_index(conn)
+
+        if conn.dialect.name == "postgresql":
+            # Import local : partition_messages dépend de ce module
+            from scripts.partition_messages import is_partitioned, ensure_message_partitions
+            if is_partitioned(conn):
+                ensure_message_partitions(conn)
+
+# Recherche plein texte sur messages.content : index GIN sur PostgreSQL,
+# table FTS5 tenue à jour par des triggers sur SQLite
+POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_fts "
+    "ON messages USING GIN (to_tsvector('french'::regconfig, content))",
+]
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+def create_search_index(conn: Connection) -> None:
+    """Crée l'index de recherche plein texte des messages s'il n'existe pas"""
+    if conn.dialect.name == "postgresql":
+        for ddl in POSTGRES_SEARCH_DDL:
+            conn.execute(text(ddl))
+    elif conn.dialect.name == "sqlite":
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        )).first()
+        for ddl in SQLITE_SEARCH_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            print("🔧 Indexation plein texte des messages existants")
+            conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+
+if __name__ == "__main__":
+    upgrade_schema()
+    print("✅ Schéma à jour")
@@ -71,6 +71,31 @@ class EmailService:
             }
         )
 
+    async def send_new_messages_digest(
+        self,
+        recipient_email: str,
+        sender_names: List[str],
+        message_count: int,
+        conversation_id: str
+    ) -> None:
+        """
+        Envoie un récapitulatif des messages reçus dans une conversation.
+        """
+        subject = (
+            f"Nouveau message de {', '.join(sender_names)}" if message_count == 1
+            else f"{message_count} nouveaux messages de {', '.join(sender_names)}"
+        )
+        await self.send_email(
+            recipients=[recipient_email],
+            subject=subject,
+            template_name="new_messages_digest",
+            template_data={
+                "sender_names": sender_names,
+                "message_count": message_count,
+                "conversation_link": f"/conversations/{conversation_id}"
+            }
+        )
+
     async def send_password_reset(
         self,
         recipient_email: str,
@@ -0,0 +1,153 @@
+"""Emails de nouveaux messages, regroupés par conversation et envoyés hors des requêtes."""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from crud.message import message as message_crud
+from services.email.email_service import EmailService
+from services.monitoring_service import monitoring_service
+from utils.settings import NOTIFICATION_DIGEST_SECONDS, NOTIFICATION_MAX_ATTEMPTS, NOTIFICATION_RETRY_SECONDS
+
+# (conversation_id, user_id destinataire, email, noms des expéditeurs, nombre de messages)
+DigestEmail = Tuple[int, int, str, List[str], int]
+
+class NotificationScheduler:
+    """Regroupe les nouveaux messages d'une conversation en un email par destinataire
+
+    `notify` ne fait qu'incrémenter un compteur : aucune requête ni envoi
+    SMTP sur le chemin d'un message. Le premier message d'une conversation
+    ouvre une fenêtre de `window` secondes ; à sa fin, chaque participant
+    hors ligne reçoit un seul email pour les messages des autres. Les
+    participants connectés n'en reçoivent pas. Un envoi échoué est retenté
+    jusqu'à `max_attempts` fois, avec un délai doublé à chaque tentative.
+    Les échéances sont lues sur `clock` (horloge monotone par défaut).
+    """
+
+    def __init__(
+        self,
+        presence,
+        run_in_session: Callable,
+        window: float = NOTIFICATION_DIGEST_SECONDS,
+        max_attempts: int = NOTIFICATION_MAX_ATTEMPTS,
+        retry_delay: float = NOTIFICATION_RETRY_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.presence = presence
+        self.run_in_session = run_in_session
+        self.window = window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.email_service = EmailService()
+        # {conversation_id: (échéance monotone, {sender_id: nombre de messages})}
+        self._digests: Dict[int, Tuple[float, Dict[int, int]]] = {}
+        # [(échéance monotone, tentative, email)]
+        self._retries: List[Tuple[float, int, DigestEmail]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self, conversation_id: int, sender_id: int, message_count: int = 1) -> None:
+        """Compte de nouveaux messages dans le récapitulatif de la conversation"""
+        _, senders = self._digests.setdefault(conversation_id, (self.clock() + self.window, {}))
+        senders[sender_id] = senders.get(sender_id, 0) + message_count
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self, force: bool = False) -> None:
+        """Envoie les récapitulatifs et nouvelles tentatives arrivés à échéance (tous si `force`)"""
+        now = self.clock()
+        emails, waiting = [], []
+        for due_at, attempt, email in self._retries:
+            if force or due_at <= now:
+                emails.append((attempt, email))
+            else:
+                waiting.append((due_at, attempt, email))
+        self._retries = waiting
+        due = [
+            conversation_id for conversation_id, (due_at, _) in self._digests.items()
+            if force or due_at <= now
+        ]
+        for conversation_id in due:
+            _, senders = self._digests.pop(conversation_id)
+            try:
+                built = await self.run_in_session(self._build_emails, conversation_id, senders)
+            except Exception as e:
+                print(f"Erreur lors de la préparation des notifications de la conversation {conversation_id}: {e}")
+                if not force:
+                    # Récapitulatif reporté, fusionné avec les messages arrivés depuis
+                    _, pending = self._digests.setdefault(conversation_id, (now + self.retry_delay, {}))
+                    for sender_id, count in senders.items():
+                        pending[sender_id] = pending.get(sender_id, 0) + count
+                continue
+            emails.extend((1, email) for email in built)
+        if not emails:
+            return
+
+        # Les destinataires connectés entre-temps ont vu les messages
+        online = await self.presence.online_users([email[1] for _, email in emails])
+        for _, email in emails:
+            if email[1] in online:
+                monitoring_service.message_notification_emails.labels(result="skipped_online").inc()
+        await asyncio.gather(*(
+            self._send(email, attempt, retry=not force)
+            for attempt, email in emails if email[1] not in online
+        ))
+
+    async def shutdown(self) -> None:
+        """Arrête la tâche d'envoi puis envoie ce qui reste, sans nouvelle tentative"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush(force=True)
+
+    async def _send(self, email: DigestEmail, attempt: int, retry: bool = True) -> None:
+        conversation_id, _, recipient_email, sender_names, message_count = email
+        try:
+            await self.email_service.send_new_messages_digest(
+                recipient_email=recipient_email,
+                sender_names=sender_names,
+                message_count=message_count,
+                conversation_id=str(conversation_id)
+            )
+        except Exception as e:
+            if retry and attempt < self.max_attempts:
+                monitoring_service.message_notification_emails.labels(result="retried").inc()
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                self._retries.append((self.clock() + delay, attempt + 1, email))
+                return
+            monitoring_service.message_notification_emails.labels(result="failed").inc()
+            print(f"Erreur lors de l'envoi de l'email de notification à {recipient_email}: {e}")
+            return
+        monitoring_service.message_notification_emails.labels(result="sent").inc()
+
+    async def _run(self) -> None:
+        """Vérifie les échéances à intervalle régulier"""
+        tick = min(1.0, self.window / 2, self.retry_delay / 2)
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Erreur lors de l'envoi des notifications: {e}")
+
+    @staticmethod
+    def _build_emails(db: Session, conversation_id: int, senders: Dict[int, int]) -> List[DigestEmail]:
+        """Un email par participant, pour les messages des autres participants"""
+        participants = message_crud.get_conversation_participants(db, conversation_id)
+        names = {
+            participant.id: f"{participant.prenom} {participant.nom}"
+            for participant in participants
+        }
+        emails = []
+        for participant in participants:
+            others = [sender_id for sender_id in senders if sender_id != participant.id]
+            if others:
+                emails.append((
+                    conversation_id,
+                    participant.id,
+                    participant.email,
+                    [names.get(sender_id, "Utilisateur inconnu") for sender_id in others],
+                    sum(senders[sender_id] for sender_id in others)
+                ))
+        return emails
@@ -56,6 +56,133 @@ class MonitoringService:
             ['error_type', 'endpoint', 'platform']
         )
         
+        # Tampon des derniers messages par conversation (un par worker)
+        self.message_buffer_requests = Counter(
+            'arosaje_message_buffer_requests_total',
+            'Recent message buffer lookups',
+            ['result']
+        )
+        
+        self.message_buffer_conversations = Gauge(
+            'arosaje_message_buffer_conversations',
+            'Number of conversations held in the recent message buffer'
+        )
+        
+        self.message_buffer_bytes = Gauge(
+            'arosaje_message_buffer_bytes',
+            'Estimated memory used by the recent message buffer'
+        )
+        
+        # Appartenance aux conversations (utils.membership_cache) : taux de succès = hit / (hit + miss)
+        self.membership_cache_requests = Counter(
+            'arosaje_membership_cache_requests_total',
+            'Conversation membership cache lookups',
+            ['result']
+        )
+        
+        self.membership_cache_entries = Gauge(
+            'arosaje_membership_cache_entries',
+            'Number of (user, conversation) pairs held in the membership cache'
+        )
+        
+        # Files d'envoi WebSocket (services.websocket.connection)
+        self.websocket_queued_frames = Gauge(
+            'arosaje_websocket_queued_frames',
+            'Number of websocket frames waiting in send queues'
+        )
+        
+        self.websocket_dropped_frames = Counter(
+            'arosaje_websocket_dropped_frames_total',
+            'Websocket frames dropped for slow consumers',
+            ['reason']
+        )
+        
+        self.websocket_slow_consumer_disconnects = Counter(
+            'arosaje_websocket_slow_consumer_disconnects_total',
+            'Websocket connections closed because the client could not keep up'
+        )
+        
+        self.websocket_connections = Gauge(
+            'arosaje_websocket_connections',
+            'Open websocket connections on this worker'
+        )
+        
+        self.websocket_connection_memory = Gauge(
+            'arosaje_websocket_connection_memory_bytes',
+            'Estimated memory of one connection record (subscriptions and send queue included)'
+        )
+        
+        self.websocket_reaped_connections = Counter(
+            'arosaje_websocket_reaped_connections_total',
+            'Websocket connections closed by the server, by reason (idle or connection_limit)',
+            ['reason']
+        )
+        
+        self.websocket_resumes = Counter(
+            'arosaje_websocket_resumes_total',
+            'Websocket stream resumptions, by replay source (log, database or none)',
+            ['source']
+        )
+        
+        self.websocket_typing_events = Counter(
+            'arosaje_websocket_typing_events_total',
+            'Typing frames received, by outcome (transition, refresh or coalesced)',
+            ['result']
+        )
+        
+        # Emails de nouveaux messages (services.email.notification_scheduler)
+        self.message_notification_emails = Counter(
+            'arosaje_message_notification_emails_total',
+            'New-message notification emails, by outcome (sent, skipped_online, retried or failed)',
+            ['result']
+        )
+        
+        # Accès base des WebSockets, exécutés hors de la boucle (utils.db_executor)
+        self.websocket_db_duration = Histogram(
+            'arosaje_websocket_db_duration_seconds',
+            'Time spent by websocket database operations, queueing included',
+            ['operation']
+        )
+        
+        self.websocket_db_pending = Gauge(
+            'arosaje_websocket_db_pending',
+            'Websocket database operations queued or running in the executor'
+        )
+        
+        self.websocket_write_batch_size = Histogram(
+            'arosaje_websocket_write_batch_size',
+            'Websocket message writes committed together by the write coalescer',
+            buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+        )
+        
+        # Livraison d'un message, de la trame de l'expéditeur à l'écriture sur la socket du destinataire
+        # (services.websocket.delivery_trace) ; `delivery` : local (même worker) ou remote (autre worker)
+        self.websocket_delivery_latency = Histogram(
+            'arosaje_websocket_delivery_latency_seconds',
+            'End-to-end message delivery latency, from sender frame receipt to recipient socket write',
+            ['platform', 'delivery'],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+        )
+        
+        self.websocket_delivery_stage_duration = Histogram(
+            'arosaje_websocket_delivery_stage_seconds',
+            'Message delivery stages: commit (receipt to commit), publish (commit to fan-out), write (fan-out to socket write)',
+            ['stage', 'delivery'],
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+        )
+        
+        # Pool de connexions SQLAlchemy (utils.database)
+        self.db_pool_checkout_duration = Histogram(
+            'arosaje_db_pool_checkout_duration_seconds',
+            'Time spent waiting for a pooled database connection',
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+        )
+        
+        self.db_pool_connections_in_use = Gauge(
+            'arosaje_db_pool_connections_in_use',
+            'Database connections currently checked out of the pool'
+        )
+        
         # Configuration des logs
         self._setup_logging()
         
@@ -100,6 +227,15 @@ class MonitoringService:
         error_handler = logging.FileHandler(log_dir / "monitoring_errors.log")
         error_handler.setFormatter(self._get_json_formatter())
         self.error_logger.addHandler(error_handler)
+        
+        # Logger des livraisons de messages les plus lentes (services.websocket.delivery_trace)
+        self.delivery_logger = logging.getLogger("slow_deliveries")
+        self.delivery_logger.setLevel(logging.INFO)
+        self.delivery_logger.propagate = False
+        
+        delivery_handler = logging.FileHandler(log_dir / "slow_deliveries.log")
+        delivery_handler.setFormatter(self._get_json_formatter())
+        self.delivery_logger.addHandler(delivery_handler)
 
     def _get_json_formatter(self):
         """Retourne un formatter JSON pour les logs"""
@@ -0,0 +1,180 @@
+"""Connexion WebSocket avec file d'envoi bornée et tâche d'écriture dédiée."""
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from typing import Deque, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from services.monitoring_service import monitoring_service
+from services.websocket.delivery_trace import DeliveryTrace, record_delivery
+from utils.settings import WEBSOCKET_SEND_QUEUE_SIZE, WEBSOCKET_SEND_TIMEOUT
+
+# Code de fermeture envoyé à un client trop lent (« Try Again Later »)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+def serialize_frame(message: dict) -> str:
+    """Sérialise un événement comme `WebSocket.send_json`"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+class ClientConnection:
+    """Socket d'un utilisateur, alimentée par une file d'envoi
+
+    Les diffusions déposent des trames déjà sérialisées dans la file sans
+    attendre le réseau : un client lent ne retarde ni les autres sockets ni
+    la boucle de réception de l'expéditeur. Politique pour les clients lents :
+
+    - au-delà de la moitié de la file, les trames jetables (frappe) sont
+      ignorées ;
+    - file pleine : les trames jetables en attente sont retirées pour faire
+      de la place ;
+    - s'il n'y en a pas, ou si un envoi dépasse `send_timeout`, la
+      connexion est fermée (code 1013) et le client se resynchronise à la
+      reconnexion.
+
+    L'enregistrement est compact (`__slots__`) : un worker en garde un par
+    socket ouverte. Une trame de message porte sa `DeliveryTrace` : son
+    écriture sur la socket mesure la latence de livraison (par plateforme
+    du destinataire).
+    """
+
+    __slots__ = (
+        "websocket", "user_id", "socket_id", "platform", "max_size", "send_timeout", "closed",
+        "conversations", "last_seen", "_frames", "_wakeup", "_close_code", "_writer"
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        socket_id: str,
+        platform: str = "unknown",
+        max_size: int = WEBSOCKET_SEND_QUEUE_SIZE,
+        send_timeout: float = WEBSOCKET_SEND_TIMEOUT
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.socket_id = socket_id
+        self.platform = platform
+        self.max_size = max_size
+        self.send_timeout = send_timeout
+        self.closed = False
+        # Conversations auxquelles cette socket est abonnée
+        self.conversations: Set[int] = set()
+        # Dernière trame reçue du client (horloge monotone)
+        self.last_seen = time.monotonic()
+        self._frames: Deque[Tuple[str, bool, Optional[DeliveryTrace]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._close_code: Optional[int] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write())
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    def touch(self) -> None:
+        """Note une trame reçue : le client est vivant"""
+        self.last_seen = time.monotonic()
+
+    def memory_estimate(self) -> int:
+        """Taille estimée de l'enregistrement, file d'envoi comprise (hors socket ASGI)"""
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.socket_id)
+            + sys.getsizeof(self.conversations)
+            + sys.getsizeof(self._wakeup)
+            + sys.getsizeof(self._frames)
+            + sum(sys.getsizeof(frame[0]) for frame in self._frames)
+        )
+
+    def enqueue(self, text: str, droppable: bool = False, trace: Optional[DeliveryTrace] = None) -> bool:
+        """Dépose une trame sérialisée ; retourne False si elle est abandonnée"""
+        if self.closed or self._close_code is not None:
+            return False
+        if droppable and len(self._frames) >= self.max_size // 2:
+            monitoring_service.websocket_dropped_frames.labels(reason="typing").inc()
+            return False
+        if len(self._frames) >= self.max_size and not self._drop_droppable_frames():
+            monitoring_service.websocket_dropped_frames.labels(reason="slow_consumer").inc()
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return False
+        self._frames.append((text, droppable, trace))
+        monitoring_service.websocket_queued_frames.inc()
+        self._wakeup.set()
+        return True
+
+    def close(self, code: int = 1000) -> None:
+        """Demande la fermeture : la tâche d'écriture ferme la socket puis s'arrête"""
+        if self._close_code is None:
+            self._close_code = code
+            self._discard_frames()
+            self._wakeup.set()
+
+    async def wait_closed(self, timeout: float) -> None:
+        """Attend, au plus `timeout` secondes, que la tâche d'écriture ait fermé la socket"""
+        if self._writer is not None:
+            await asyncio.wait({self._writer}, timeout=timeout)
+
+    async def stop(self) -> None:
+        """Arrête la tâche d'écriture sans fermer la socket (déconnexion côté client)"""
+        self.closed = True
+        self._discard_frames()
+        if self._writer is not None:
+            # `wait_for` peut absorber l'annulation : réveiller aussi la boucle
+            self._wakeup.set()
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._writer = None
+
+    def _drop_droppable_frames(self) -> bool:
+        kept = deque(frame for frame in self._frames if not frame[1])
+        dropped = len(self._frames) - len(kept)
+        if dropped:
+            self._frames = kept
+            monitoring_service.websocket_queued_frames.dec(dropped)
+            monitoring_service.websocket_dropped_frames.labels(reason="typing").inc(dropped)
+        return dropped > 0
+
+    def _discard_frames(self) -> None:
+        if self._frames:
+            monitoring_service.websocket_queued_frames.dec(len(self._frames))
+            self._frames.clear()
+
+    async def _write(self) -> None:
+        try:
+            while not self.closed:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._frames and self._close_code is None and not self.closed:
+                    text, _, trace = self._frames.popleft()
+                    monitoring_service.websocket_queued_frames.dec()
+                    try:
+                        await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+                    except asyncio.TimeoutError:
+                        monitoring_service.websocket_dropped_frames.labels(reason="send_timeout").inc()
+                        self.close(SLOW_CONSUMER_CLOSE_CODE)
+                        continue
+                    if trace is not None and trace.sender_id != self.user_id:
+                        record_delivery(trace, self.platform, self.user_id)
+                if self._close_code is not None and not self.closed:
+                    self.closed = True
+                    if self._close_code == SLOW_CONSUMER_CLOSE_CODE:
+                        monitoring_service.websocket_slow_consumer_disconnects.inc()
+                        print(f"Client WebSocket trop lent déconnecté: user_id={self.user_id}")
+                    await asyncio.wait_for(self.websocket.close(code=self._close_code), self.send_timeout)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Socket déjà fermée : la boucle de réception gère la déconnexion
+            self.closed = True
+            self._discard_frames()
+            print(f"Erreur d'envoi WebSocket pour l'utilisateur {self.user_id}: {e}")
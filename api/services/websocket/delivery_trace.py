@@ -0,0 +1,146 @@
+"""Latence de livraison des messages WebSocket, de la trame de l'expéditeur à la socket du destinataire."""
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from services.monitoring_service import monitoring_service
+from utils.settings import (
+    WEBSOCKET_SLOW_DELIVERY_SECONDS,
+    WEBSOCKET_SLOW_DELIVERY_SAMPLES,
+    WEBSOCKET_SLOW_DELIVERY_LOG_SECONDS
+)
+
+class DeliveryTrace:
+    """Horodatages (horloge murale, partagée entre workers) d'un message diffusé
+
+    - `received_at` : réception de la trame de l'expéditeur ;
+    - `committed_at` : message validé en base ;
+    - `published_at` : événement remis aux sockets locales et à la diffusion.
+
+    La trace suit la trame dans les files d'envoi, et dans l'enveloppe Redis
+    vers les autres workers (`remote`). L'écriture sur la socket du
+    destinataire clôt la mesure (`record_delivery`).
+    """
+
+    __slots__ = ("conversation_id", "message_id", "sender_id", "received_at", "committed_at", "published_at", "remote")
+
+    def __init__(
+        self,
+        conversation_id: int,
+        message_id: int,
+        sender_id: Optional[int],
+        received_at: float,
+        committed_at: float,
+        published_at: Optional[float] = None,
+        remote: bool = False
+    ):
+        self.conversation_id = conversation_id
+        self.message_id = message_id
+        self.sender_id = sender_id
+        self.received_at = received_at
+        self.committed_at = committed_at
+        self.published_at = published_at
+        self.remote = remote
+
+    def to_payload(self) -> list:
+        """Forme transmise dans l'enveloppe de diffusion entre workers"""
+        return [
+            self.conversation_id, self.message_id, self.sender_id,
+            self.received_at, self.committed_at, self.published_at
+        ]
+
+    @classmethod
+    def from_payload(cls, payload: Optional[list]) -> Optional["DeliveryTrace"]:
+        """Trace reçue d'un autre worker"""
+        if not payload:
+            return None
+        return cls(*payload, remote=True)
+
+class SlowDeliveryLog:
+    """Garde les `samples` livraisons les plus lentes de chaque période et les écrit à sa fin
+
+    Seules les livraisons au-delà de `threshold` secondes sont candidates :
+    le journal reste borné à `samples` lignes par période de `interval`
+    secondes, même quand tout un worker ralentit. Les lignes sont écrites
+    sur `logger` (par défaut `logs/slow_deliveries.log`).
+    """
+
+    def __init__(
+        self,
+        threshold: float = WEBSOCKET_SLOW_DELIVERY_SECONDS,
+        samples: int = WEBSOCKET_SLOW_DELIVERY_SAMPLES,
+        interval: float = WEBSOCKET_SLOW_DELIVERY_LOG_SECONDS,
+        logger: Optional[logging.Logger] = None
+    ):
+        self.threshold = threshold
+        self.samples = samples
+        self.interval = interval
+        self.logger = logger or monitoring_service.delivery_logger
+        # Tas des plus lentes : (latence, ordre d'arrivée, enregistrement)
+        self._slowest: List[Tuple[float, int, dict]] = []
+        self._count = 0
+        self._window_end = time.monotonic() + interval
+        self._lock = threading.Lock()
+
+    def offer(self, latency: float, record: dict) -> None:
+        """Propose une livraison d'au moins `threshold` secondes"""
+        self.flush_due()
+        if self.samples <= 0:
+            return
+        with self._lock:
+            self._count += 1
+            entry = (latency, self._count, record)
+            if len(self._slowest) < self.samples:
+                heapq.heappush(self._slowest, entry)
+            elif latency > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def flush_due(self) -> None:
+        """Écrit les livraisons retenues si la période est terminée"""
+        if time.monotonic() >= self._window_end:
+            self.flush()
+
+    def flush(self) -> List[dict]:
+        """Écrit les livraisons retenues, de la plus lente à la plus rapide, et ouvre une nouvelle période"""
+        with self._lock:
+            slowest, self._slowest = self._slowest, []
+            self._window_end = time.monotonic() + self.interval
+        records = [record for _, _, record in sorted(slowest, reverse=True)]
+        for record in records:
+            self.logger.info(record)
+        return records
+
+slow_deliveries = SlowDeliveryLog()
+
+def record_delivery(trace: DeliveryTrace, platform: str, recipient_id: int) -> None:
+    """Mesure une livraison dont la trame vient d'être écrite sur la socket du destinataire"""
+    written_at = time.time()
+    delivery = "remote" if trace.remote else "local"
+    published_at = trace.published_at if trace.published_at is not None else trace.committed_at
+    # Horloges de deux workers : un écart négatif vient de leur décalage
+    stages = {
+        "commit": max(0.0, trace.committed_at - trace.received_at),
+        "publish": max(0.0, published_at - trace.committed_at),
+        "write": max(0.0, written_at - published_at)
+    }
+    latency = max(0.0, written_at - trace.received_at)
+    monitoring_service.websocket_delivery_latency.labels(platform=platform, delivery=delivery).observe(latency)
+    for stage, duration in stages.items():
+        monitoring_service.websocket_delivery_stage_duration.labels(stage=stage, delivery=delivery).observe(duration)
+    if latency < slow_deliveries.threshold:
+        return
+    slow_deliveries.offer(latency, {
+        "event": "slow_message_delivery",
+        "latency_ms": round(latency * 1000, 1),
+        "stages_ms": {stage: round(duration * 1000, 1) for stage, duration in stages.items()},
+        "delivery": delivery,
+        "platform": platform,
+        "conversation_id": trace.conversation_id,
+        "message_id": trace.message_id,
+        "sender_hash": monitoring_service.anonymize_user_id(str(trace.sender_id)) if trace.sender_id else None,
+        "recipient_hash": monitoring_service.anonymize_user_id(str(recipient_id)),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    })
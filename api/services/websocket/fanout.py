@@ -0,0 +1,162 @@
+"""Diffusion des événements WebSocket entre workers.
+
+Chaque worker ne connaît que ses propres sockets. Un événement est livré
+immédiatement aux sockets locales, puis publié par le backend pour que les
+autres workers le livrent aux leurs. Les événements sont rangés par sujet :
+
+- `conversation:<id>` : `new_message`, `typing_status`, `messages_read`,
+  `user_offline`, livrés aux sockets abonnées à la conversation ;
+- `user:<id>` : événements propres à un utilisateur (nouvelle conversation,
+  compteurs de non lus), livrés à toutes ses sockets.
+"""
+import asyncio
+import json
+import uuid
+from typing import Awaitable, Callable, Optional, Set
+
+from redis.exceptions import RedisError
+
+from services.websocket.delivery_trace import DeliveryTrace
+from utils.settings import WEBSOCKET_FANOUT_BACKEND
+
+# Livraison locale : (sujet, trame sérialisée, utilisateur exclu, trame jetable, trace de livraison)
+Deliver = Callable[[str, str, Optional[int], bool, Optional[DeliveryTrace]], Awaitable[None]]
+
+CHANNEL_PREFIX = "ws:"
+WORKER_CHANNEL_PREFIX = "ws:worker:"
+
+def conversation_topic(conversation_id: int) -> str:
+    return f"conversation:{conversation_id}"
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+class InProcessFanout:
+    """Backend mono-worker : les sockets locales sont les seules destinataires"""
+
+    async def start(self, deliver: Deliver) -> None:
+        pass
+
+    async def publish(
+        self,
+        topic: str,
+        frame: str,
+        exclude_user_id: Optional[int] = None,
+        droppable: bool = False,
+        trace: Optional[DeliveryTrace] = None
+    ) -> None:
+        pass
+
+    async def subscribe(self, topic: str) -> None:
+        pass
+
+    async def unsubscribe(self, topic: str) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+class RedisFanout:
+    """Backend Redis pub/sub : un canal `ws:<sujet>` par conversation et par utilisateur
+
+    Un worker ne s'abonne qu'aux sujets d'au moins une socket locale, et
+    ignore ses propres publications (déjà livrées).
+    """
+
+    def __init__(self, redis_client=None):
+        self.worker_id = uuid.uuid4().hex
+        self._redis = redis_client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._deliver: Optional[Deliver] = None
+        self.channels: Set[str] = set()
+
+    async def start(self, deliver: Deliver) -> None:
+        if self._listener is not None:
+            return
+        self._deliver = deliver
+        self._pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+        # Canal propre au worker : la connexion pub/sub existe dès le démarrage
+        await self._pubsub.subscribe(f"{WORKER_CHANNEL_PREFIX}{self.worker_id}")
+        self._listener = asyncio.create_task(self._listen())
+
+    async def publish(
+        self,
+        topic: str,
+        frame: str,
+        exclude_user_id: Optional[int] = None,
+        droppable: bool = False,
+        trace: Optional[DeliveryTrace] = None
+    ) -> None:
+        # La trame déjà sérialisée est transmise telle quelle, la trace à côté
+        payload = json.dumps({
+            "origin": self.worker_id,
+            "exclude_user_id": exclude_user_id,
+            "droppable": droppable,
+            "frame": frame,
+            "trace": trace.to_payload() if trace is not None else None
+        })
+        try:
+            await self._client().publish(f"{CHANNEL_PREFIX}{topic}", payload)
+        except RedisError as e:
+            print(f"Erreur de publication Redis sur {topic}: {e}")
+
+    async def subscribe(self, topic: str) -> None:
+        channel = f"{CHANNEL_PREFIX}{topic}"
+        if channel not in self.channels:
+            self.channels.add(channel)
+            await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, topic: str) -> None:
+        channel = f"{CHANNEL_PREFIX}{topic}"
+        if channel in self.channels:
+            self.channels.discard(channel)
+            await self._pubsub.unsubscribe(channel)
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self.channels.clear()
+
+    def _client(self):
+        if self._redis is None:
+            from utils.redis_client import get_async_redis_client
+            self._redis = get_async_redis_client()
+        return self._redis
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["channel"].startswith(WORKER_CHANNEL_PREFIX):
+                    continue
+                payload = json.loads(message["data"])
+                if payload["origin"] == self.worker_id:
+                    continue
+                await self._deliver(
+                    message["channel"][len(CHANNEL_PREFIX):],
+                    payload["frame"],
+                    payload["exclude_user_id"],
+                    payload["droppable"],
+                    DeliveryTrace.from_payload(payload.get("trace"))
+                )
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                # Le client se reconnecte et se réabonne à la prochaine lecture
+                print(f"Erreur de réception Redis: {e}")
+                await asyncio.sleep(1)
+            except Exception as e:
+                print(f"Erreur de diffusion d'un événement WebSocket: {e}")
+
+def create_fanout(backend: str = WEBSOCKET_FANOUT_BACKEND):
+    """Crée le backend de diffusion configuré (`memory` ou `redis`)"""
+    if backend == "redis":
+        return RedisFanout()
+    if backend == "memory":
+        return InProcessFanout()
+    raise ValueError(f"Backend de diffusion WebSocket inconnu : {backend}")
@@ -0,0 +1,260 @@
+"""Présence des utilisateurs : sockets vivantes à durée de vie limitée, renouvelée par battements."""
+from abc import ABC, abstractmethod
+import math
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from models.user_status import UserPresence, UserStatus
+from utils.settings import WEBSOCKET_FANOUT_BACKEND, PRESENCE_TTL_SECONDS
+
+# (en ligne, dernière activité connue)
+LiveState = Tuple[bool, Optional[datetime]]
+
+class PresenceStore(ABC):
+    """Présence partagée par les backends
+
+    Un utilisateur est en ligne tant qu'au moins une de ses sockets a été
+    renouvelée depuis moins de `ttl` secondes : les sockets d'un worker
+    arrêté brutalement expirent d'elles-mêmes. Les changements sont gardés
+    en mémoire puis écrits en base par lots (`take_pending` / `persist`),
+    au lieu d'une écriture à chaque connexion ou déconnexion.
+    """
+
+    def __init__(self, ttl: float = PRESENCE_TTL_SECONDS):
+        self.ttl = ttl
+        # {user_id: (statut, last_seen_at)} en attente d'écriture
+        self._pending: Dict[int, Tuple[UserStatus, datetime]] = {}
+
+    async def connect(self, user_id: int, socket_id: str) -> bool:
+        """Enregistre une socket ; retourne True si l'utilisateur passe en ligne"""
+        came_online = await self._add_socket(user_id, socket_id)
+        self._pending[user_id] = (UserStatus.ONLINE, datetime.utcnow())
+        return came_online
+
+    async def heartbeat(self, sockets: Iterable[Tuple[int, str]]) -> None:
+        """Renouvelle des sockets vivantes, en un seul aller-retour"""
+        sockets = list(sockets)
+        if not sockets:
+            return
+        await self._refresh(sockets)
+        now = datetime.utcnow()
+        for user_id, _ in sockets:
+            self._pending[user_id] = (UserStatus.ONLINE, now)
+
+    async def disconnect(self, user_id: int, socket_id: str) -> bool:
+        """Retire une socket ; retourne True si l'utilisateur passe hors ligne"""
+        went_offline = await self._remove_socket(user_id, socket_id)
+        if went_offline:
+            self._pending[user_id] = (UserStatus.OFFLINE, datetime.utcnow())
+        return went_offline
+
+    async def get_presence(self, db: Session, user_ids: List[int]) -> Dict[int, dict]:
+        """Présence de plusieurs utilisateurs, en une lecture du backend
+
+        La dernière activité vient du backend, sinon de `user_presence`
+        (une seule requête pour les utilisateurs restants).
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        live = await self._lookup(user_ids)
+        missing = [user_id for user_id in user_ids if live[user_id][1] is None]
+        stored = dict(
+            db.query(UserPresence.user_id, UserPresence.last_seen_at)
+            .filter(UserPresence.user_id.in_(missing))
+            .all()
+        ) if missing else {}
+        return {
+            user_id: {
+                "user_id": user_id,
+                "status": (UserStatus.ONLINE if live[user_id][0] else UserStatus.OFFLINE).value,
+                "last_seen_at": live[user_id][1] or stored.get(user_id)
+            }
+            for user_id in user_ids
+        }
+
+    async def online_users(self, user_ids: List[int]) -> Set[int]:
+        """Utilisateurs en ligne parmi `user_ids`, sans lecture en base"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return set()
+        live = await self._lookup(user_ids)
+        return {user_id for user_id in user_ids if live[user_id][0]}
+
+    def take_pending(self) -> Dict[int, Tuple[UserStatus, datetime]]:
+        """Retire les changements en attente, pour les écrire avec `persist`"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore_pending(self, pending: Dict[int, Tuple[UserStatus, datetime]]) -> None:
+        """Remet un lot non écrit en attente, sans écraser des changements plus récents"""
+        for user_id, state in pending.items():
+            self._pending.setdefault(user_id, state)
+
+    @staticmethod
+    def persist(db: Session, pending: Dict[int, Tuple[UserStatus, datetime]]) -> int:
+        """Écrit un lot de changements dans `user_presence` en une transaction"""
+        rows = {
+            presence.user_id: presence
+            for presence in db.query(UserPresence).filter(UserPresence.user_id.in_(list(pending)))
+        }
+        for user_id, (status, last_seen_at) in pending.items():
+            presence = rows.get(user_id)
+            if presence is None:
+                presence = UserPresence(user_id=user_id)
+                db.add(presence)
+            presence.status = status
+            presence.last_seen_at = last_seen_at
+        db.commit()
+        return len(pending)
+
+    @abstractmethod
+    async def _add_socket(self, user_id: int, socket_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _refresh(self, sockets: List[Tuple[int, str]]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _remove_socket(self, user_id: int, socket_id: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _lookup(self, user_ids: List[int]) -> Dict[int, LiveState]:
+        raise NotImplementedError
+
+class InMemoryPresenceStore(PresenceStore):
+    """Backend mono-worker"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {user_id: {socket_id: expiration monotone}}
+        self._sockets: Dict[int, Dict[str, float]] = {}
+        self._last_seen: Dict[int, datetime] = {}
+
+    async def _add_socket(self, user_id: int, socket_id: str) -> bool:
+        came_online = not self._live_sockets(user_id)
+        await self._refresh([(user_id, socket_id)])
+        return came_online
+
+    async def _refresh(self, sockets: List[Tuple[int, str]]) -> None:
+        expires_at, now = time.monotonic() + self.ttl, datetime.utcnow()
+        for user_id, socket_id in sockets:
+            self._sockets.setdefault(user_id, {})[socket_id] = expires_at
+            self._last_seen[user_id] = now
+
+    async def _remove_socket(self, user_id: int, socket_id: str) -> bool:
+        self._sockets.get(user_id, {}).pop(socket_id, None)
+        self._last_seen[user_id] = datetime.utcnow()
+        return not self._live_sockets(user_id)
+
+    async def _lookup(self, user_ids: List[int]) -> Dict[int, LiveState]:
+        return {
+            user_id: (bool(self._live_sockets(user_id)), self._last_seen.get(user_id))
+            for user_id in user_ids
+        }
+
+    def _live_sockets(self, user_id: int) -> Dict[str, float]:
+        now = time.monotonic()
+        sockets = {socket_id: expires_at for socket_id, expires_at in self._sockets.get(user_id, {}).items() if expires_at > now}
+        if sockets:
+            self._sockets[user_id] = sockets
+        else:
+            self._sockets.pop(user_id, None)
+        return sockets
+
+class RedisPresenceStore(PresenceStore):
+    """Backend partagé entre workers
+
+    - `presence:<user_id>` : ensemble trié des sockets, de score leur
+      expiration (horodatage) ;
+    - `presence:last_seen` : dernière activité de chaque utilisateur.
+    """
+
+    LAST_SEEN_KEY = "presence:last_seen"
+
+    def __init__(self, *args, redis_client=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._redis = redis_client
+
+    async def _add_socket(self, user_id: int, socket_id: str) -> bool:
+        key, now = self._key(user_id), time.time()
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(key, "-inf", now)
+                pipe.zcard(key)
+                self._queue_refresh(pipe, user_id, socket_id, now)
+                _, live_sockets, *_ = await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur d'écriture de la présence Redis: {e}")
+            return False
+        return live_sockets == 0
+
+    async def _refresh(self, sockets: List[Tuple[int, str]]) -> None:
+        now = time.time()
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                for user_id, socket_id in sockets:
+                    self._queue_refresh(pipe, user_id, socket_id, now)
+                await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur d'écriture de la présence Redis: {e}")
+
+    async def _remove_socket(self, user_id: int, socket_id: str) -> bool:
+        key, now = self._key(user_id), time.time()
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.zrem(key, socket_id)
+                pipe.zremrangebyscore(key, "-inf", now)
+                pipe.zcard(key)
+                pipe.hset(self.LAST_SEEN_KEY, str(user_id), now)
+                _, _, live_sockets, _ = await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur d'écriture de la présence Redis: {e}")
+            return False
+        return live_sockets == 0
+
+    async def _lookup(self, user_ids: List[int]) -> Dict[int, LiveState]:
+        now = time.time()
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.zcount(self._key(user_id), now, "+inf")
+                pipe.hmget(self.LAST_SEEN_KEY, [str(user_id) for user_id in user_ids])
+                *live_sockets, last_seen = await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur de lecture de la présence Redis: {e}")
+            return {user_id: (False, None) for user_id in user_ids}
+        return {
+            user_id: (count > 0, datetime.utcfromtimestamp(float(seen)) if seen else None)
+            for user_id, count, seen in zip(user_ids, live_sockets, last_seen)
+        }
+
+    def _queue_refresh(self, pipe, user_id: int, socket_id: str, now: float) -> None:
+        key = self._key(user_id)
+        pipe.zadd(key, {socket_id: now + self.ttl})
+        pipe.expire(key, math.ceil(self.ttl))
+        pipe.hset(self.LAST_SEEN_KEY, str(user_id), now)
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"presence:{user_id}"
+
+    def _client(self):
+        if self._redis is None:
+            from utils.redis_client import get_async_redis_client
+            self._redis = get_async_redis_client()
+        return self._redis
+
+def create_presence_store(backend: str = WEBSOCKET_FANOUT_BACKEND) -> PresenceStore:
+    """Crée le backend de présence, partagé comme la diffusion (`memory` ou `redis`)"""
+    if backend == "redis":
+        return RedisPresenceStore()
+    if backend == "memory":
+        return InMemoryPresenceStore()
+    raise ValueError(f"Backend de présence inconnu : {backend}")
@@ -0,0 +1,106 @@
+"""Journal borné des derniers événements numérotés de chaque conversation."""
+from abc import ABC, abstractmethod
+import json
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from utils.settings import (
+    WEBSOCKET_FANOUT_BACKEND,
+    WEBSOCKET_REPLAY_LOG_SIZE,
+    WEBSOCKET_REPLAY_LOG_CONVERSATIONS,
+    WEBSOCKET_REPLAY_LOG_TTL_SECONDS
+)
+
+# (seq, trame sérialisée, utilisateur exclu de la diffusion)
+ReplayEntry = Tuple[int, str, Optional[int]]
+
+class ReplayLog(ABC):
+    """Garde les `size` derniers événements numérotés d'une conversation
+
+    Une socket qui se reconnecte avec son dernier numéro reçu rejoue les
+    événements manqués depuis ce journal ; s'il ne couvre plus l'écart,
+    la reprise passe par la base.
+    """
+
+    def __init__(self, size: int = WEBSOCKET_REPLAY_LOG_SIZE):
+        self.size = size
+
+    @abstractmethod
+    async def append(self, conversation_id: int, seq: int, frame: str, exclude_user_id: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def since(self, conversation_id: int, after_seq: int) -> List[ReplayEntry]:
+        """Événements de numéro supérieur à `after_seq`, dans l'ordre"""
+        raise NotImplementedError
+
+class InMemoryReplayLog(ReplayLog):
+    """Backend mono-worker ; les conversations les moins récemment actives sont évincées"""
+
+    def __init__(self, *args, max_conversations: int = WEBSOCKET_REPLAY_LOG_CONVERSATIONS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_conversations = max_conversations
+        self._entries: "OrderedDict[int, Deque[ReplayEntry]]" = OrderedDict()
+
+    async def append(self, conversation_id: int, seq: int, frame: str, exclude_user_id: Optional[int] = None) -> None:
+        entries = self._entries.get(conversation_id)
+        if entries is None:
+            entries = self._entries[conversation_id] = deque(maxlen=self.size)
+        entries.append((seq, frame, exclude_user_id))
+        if len(entries) > 1 and entries[-2][0] > seq:
+            # Commits concurrents diffusés dans le désordre
+            self._entries[conversation_id] = deque(sorted(entries), maxlen=self.size)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    async def since(self, conversation_id: int, after_seq: int) -> List[ReplayEntry]:
+        return [entry for entry in self._entries.get(conversation_id, ()) if entry[0] > after_seq]
+
+class RedisReplayLog(ReplayLog):
+    """Backend partagé entre workers : un ensemble trié `replay:<conversation_id>` de score le numéro"""
+
+    def __init__(self, *args, ttl: int = WEBSOCKET_REPLAY_LOG_TTL_SECONDS, redis_client=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ttl = ttl
+        self._redis = redis_client
+
+    async def append(self, conversation_id: int, seq: int, frame: str, exclude_user_id: Optional[int] = None) -> None:
+        key = self._key(conversation_id)
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {json.dumps([seq, frame, exclude_user_id]): seq})
+                pipe.zremrangebyrank(key, 0, -self.size - 1)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except RedisError as e:
+            # Sans journal, la reprise passe par la base
+            print(f"Erreur d'écriture du journal de reprise Redis: {e}")
+
+    async def since(self, conversation_id: int, after_seq: int) -> List[ReplayEntry]:
+        try:
+            members = await self._client().zrangebyscore(self._key(conversation_id), f"({after_seq}", "+inf")
+        except RedisError as e:
+            print(f"Erreur de lecture du journal de reprise Redis: {e}")
+            return []
+        return [tuple(json.loads(member)) for member in members]
+
+    @staticmethod
+    def _key(conversation_id: int) -> str:
+        return f"replay:{conversation_id}"
+
+    def _client(self):
+        if self._redis is None:
+            from utils.redis_client import get_async_redis_client
+            self._redis = get_async_redis_client()
+        return self._redis
+
+def create_replay_log(backend: str = WEBSOCKET_FANOUT_BACKEND) -> ReplayLog:
+    """Crée le journal de reprise, partagé comme la diffusion (`memory` ou `redis`)"""
+    if backend == "redis":
+        return RedisReplayLog()
+    if backend == "memory":
+        return InMemoryReplayLog()
+    raise ValueError(f"Backend du journal de reprise inconnu : {backend}")
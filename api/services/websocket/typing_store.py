@@ -0,0 +1,161 @@
+"""État « en train d'écrire » éphémère, gardé hors de la base de données."""
+from abc import ABC, abstractmethod
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from redis.exceptions import RedisError
+
+from services.monitoring_service import monitoring_service
+from utils.settings import WEBSOCKET_FANOUT_BACKEND, TYPING_TTL_SECONDS, TYPING_DEBOUNCE_SECONDS
+
+# (user_id, last_typed_at)
+TypingUser = Tuple[int, datetime]
+
+class TypingStore(ABC):
+    """Anti-rebond commun aux backends : seules les transitions sont signalées
+
+    Un client envoie une trame `typing` à chaque rafale de frappe. Les trames
+    « en train d'écrire » reçues moins de `debounce` secondes après la
+    dernière écriture sont ignorées ; les autres prolongent l'état de `ttl`
+    secondes. `last_typed_at` est donc précis à `debounce` près. Un état
+    non prolongé expire sans trame de fin.
+    """
+
+    def __init__(self, ttl: float = TYPING_TTL_SECONDS, debounce: float = TYPING_DEBOUNCE_SECONDS):
+        self.ttl = ttl
+        self.debounce = debounce
+        # {(conversation_id, user_id): dernière écriture (horloge monotone)}
+        self._written: Dict[Tuple[int, int], float] = {}
+
+    async def set_typing(self, conversation_id: int, user_id: int, is_typing: bool) -> bool:
+        """Enregistre l'état ; retourne True au début ou à la fin de la frappe"""
+        key = (conversation_id, user_id)
+        now = time.monotonic()
+        if is_typing:
+            written = self._written.get(key)
+            if written is not None and now - written < self.debounce:
+                monitoring_service.websocket_typing_events.labels(result="coalesced").inc()
+                return False
+            self._written[key] = now
+            changed = await self._start(conversation_id, user_id)
+        else:
+            self._written.pop(key, None)
+            changed = await self._stop(conversation_id, user_id)
+        monitoring_service.websocket_typing_events.labels(result="transition" if changed else "refresh").inc()
+        return changed
+
+    @abstractmethod
+    async def get_typing_users(self, conversation_id: int) -> List[TypingUser]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _start(self, conversation_id: int, user_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _stop(self, conversation_id: int, user_id: int) -> bool:
+        raise NotImplementedError
+
+class InMemoryTypingStore(TypingStore):
+    """Backend mono-worker"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {conversation_id: {user_id: (last_typed_at, expiration monotone)}}
+        self._typing: Dict[int, Dict[int, Tuple[datetime, float]]] = {}
+
+    async def get_typing_users(self, conversation_id: int) -> List[TypingUser]:
+        return [(user_id, typed_at) for user_id, (typed_at, _) in self._purge(conversation_id).items()]
+
+    async def _start(self, conversation_id: int, user_id: int) -> bool:
+        users = self._purge(conversation_id)
+        changed = user_id not in users
+        users[user_id] = (datetime.utcnow(), time.monotonic() + self.ttl)
+        self._typing[conversation_id] = users
+        return changed
+
+    async def _stop(self, conversation_id: int, user_id: int) -> bool:
+        users = self._purge(conversation_id)
+        changed = users.pop(user_id, None) is not None
+        if not users:
+            self._typing.pop(conversation_id, None)
+        return changed
+
+    def _purge(self, conversation_id: int) -> Dict[int, Tuple[datetime, float]]:
+        now = time.monotonic()
+        users = {
+            user_id: state
+            for user_id, state in self._typing.get(conversation_id, {}).items()
+            if state[1] > now
+        }
+        if users:
+            self._typing[conversation_id] = users
+        else:
+            self._typing.pop(conversation_id, None)
+        return users
+
+class RedisTypingStore(TypingStore):
+    """Backend partagé entre workers : un ensemble trié `typing:<conversation_id>`
+
+    Chaque membre est un utilisateur, de score l'horodatage de sa dernière
+    frappe ; les membres plus vieux que `ttl` sont ignorés puis purgés.
+    """
+
+    def __init__(self, *args, redis_client=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._redis = redis_client
+
+    async def get_typing_users(self, conversation_id: int) -> List[TypingUser]:
+        try:
+            members = await self._client().zrangebyscore(
+                self._key(conversation_id), time.time() - self.ttl, "+inf", withscores=True
+            )
+        except RedisError as e:
+            print(f"Erreur de lecture des frappes Redis: {e}")
+            return []
+        return [(int(user_id), datetime.utcfromtimestamp(typed_at)) for user_id, typed_at in members]
+
+    async def _start(self, conversation_id: int, user_id: int) -> bool:
+        key, now = self._key(conversation_id), time.time()
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(key, "-inf", now - self.ttl)
+                pipe.zadd(key, {str(user_id): now})
+                pipe.expire(key, math.ceil(self.ttl))
+                _, added, _ = await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur d'écriture des frappes Redis: {e}")
+            return False
+        return added == 1
+
+    async def _stop(self, conversation_id: int, user_id: int) -> bool:
+        key = self._key(conversation_id)
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(key, "-inf", time.time() - self.ttl)
+                pipe.zrem(key, str(user_id))
+                _, removed = await pipe.execute()
+        except RedisError as e:
+            print(f"Erreur d'écriture des frappes Redis: {e}")
+            return False
+        return removed == 1
+
+    @staticmethod
+    def _key(conversation_id: int) -> str:
+        return f"typing:{conversation_id}"
+
+    def _client(self):
+        if self._redis is None:
+            from utils.redis_client import get_async_redis_client
+            self._redis = get_async_redis_client()
+        return self._redis
+
+def create_typing_store(backend: str = WEBSOCKET_FANOUT_BACKEND) -> TypingStore:
+    """Crée le backend des frappes, partagé comme la diffusion (`memory` ou `redis`)"""
+    if backend == "redis":
+        return RedisTypingStore()
+    if backend == "memory":
+        return InMemoryTypingStore()
+    raise ValueError(f"Backend des frappes inconnu : {backend}")
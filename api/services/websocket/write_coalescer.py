@@ -0,0 +1,108 @@
+"""Écriture groupée des messages WebSocket : un commit pour les messages d'une courte fenêtre."""
+import asyncio
+from typing import Callable, List, Optional, Tuple, Union
+
+from crud.message import message as message_crud
+from models.message import Message
+from schemas.message import MessageCreate, MessageBatchItem
+from services.monitoring_service import monitoring_service
+from utils.settings import WEBSOCKET_WRITE_COALESCE_MS, WEBSOCKET_WRITE_COALESCE_MAX_BATCH
+
+# (conversation_id, messages, sender_id), comme les arguments de `create_messages`
+WriteGroup = Tuple[int, List[Union[MessageCreate, MessageBatchItem]], Optional[int]]
+# (messages dans l'ordre de la demande, messages réellement créés)
+WriteResult = Tuple[List[Message], List[Message]]
+
+class MessageWriteCoalescer:
+    """Regroupe les écritures de messages de toutes les sockets d'un worker
+
+    Lors d'une rafale, chaque message coûte sinon un commit (et une
+    synchronisation disque). Les écritures reçues pendant `window` secondes
+    sont validées ensemble par `create_message_groups` : un INSERT
+    multi-lignes, une mise à jour par conversation et un seul commit. Chaque
+    appelant reçoit ensuite le résultat de son propre groupe, IDs et numéros
+    de séquence compris, avant de diffuser. Pendant un commit, les écritures
+    suivantes s'accumulent pour le lot d'après.
+
+    Si le lot échoue, chaque groupe est réécrit seul, dans l'ordre : une
+    conversation supprimée ne fait échouer que l'écriture qui la vise. Sans fenêtre (par
+    défaut), chaque écriture garde sa propre transaction.
+    """
+
+    def __init__(
+        self,
+        run_in_session: Callable,
+        window: float = WEBSOCKET_WRITE_COALESCE_MS / 1000,
+        max_batch: int = WEBSOCKET_WRITE_COALESCE_MAX_BATCH
+    ):
+        self.run_in_session = run_in_session
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[Tuple[WriteGroup, asyncio.Future]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def create_messages(
+        self,
+        conversation_id: int,
+        messages: List[Union[MessageCreate, MessageBatchItem]],
+        sender_id: Optional[int]
+    ) -> WriteResult:
+        """Crée les messages d'un expéditeur, seuls ou dans le prochain commit groupé"""
+        if self.window <= 0:
+            return await self.run_in_session(
+                message_crud.create_messages,
+                conversation_id=conversation_id,
+                messages=messages,
+                sender_id=sender_id
+            )
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((conversation_id, messages, sender_id), future))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def shutdown(self) -> None:
+        """Attend l'écriture des messages déjà reçus"""
+        if self._task is not None:
+            await self._task
+
+    async def _run(self) -> None:
+        """Valide les écritures en attente par lots, jusqu'à ce qu'il n'y en ait plus"""
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.window)
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            await self._write(batch)
+        self._task = None
+
+    async def _write(self, batch: List[Tuple[WriteGroup, asyncio.Future]]) -> None:
+        monitoring_service.websocket_write_batch_size.observe(len(batch))
+        if len(batch) == 1:
+            await self._write_alone(*batch[0])
+            return
+        try:
+            results = await self.run_in_session(message_crud.create_message_groups, [group for group, _ in batch])
+        except Exception as e:
+            print(f"Erreur lors de l'écriture groupée de {len(batch)} lots de messages, écriture séparée: {e}")
+            for group, future in batch:
+                await self._write_alone(group, future)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _write_alone(self, group: WriteGroup, future: asyncio.Future) -> None:
+        conversation_id, messages, sender_id = group
+        try:
+            result = await self.run_in_session(
+                message_crud.create_messages,
+                conversation_id=conversation_id,
+                messages=messages,
+                sender_id=sender_id
+            )
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
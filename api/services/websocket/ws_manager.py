@@ -1,71 +1,401 @@
+import asyncio
+import time
 from fastapi import WebSocket
-from typing import Dict, Set, Optional
-from datetime import datetime
+from typing import Dict, Set, Optional, List, Tuple, Union
 import json
 from sqlalchemy.orm import Session
-from models.user_status import UserPresence, UserStatus, UserTypingStatus
 from models.message import Message
 from crud.message import message as message_crud
-from crud.user import user as user_crud
-from schemas.message import MessageCreate
-from services.email.email_service import EmailService
+from schemas.message import MessageCreate, MessageBatchItem
+from services.email.notification_scheduler import NotificationScheduler
+from services.websocket.fanout import create_fanout, conversation_topic, user_topic
+from services.websocket.connection import ClientConnection, serialize_frame
+from services.websocket.typing_store import create_typing_store
+from services.websocket.presence import create_presence_store
+from services.websocket.replay_log import create_replay_log
+from services.websocket.write_coalescer import MessageWriteCoalescer
+from services.websocket.delivery_trace import DeliveryTrace, slow_deliveries
+from utils.database import SessionLocal
+from utils.db_executor import run_in_session
+from utils.membership_cache import membership_cache
+from services.monitoring_service import monitoring_service
+from utils.settings import (
+    PRESENCE_HEARTBEAT_SECONDS,
+    PRESENCE_FLUSH_SECONDS,
+    WEBSOCKET_PING_INTERVAL_SECONDS,
+    WEBSOCKET_IDLE_TIMEOUT_SECONDS,
+    WEBSOCKET_MAX_CONNECTIONS_PER_USER,
+    WEBSOCKET_REPLAY_MAX_MESSAGES
+)
+
+# Événements abandonnés en premier pour un client lent
+DROPPABLE_EVENT_TYPES = {"typing_status"}
+# Socket silencieuse fermée par le serveur (« Going Away »)
+IDLE_CLOSE_CODE = 1001
+# Socket la plus ancienne fermée au-delà du plafond par utilisateur (« Policy Violation »)
+CONNECTION_LIMIT_CLOSE_CODE = 1008
+
+def new_message_event(new_message: Message) -> dict:
+    """Événement `new_message`, portant le numéro de séquence du message"""
+    return {
+        "type": "new_message",
+        "seq": new_message.seq,
+        "message": {
+            "id": new_message.id,
+            "content": new_message.content,
+            "sender_id": new_message.sender_id,
+            "conversation_id": new_message.conversation_id,
+            "created_at": new_message.created_at.isoformat(),
+            "updated_at": new_message.updated_at.isoformat(),
+            "is_read": new_message.is_read,
+            "client_msg_id": new_message.client_msg_id
+        }
+    }
+
+def unread_changed_event(conversations: Dict[int, int], total: int, snapshot: bool = False) -> dict:
+    """Événement `unread_changed` : compteurs de non lus par conversation et total de l'utilisateur
+
+    Un instantané (`snapshot`) liste toutes les conversations non lues, les
+    autres valant 0 ; sinon seules les conversations citées ont changé.
+    """
+    return {
+        "type": "unread_changed",
+        "conversations": {str(conversation_id): count for conversation_id, count in conversations.items()},
+        "total": total,
+        "snapshot": snapshot
+    }
 
 class ConnectionManager:
     def __init__(self):
-        # {user_id: {socket_id: WebSocket}}
-        self.active_connections: Dict[int, Dict[str, WebSocket]] = {}
+        # {user_id: {socket_id: ClientConnection}}
+        self.active_connections: Dict[int, Dict[str, ClientConnection]] = {}
         # {conversation_id: set(user_id)}
         self.conversation_participants: Dict[int, Set[int]] = {}
-        self.email_service = EmailService()
+        # Diffusion vers les sockets des autres workers
+        self.fanout = create_fanout()
+        self._fanout_started = False
+        # État « en train d'écrire », hors base de données
+        self.typing = create_typing_store()
+        # Une session par opération : aucune connexion n'est gardée par une socket ouverte
+        self.session_factory = SessionLocal
+        # Présence à durée de vie limitée, renouvelée pour les sockets locales
+        self.presence = create_presence_store()
+        self._presence_task: Optional[asyncio.Task] = None
+        # Emails de nouveaux messages, regroupés et envoyés hors des requêtes
+        self.notifications = NotificationScheduler(self.presence, self.run_in_session)
+        # Sockets silencieuses : ping, puis fermeture (connexions mobiles à moitié ouvertes)
+        self.ping_interval = WEBSOCKET_PING_INTERVAL_SECONDS
+        self.idle_timeout = WEBSOCKET_IDLE_TIMEOUT_SECONDS
+        self.max_connections_per_user = WEBSOCKET_MAX_CONNECTIONS_PER_USER
+        self._reaper_task: Optional[asyncio.Task] = None
+        # Reprise des flux : derniers événements numérotés de chaque conversation
+        self.replay_log = create_replay_log()
+        # {(socket_id, conversation_id): trames retenues pendant une reprise}
+        self._held: Dict[Tuple[str, int], List[Tuple[str, bool, Optional[DeliveryTrace]]]] = {}
+        # Messages reçus en rafale validés en un commit (WEBSOCKET_WRITE_COALESCE_MS)
+        self.writes = MessageWriteCoalescer(self.run_in_session)
         
-    async def connect(self, websocket: WebSocket, user_id: int, socket_id: str):
+    async def connect(self, websocket: WebSocket, user_id: int, socket_id: str, platform: str = "unknown") -> ClientConnection:
+        """Accepte la socket ; la première socket locale d'un utilisateur l'abonne à son sujet
+
+        Au-delà de `max_connections_per_user` sockets locales, la plus
+        longtemps silencieuse de l'utilisateur est fermée.
+        """
         await websocket.accept()
+        connection = ClientConnection(websocket, user_id, socket_id, platform)
+        connection.start()
+        existing = self.active_connections.get(user_id, {})
+        if len(existing) >= self.max_connections_per_user:
+            oldest = min(existing.values(), key=lambda other: other.last_seen)
+            await self.evict(oldest, CONNECTION_LIMIT_CLOSE_CODE, reason="connection_limit")
         if user_id not in self.active_connections:
             self.active_connections[user_id] = {}
-        self.active_connections[user_id][socket_id] = websocket
+            await self._start_fanout()
+            await self.fanout.subscribe(user_topic(user_id))
+        self.active_connections[user_id][socket_id] = connection
+        monitoring_service.websocket_connections.inc()
+        await self.presence.connect(user_id, socket_id)
+        if self._presence_task is None:
+            self._presence_task = asyncio.create_task(self._maintain_presence())
+        if self._reaper_task is None:
+            self._reaper_task = asyncio.create_task(self._reap_idle_connections())
+        return connection
 
-    async def disconnect(self, user_id: int, socket_id: str, db: Session):
+    async def disconnect(self, user_id: int, socket_id: str) -> Tuple[Set[int], bool]:
+        """Retire la socket de ses conversations puis la ferme
+
+        Retourne les conversations que la socket suivait, pour notifier
+        leurs participants, et si l'utilisateur n'a plus aucune socket
+        (sur l'ensemble des workers).
+        """
+        conversations: Set[int] = set()
+        went_offline = False
         if user_id in self.active_connections:
             if socket_id in self.active_connections[user_id]:
+                connection = self.active_connections[user_id][socket_id]
+                conversations = set(connection.conversations)
+                for conversation_id in conversations:
+                    await self.leave_conversation(connection, conversation_id)
                 del self.active_connections[user_id][socket_id]
+                monitoring_service.websocket_connections.dec()
+                await connection.stop()
+                went_offline = await self.presence.disconnect(user_id, socket_id)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
-                # Mettre à jour le statut utilisateur
-                presence = db.query(UserPresence).filter(UserPresence.user_id == user_id).first()
-                if presence:
-                    presence.status = UserStatus.OFFLINE
-                    presence.last_seen_at = datetime.utcnow()
-                    db.commit()
+                await self.fanout.unsubscribe(user_topic(user_id))
+        return conversations, went_offline
+
+    async def release(self, connection: ClientConnection):
+        """Retire une socket fermée et notifie les participants de ses conversations
+
+        Sans effet si la socket a déjà été retirée (fermée par le serveur).
+        `user_offline` n'est diffusé qu'à la fermeture de la dernière socket
+        de l'utilisateur.
+        """
+        conversations, went_offline = await self.disconnect(connection.user_id, connection.socket_id)
+        for conversation_id in conversations:
+            await self.handle_typing_status(connection.user_id, conversation_id, False)
+            if not went_offline:
+                continue
+            await self.broadcast_to_conversation(
+                {
+                    "type": "user_offline",
+                    "user_id": connection.user_id
+                },
+                conversation_id,
+                exclude_user_id=connection.user_id
+            )
+
+    async def evict(self, connection: ClientConnection, code: int, reason: str):
+        """Ferme une socket côté serveur puis la retire, sans attendre le client"""
+        monitoring_service.websocket_reaped_connections.labels(reason=reason).inc()
+        print(f"WebSocket fermée par le serveur ({reason}): user_id={connection.user_id}")
+        connection.close(code)
+        await connection.wait_closed(connection.send_timeout)
+        await self.release(connection)
+
+    async def sweep_connections(self):
+        """Envoie un ping aux sockets silencieuses et ferme celles qui ne répondent plus
+
+        Une socket à moitié ouverte (réseau mobile coupé) ne renvoie plus
+        rien : elle est fermée après `idle_timeout` secondes sans trame,
+        au lieu d'attendre l'échec d'un envoi.
+        """
+        now = time.monotonic()
+        ping = serialize_frame({"type": "ping"})
+        idle, count, memory = [], 0, 0
+        for connections in self.active_connections.values():
+            for connection in connections.values():
+                count += 1
+                memory += connection.memory_estimate()
+                silent = now - connection.last_seen
+                if silent >= self.idle_timeout:
+                    idle.append(connection)
+                elif silent >= self.ping_interval:
+                    connection.enqueue(ping)
+        monitoring_service.websocket_connection_memory.set(memory / count if count else 0)
+        await asyncio.gather(*(
+            self.evict(connection, IDLE_CLOSE_CODE, reason="idle")
+            for connection in idle
+        ))
+
+    async def _reap_idle_connections(self):
+        while True:
+            await asyncio.sleep(min(self.ping_interval, self.idle_timeout / 2))
+            try:
+                await self.sweep_connections()
+            except Exception as e:
+                print(f"Erreur de fermeture des sockets inactives: {e}")
+            slow_deliveries.flush_due()
+
+    async def heartbeat(self, connection: ClientConnection):
+        """Battement envoyé par le client : renouvelle la présence de sa socket"""
+        await self.presence.heartbeat([(connection.user_id, connection.socket_id)])
+
+    async def flush_presence(self):
+        """Écrit en base, en un lot, les changements de présence en attente"""
+        pending = self.presence.take_pending()
+        if not pending:
+            return
+        try:
+            await self.run_in_session(self.presence.persist, pending)
+        except Exception as e:
+            self.presence.restore_pending(pending)
+            print(f"Erreur d'écriture de la présence: {e}")
+
+    async def _maintain_presence(self):
+        """Renouvelle la présence des sockets locales ; écrit last_seen_at par lots"""
+        flushed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+            try:
+                await self.presence.heartbeat(
+                    (user_id, socket_id)
+                    for user_id, connections in self.active_connections.items()
+                    for socket_id in connections
+                )
+                if time.monotonic() - flushed_at >= PRESENCE_FLUSH_SECONDS:
+                    flushed_at = time.monotonic()
+                    await self.flush_presence()
+            except Exception as e:
+                print(f"Erreur de maintien de la présence: {e}")
 
     async def send_personal_message(self, message: dict, user_id: int):
+        """Envoie un événement aux sockets locales de l'utilisateur"""
         if user_id in self.active_connections:
-            for websocket in self.active_connections[user_id].values():
-                await websocket.send_json(message)
-
-    async def broadcast_to_conversation(self, message: dict, conversation_id: int, exclude_user_id: Optional[int] = None):
-        if conversation_id in self.conversation_participants:
-            for user_id in self.conversation_participants[conversation_id]:
-                if user_id != exclude_user_id and user_id in self.active_connections:
-                    for websocket in self.active_connections[user_id].values():
-                        await websocket.send_json(message)
-
-    async def handle_typing_status(self, user_id: int, conversation_id: int, is_typing: bool, db: Session):
-        # Mettre à jour le statut de frappe
-        typing_status = db.query(UserTypingStatus).filter(
-            UserTypingStatus.user_id == user_id,
-            UserTypingStatus.conversation_id == conversation_id
-        ).first()
-        
-        if not typing_status:
-            typing_status = UserTypingStatus(
-                user_id=user_id,
-                conversation_id=conversation_id
+            frame = serialize_frame(message)
+            for connection in self.active_connections[user_id].values():
+                connection.enqueue(frame)
+
+    async def send_to_user(self, user_id: int, message: dict):
+        """Envoie un événement à toutes les sockets de l'utilisateur, quel que soit leur worker"""
+        frame = serialize_frame(message)
+        topic = user_topic(user_id)
+        await self.deliver_local(topic, frame)
+        await self.fanout.publish(topic, frame)
+
+    async def run_in_session(self, func, *args, **kwargs):
+        """Exécute `func(db, ...)` hors de la boucle avec une session propre à l'appel"""
+        return await run_in_session(self.session_factory, func, *args, **kwargs)
+
+    async def is_participant(self, user_id: int, conversation_id: int) -> bool:
+        """Appartenance à une conversation, lue dans le cache sans quitter la boucle ; la base seulement en cas d'absence"""
+        is_member = membership_cache.get(user_id, conversation_id)
+        if is_member is None:
+            is_member = await self.run_in_session(message_crud.load_membership, conversation_id, user_id)
+        return is_member
+
+    async def notify_conversation_created(self, conversation, participant_ids: List[int]):
+        """Informe chaque participant d'une nouvelle conversation sur ses sockets"""
+        for participant_id in set(participant_ids):
+            await self.send_to_user(
+                participant_id,
+                {
+                    "type": "conversation_created",
+                    "conversation_id": conversation.id,
+                    "conversation_type": conversation.type.value,
+                    "related_id": conversation.related_id
+                }
             )
-            db.add(typing_status)
-        
-        typing_status.is_typing = is_typing
-        typing_status.last_typed_at = datetime.utcnow()
-        db.commit()
+
+    async def push_unread_counts(
+        self,
+        conversation_id: int,
+        user_ids: Optional[List[int]] = None,
+        exclude_user_ids: Optional[List[int]] = None
+    ):
+        """Envoie aux participants concernés leurs compteurs de non lus après un envoi ou une lecture"""
+        try:
+            changes = await self.run_in_session(
+                message_crud.get_unread_changes,
+                conversation_id,
+                user_ids=user_ids,
+                exclude_user_ids=exclude_user_ids
+            )
+        except Exception as e:
+            print(f"Erreur de lecture des compteurs de non lus: {e}")
+            return
+        for change in changes:
+            await self.send_to_user(
+                change["user_id"],
+                unread_changed_event({conversation_id: change["unread_count"]}, change["total"])
+            )
+
+    async def send_unread_snapshot(self, connection: ClientConnection):
+        """Envoie à une socket qui s'ouvre l'état complet de ses non lus"""
+        counts = await self.run_in_session(message_crud.get_unread_count, connection.user_id)
+        # `get_unread_count` renvoie une ligne fictive (conversation 0) sans non lus
+        conversations = {
+            count["conversation_id"]: count["unread_count"]
+            for count in counts if count["conversation_id"] and count["unread_count"]
+        }
+        connection.enqueue(serialize_frame(
+            unread_changed_event(conversations, sum(conversations.values()), snapshot=True)
+        ))
+
+    async def join_conversation(self, connection: ClientConnection, conversation_id: int):
+        """Abonne une socket à une conversation ; le worker s'abonne au premier participant local"""
+        await self._start_fanout()
+        connection.conversations.add(conversation_id)
+        if conversation_id not in self.conversation_participants:
+            self.conversation_participants[conversation_id] = set()
+            await self.fanout.subscribe(conversation_topic(conversation_id))
+        self.conversation_participants[conversation_id].add(connection.user_id)
+
+    async def leave_conversation(self, connection: ClientConnection, conversation_id: int):
+        """Désabonne une socket ; sans participant local, le worker se désabonne"""
+        connection.conversations.discard(conversation_id)
+        if conversation_id not in self.conversation_participants:
+            return
+        # L'utilisateur reste participant tant qu'une autre de ses sockets suit la conversation
+        other_sockets = self.active_connections.get(connection.user_id, {}).values()
+        if any(conversation_id in other.conversations for other in other_sockets if other is not connection):
+            return
+        self.conversation_participants[conversation_id].discard(connection.user_id)
+        if not self.conversation_participants[conversation_id]:
+            del self.conversation_participants[conversation_id]
+            await self.fanout.unsubscribe(conversation_topic(conversation_id))
+
+    async def broadcast_to_conversation(
+        self,
+        message: dict,
+        conversation_id: int,
+        exclude_user_id: Optional[int] = None,
+        trace: Optional[DeliveryTrace] = None
+    ):
+        """Livre un événement aux sockets locales puis le publie pour les autres workers
+
+        L'événement est sérialisé une seule fois puis déposé dans la file
+        d'envoi de chaque socket, sans attendre le réseau. Une `trace`
+        accompagne la trame jusqu'à l'écriture sur chaque socket.
+        """
+        frame = serialize_frame(message)
+        droppable = message.get("type") in DROPPABLE_EVENT_TYPES
+        topic = conversation_topic(conversation_id)
+        if message.get("seq") is not None:
+            # Journalisé avant la diffusion : une reprise concurrente le reçoit d'une façon ou de l'autre
+            await self.replay_log.append(conversation_id, message["seq"], frame, exclude_user_id)
+        if trace is not None:
+            trace.published_at = time.time()
+        await self.deliver_local(topic, frame, exclude_user_id, droppable, trace)
+        await self.fanout.publish(topic, frame, exclude_user_id, droppable, trace)
+
+    async def deliver_local(
+        self,
+        topic: str,
+        frame: str,
+        exclude_user_id: Optional[int] = None,
+        droppable: bool = False,
+        trace: Optional[DeliveryTrace] = None
+    ):
+        """Dépose une trame dans la file des sockets locales concernées par le sujet"""
+        kind, _, identifier = topic.partition(":")
+        if kind == "user":
+            user_id = int(identifier)
+            if user_id != exclude_user_id:
+                for connection in self.active_connections.get(user_id, {}).values():
+                    connection.enqueue(frame, droppable, trace)
+            return
+        conversation_id = int(identifier)
+        for user_id in self.conversation_participants.get(conversation_id, ()):
+            if user_id != exclude_user_id and user_id in self.active_connections:
+                for connection in self.active_connections[user_id].values():
+                    if conversation_id in connection.conversations:
+                        held = self._held.get((connection.socket_id, conversation_id))
+                        if held is not None:
+                            held.append((frame, droppable, trace))  # Reprise en cours
+                        else:
+                            connection.enqueue(frame, droppable, trace)
+
+    async def _start_fanout(self):
+        if not self._fanout_started:
+            self._fanout_started = True
+            await self.fanout.start(self.deliver_local)
+
+    async def handle_typing_status(self, user_id: int, conversation_id: int, is_typing: bool):
+        """Met à jour le statut de frappe ; seuls le début et la fin sont diffusés"""
+        if not await self.typing.set_typing(conversation_id, user_id, is_typing):
+            return
 
         # Notifier les autres participants
         await self.broadcast_to_conversation(
@@ -79,71 +409,203 @@ class ConnectionManager:
             exclude_user_id=user_id
         )
 
-    async def handle_message(self, user_id: int, conversation_id: int, content: str, db: Session):
-        try:
-            print(f"Creating message: user_id={user_id}, conversation_id={conversation_id}, content='{content}'")
-            
-            # Créer l'objet MessageCreate
-            message_create = MessageCreate(
+    async def handle_message(
+        self,
+        user_id: int,
+        conversation_id: int,
+        content: str,
+        client_msg_id: Optional[str] = None,
+        received_at: Optional[float] = None
+    ):
+        """Crée et diffuse un message ; un `client_msg_id` déjà reçu n'est pas recréé"""
+        messages = await self.handle_messages(
+            user_id=user_id,
+            conversation_id=conversation_id,
+            items=[MessageCreate(
                 content=content,
-                conversation_id=conversation_id
-            )
+                conversation_id=conversation_id,
+                client_msg_id=client_msg_id
+            )],
+            received_at=received_at
+        )
+        return messages[0]
+
+    async def handle_messages(
+        self,
+        user_id: int,
+        conversation_id: int,
+        items: List[Union[MessageCreate, MessageBatchItem]],
+        received_at: Optional[float] = None
+    ) -> List[Message]:
+        """Crée un lot de messages en une transaction puis les diffuse
+
+        Seuls les messages réellement créés sont diffusés et comptés dans le
+        récapitulatif email ; l'expéditeur reçoit un accusé `messages_ack` associant chaque
+        `client_msg_id` à son ID serveur, renvois compris. `received_at`
+        (horloge murale à la réception de la trame) active la mesure de la
+        latence de livraison.
+        """
+        try:
+            print(f"Creating {len(items)} message(s): user_id={user_id}, conversation_id={conversation_id}")
             
-            # Créer le message dans la base de données
-            new_message = message_crud.create_message(
-                db=db,
-                message=message_create,
-                sender_id=user_id
-            )
+            # Créer les messages dans la base de données
+            messages, created = await self.writes.create_messages(conversation_id, items, user_id)
+            committed_at = time.time()
             
-            print(f"Message created successfully: id={new_message.id}")
-
-            # Récupérer l'expéditeur pour son nom
-            sender = user_crud.get(db, id=user_id)
-            sender_name = f"{sender.prenom} {sender.nom}" if sender else "Utilisateur inconnu"
-
-            # Préparer les données du message pour la diffusion
-            message_data = {
-                "type": "new_message",
-                "message": {
-                    "id": new_message.id,
-                    "content": new_message.content,
-                    "sender_id": new_message.sender_id,
-                    "conversation_id": new_message.conversation_id,
-                    "created_at": new_message.created_at.isoformat(),
-                    "updated_at": new_message.updated_at.isoformat(),
-                    "is_read": new_message.is_read
-                }
-            }
+            print(f"Messages created successfully: ids={[new_message.id for new_message in created]}")
+
+            # Envoyer chaque nouveau message à tous les participants connectés (y compris l'expéditeur)
+            await self.broadcast_new_messages(conversation_id, created, received_at, committed_at)
             
-            print(f"Broadcasting message to conversation {conversation_id}")
+            acknowledged = [
+                {"client_msg_id": db_message.client_msg_id, "id": db_message.id}
+                for db_message in messages if db_message.client_msg_id
+            ]
+            if acknowledged:
+                await self.send_personal_message(
+                    {
+                        "type": "messages_ack",
+                        "conversation_id": conversation_id,
+                        "messages": acknowledged
+                    },
+                    user_id
+                )
             
-            # Envoyer le message à tous les participants connectés (y compris l'expéditeur)
-            await self.broadcast_to_conversation(
-                message_data,
-                conversation_id
-            )
-            
-            # Envoyer les notifications email uniquement aux autres participants
-            if conversation_id in self.conversation_participants:
-                for participant_id in self.conversation_participants[conversation_id]:
-                    if participant_id != user_id:  # Ne pas envoyer d'email à l'expéditeur
-                        participant = user_crud.get(db, id=participant_id)
-                        if participant:
-                            try:
-                                await self.email_service.send_new_message_notification(
-                                    recipient_email=participant.email,
-                                    sender_name=sender_name,
-                                    conversation_id=str(conversation_id)
-                                )
-                                print(f"Email notification sent to {participant.email}")
-                            except Exception as e:
-                                print(f"Erreur lors de l'envoi de l'email de notification: {e}")
-
-            return new_message
+            if not created:
+                return messages
+
+            # Mettre à jour les badges des destinataires, puis notifier par email les
+            # participants hors ligne, en un récapitulatif par conversation
+            await self.push_unread_counts(conversation_id, exclude_user_ids=[user_id])
+            self.notifications.notify(conversation_id, user_id, len(created))
+
+            return messages
             
         except Exception as e:
-            print(f"Error in handle_message: {e}")
+            print(f"Error in handle_messages: {e}")
             raise
 
+    async def broadcast_new_messages(
+        self,
+        conversation_id: int,
+        new_messages: List[Message],
+        received_at: Optional[float] = None,
+        committed_at: Optional[float] = None
+    ):
+        """Diffuse des messages créés, chacun avec son numéro de séquence (et sa trace de livraison)"""
+        for new_message in new_messages:
+            trace = None
+            if received_at is not None:
+                trace = DeliveryTrace(
+                    conversation_id,
+                    new_message.id,
+                    new_message.sender_id,
+                    received_at,
+                    committed_at if committed_at is not None else received_at
+                )
+            await self.broadcast_to_conversation(new_message_event(new_message), conversation_id, trace=trace)
+
+    async def handle_read(self, user_id: int, conversation_id: int, message_id: Optional[int] = None):
+        """Avance le filigrane de lecture puis diffuse un accusé numéroté aux autres participants"""
+        last_read_message_id, seq = await self.run_in_session(
+            self._mark_read, conversation_id, user_id, message_id
+        )
+        event = {
+            "type": "messages_read",
+            "user_id": user_id,
+            "conversation_id": conversation_id,
+            "last_read_message_id": last_read_message_id
+        }
+        if seq is not None:
+            event["seq"] = seq
+        await self.broadcast_to_conversation(event, conversation_id, exclude_user_id=user_id)
+        if last_read_message_id is not None:
+            await self.push_unread_counts(conversation_id, user_ids=[user_id])
+
+    @staticmethod
+    def _mark_read(db: Session, conversation_id: int, user_id: int, message_id: Optional[int]):
+        last_read_message_id = message_crud.mark_messages_as_read(
+            db,
+            conversation_id=conversation_id,
+            user_id=user_id,
+            up_to_message_id=message_id
+        )
+        if last_read_message_id is None:
+            return None, None
+        seq = message_crud.allocate_seq(db, conversation_id)
+        db.commit()
+        return last_read_message_id, seq
+
+    async def resume_conversation(self, connection: ClientConnection, conversation_id: int, last_seq: int):
+        """Abonne une socket qui se reconnecte et lui renvoie les événements manqués
+
+        Les événements en direct reçus pendant la reprise sont retenus puis
+        envoyés après ceux rejoués, sans doublon. Les événements viennent
+        du journal de reprise s'il couvre tout l'écart, sinon de la base :
+        messages de numéro supérieur à `last_seq`, puis filigranes de
+        lecture actuels. Au-delà de `WEBSOCKET_REPLAY_MAX_MESSAGES`, rien
+        n'est rejoué et le client se resynchronise en HTTP. Une trame
+        `resumed` marque la fin de la reprise.
+        """
+        key = (connection.socket_id, conversation_id)
+        self._held[key] = []
+        frames: List[str] = []
+        resumed = {"type": "resumed", "conversation_id": conversation_id}
+        try:
+            await self.join_conversation(connection, conversation_id)
+            current_seq = await self.run_in_session(message_crud.get_last_seq, conversation_id)
+            entries = await self.replay_log.since(conversation_id, last_seq)
+            if [seq for seq, _, _ in entries] == list(range(last_seq + 1, current_seq + 1)):
+                frames = [frame for _, frame, excluded in entries if excluded != connection.user_id]
+                resumed["source"] = "log"
+            elif current_seq - last_seq <= WEBSOCKET_REPLAY_MAX_MESSAGES:
+                new_messages, watermarks = await self.run_in_session(
+                    self._load_gap, conversation_id, last_seq, current_seq
+                )
+                frames = [serialize_frame(new_message_event(new_message)) for new_message in new_messages]
+                resumed["source"] = "database"
+                resumed["read_watermarks"] = watermarks
+            else:
+                resumed["source"] = "none"
+                resumed["complete"] = False
+            resumed["seq"] = max(current_seq, last_seq)
+        finally:
+            held = self._held.pop(key, [])
+        monitoring_service.websocket_resumes.labels(source=resumed["source"]).inc()
+        for frame in frames:
+            connection.enqueue(frame)
+        connection.enqueue(serialize_frame(resumed))
+        for frame, droppable, trace in held:
+            seq = json.loads(frame).get("seq")
+            if seq is None or seq > resumed["seq"]:
+                connection.enqueue(frame, droppable, trace)
+
+    @staticmethod
+    def _load_gap(db: Session, conversation_id: int, last_seq: int, current_seq: int):
+        """Messages manqués et filigranes de lecture actuels"""
+        new_messages = [
+            new_message for new_message in message_crud.get_messages_after_seq(
+                db, conversation_id, last_seq, WEBSOCKET_REPLAY_MAX_MESSAGES
+            )
+            if new_message.seq <= current_seq
+        ]
+        return new_messages, message_crud.get_read_watermarks(db, conversation_id)
+
+    async def shutdown(self):
+        """Arrête les tâches d'écriture des sockets et la diffusion entre workers"""
+        for connections in self.active_connections.values():
+            for connection in connections.values():
+                await connection.stop()
+        for task in (self._presence_task, self._reaper_task):
+            if task is not None:
+                task.cancel()
+        self._presence_task = self._reaper_task = None
+        await self.writes.shutdown()
+        await self.flush_presence()
+        await self.notifications.shutdown()
+        slow_deliveries.flush()
+        if self._fanout_started:
+            self._fanout_started = False
+            await self.fanout.stop()
+
 manager = ConnectionManager() 
\ No newline at end of file
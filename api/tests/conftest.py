@@ -1,4 +1,6 @@
 import pytest
+import asyncio
+import json
 import os
 import sys
 from pathlib import Path
@@ -16,6 +18,15 @@ WORKFLOWS_DIR = TEST_DIR / "workflows"
 sys.path.insert(0, str(WORKFLOWS_DIR))
 
 from PIL import Image
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Redis local des tests de diffusion entre workers (ignorés s'il est absent)
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
 # Fixtures pour les tests
 @pytest.fixture
@@ -57,4 +68,137 @@ def test_image_path():
 @pytest.fixture
 def invalid_file_path():
     """Chemin vers un fichier texte invalide pour les tests"""
-    return str(TEST_DIR / "assets" / "invalid_file.txt") 
\ No newline at end of file
+    return str(TEST_DIR / "assets" / "invalid_file.txt") 
+
+@pytest.fixture
+def db():
+    """Session sur une base SQLite en mémoire, avec compteur de requêtes"""
+    from utils.database import Base
+    from scripts.upgrade_schema import upgrade_schema
+    from utils.message_buffer import message_buffer
+    from utils.membership_cache import membership_cache
+    import models  # noqa: F401
+
+    # Les IDs repartent de 1 à chaque base : vider le tampon des derniers messages et les appartenances
+    message_buffer.clear()
+    membership_cache.clear()
+
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    session = sessionmaker(bind=engine)()
+    session.query_count = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_queries(*args):
+        session.query_count += 1
+
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+@pytest.fixture
+def connection_manager(monkeypatch, db):
+    """Gestionnaire WebSocket neuf sur la base de test, sans configuration email réelle"""
+    from utils import settings
+
+    for name, value in {
+        "MAIL_USERNAME": "test@example.com",
+        "MAIL_PASSWORD": "test",
+        "MAIL_FROM": "test@example.com"
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    from services.websocket.ws_manager import ConnectionManager
+
+    manager = ConnectionManager()
+    manager.session_factory = sessionmaker(bind=db.get_bind())
+    return manager
+
+# Aides partagées par les tests unitaires (`from conftest import ...`)
+def create_conversation(db):
+    """Conversation de garde entre un propriétaire et un gardien ; retourne leurs IDs"""
+    from models.user import User
+    from models.message import ConversationType
+    from crud.message import message as message_crud
+
+    owner = User(email="owner@example.com", nom="Martin", prenom="Julie")
+    caretaker = User(email="caretaker@example.com", nom="Dubois", prenom="Pierre")
+    db.add_all([owner, caretaker])
+    db.flush()
+    conversation = message_crud.create_conversation(
+        db,
+        participant_ids=[owner.id, caretaker.id],
+        conversation_type=ConversationType.PLANT_CARE
+    )
+    return conversation.id, owner.id, caretaker.id
+
+def create_conversation_with(db, prefix):
+    """Conversation entre deux nouveaux utilisateurs dont l'email commence par `prefix`"""
+    from models.user import User
+    from models.message import ConversationType
+    from crud.message import message as message_crud
+
+    users = [User(email=f"{prefix}{i}@example.com", nom="Martin", prenom="Julie") for i in range(2)]
+    db.add_all(users)
+    db.flush()
+    conversation = message_crud.create_conversation(
+        db, participant_ids=[user.id for user in users], conversation_type=ConversationType.PLANT_CARE
+    )
+    return conversation.id, users[0].id, users[1].id
+
+def send(db, conversation_id, sender_id, content):
+    from schemas.message import MessageCreate
+    from crud.message import message as message_crud
+
+    return message_crud.create_message(
+        db,
+        message=MessageCreate(content=content, conversation_id=conversation_id),
+        sender_id=sender_id
+    )
+
+def unread_counts(db, conversation_id):
+    from models.message import ConversationParticipant
+
+    return dict(
+        db.query(ConversationParticipant.user_id, ConversationParticipant.unread_count)
+        .filter(ConversationParticipant.conversation_id == conversation_id)
+        .all()
+    )
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.headers = {}
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+def redis_available() -> bool:
+    try:
+        return Redis(host=REDIS_HOST, port=REDIS_PORT, socket_connect_timeout=0.5).ping()
+    except RedisError:
+        return False
+
+async def connect(manager, user_id, socket_id=None):
+    """Connecte une fausse socket ; les trames reçues sont dans `connection.websocket.sent`"""
+    return await manager.connect(FakeWebSocket(), user_id, socket_id or f"socket-{user_id}")
+
+async def flush():
+    """Laisse les tâches d'écriture vider leur file"""
+    await asyncio.sleep(0.01)
+
+def events(connection):
+    """Événements numérotés du flux des conversations (hors badges `unread_changed` du flux utilisateur)"""
+    return [
+        (event["type"], event.get("seq")) for event in connection.websocket.sent
+        if event["type"] != "unread_changed"
+    ]
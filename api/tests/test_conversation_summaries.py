@@ -0,0 +1,50 @@
+"""Tests des résumés de conversation maintenus à l'écriture."""
+from models.message import ConversationSummary, ConversationParticipant
+from crud.message import message as message_crud
+
+from conftest import create_conversation, send, unread_counts
+
+
+def test_create_message_updates_summary(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+
+    send(db, conversation_id, owner_id, "Bonjour")
+    last = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+
+    summary = db.get(ConversationSummary, conversation_id)
+    db.refresh(summary)
+    assert summary.message_count == 2
+    assert summary.last_message_id == last.id
+    assert summary.last_message_preview == "Arrosage deux fois par semaine"
+    assert summary.last_message_sender_id == owner_id
+    assert unread_counts(db, conversation_id) == {owner_id: 0, caretaker_id: 2}
+    assert message_crud.get_unread_count(db, caretaker_id) == [
+        {"conversation_id": conversation_id, "unread_count": 2}
+    ]
+
+
+def test_mark_as_read_resets_reader_counter_only(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    send(db, conversation_id, caretaker_id, "Bonjour !")
+
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id)
+
+    assert unread_counts(db, conversation_id) == {owner_id: 1, caretaker_id: 0}
+
+
+def test_rebuild_repairs_summaries(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    last = send(db, conversation_id, caretaker_id, "Bonjour !")
+
+    db.query(ConversationSummary).delete()
+    db.query(ConversationParticipant).update({"unread_count": 42})
+    db.commit()
+
+    assert message_crud.rebuild_summaries(db) == 1
+
+    summary = db.get(ConversationSummary, conversation_id)
+    assert summary.message_count == 2
+    assert summary.last_message_id == last.id
+    assert unread_counts(db, conversation_id) == {owner_id: 1, caretaker_id: 1}
@@ -0,0 +1,85 @@
+"""Tests de la mesure de latence de livraison des messages WebSocket."""
+import asyncio
+import time
+
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+
+from services.monitoring_service import monitoring_service
+from services.websocket.delivery_trace import DeliveryTrace, SlowDeliveryLog
+from services.websocket.fanout import RedisFanout, conversation_topic
+from conftest import REDIS_HOST, REDIS_PORT, FakeWebSocket, create_conversation, flush, redis_available
+
+
+def observed(platform, delivery):
+    """(nombre, somme) des latences observées pour ces labels"""
+    histogram = monitoring_service.websocket_delivery_latency.labels(platform=platform, delivery=delivery)
+    count = sum(bucket.get() for bucket in histogram._buckets)
+    return count, histogram._sum.get()
+
+
+@pytest.mark.asyncio
+async def test_local_delivery_is_measured_per_recipient_platform(connection_manager, db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    sender = await connection_manager.connect(FakeWebSocket(), owner_id, "sender", "web")
+    reader = await connection_manager.connect(FakeWebSocket(), caretaker_id, "reader", "ios")
+    await connection_manager.join_conversation(sender, conversation_id)
+    await connection_manager.join_conversation(reader, conversation_id)
+    ios_count, ios_sum = observed("ios", "local")
+    web_count, _ = observed("web", "local")
+
+    await connection_manager.handle_message(owner_id, conversation_id, "Bonjour", received_at=time.time() - 0.2)
+    await flush()
+
+    count, total = observed("ios", "local")
+    assert count == ios_count + 1
+    assert total - ios_sum >= 0.2
+    assert observed("web", "local")[0] == web_count  # L'écho à l'expéditeur n'est pas une livraison
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not redis_available(), reason="Redis local indisponible")
+async def test_cross_worker_delivery_is_measured_as_remote(connection_manager):
+    connection_manager.fanout = RedisFanout(
+        redis_client=AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    )
+    other_worker = RedisFanout(redis_client=AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True))
+    reader = await connection_manager.connect(FakeWebSocket(), 2, "reader", "android")
+    await connection_manager.join_conversation(reader, 7)
+    before, _ = observed("android", "remote")
+    try:
+        now = time.time()
+        trace = DeliveryTrace(7, 1, 1, now - 0.05, now - 0.01, now)
+        await other_worker.publish(conversation_topic(7), '{"type":"new_message","seq":1}', trace=trace)
+        for _ in range(50):
+            if reader.websocket.sent:
+                break
+            await asyncio.sleep(0.05)
+        await flush()
+        assert reader.websocket.sent == [{"type": "new_message", "seq": 1}]
+        assert observed("android", "remote")[0] == before + 1
+    finally:
+        await connection_manager.shutdown()
+
+
+class RecordingLogger:
+    """Remplace le journal des livraisons lentes : les lignes restent en mémoire"""
+
+    def __init__(self):
+        self.records = []
+
+    def info(self, record):
+        self.records.append(record)
+
+
+def test_slow_log_keeps_the_slowest_deliveries_of_the_window():
+    logger = RecordingLogger()
+    log = SlowDeliveryLog(threshold=0.5, samples=2, interval=3600, logger=logger)
+    for latency in (0.6, 2.0, 0.9, 1.5):
+        log.offer(latency, {"latency_ms": latency * 1000})
+
+    assert [record["latency_ms"] for record in log.flush()] == [2000, 1500]
+    assert [record["latency_ms"] for record in logger.records] == [2000, 1500]
+    assert log.flush() == []  # Nouvelle période
+    assert len(logger.records) == 2
@@ -0,0 +1,88 @@
+"""Test de non-régression du nombre de requêtes de la boîte de réception."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.user import User
+from models.plant import Plant
+from models.plant_care import PlantCare
+from models.advice import Advice
+from models.message import ConversationType
+from schemas.message import MessageCreate
+from crud.message import message as message_crud
+
+
+def seed_inbox(db, conversations_count: int) -> int:
+    """Crée un utilisateur avec `conversations_count` conversations remplies"""
+    owner = User(email="owner@example.com", nom="Martin", prenom="Julie")
+    db.add(owner)
+    db.flush()
+    plant = Plant(nom="Rose", espece="Rosa", owner_id=owner.id)
+    db.add(plant)
+    db.flush()
+
+    now = datetime.utcnow()
+    for i in range(conversations_count):
+        other = User(email=f"user{i}@example.com", nom="Dubois", prenom=f"Pierre {i}")
+        db.add(other)
+        db.flush()
+
+        if i % 2:
+            related = Advice(texte="Arroser peu", plant_id=plant.id, botanist_id=other.id)
+            conversation_type = ConversationType.BOTANICAL_ADVICE
+        else:
+            related = PlantCare(
+                plant_id=plant.id,
+                owner_id=owner.id,
+                caretaker_id=other.id,
+                start_date=now,
+                end_date=now + timedelta(days=7)
+            )
+            conversation_type = ConversationType.PLANT_CARE
+        db.add(related)
+        db.flush()
+
+        conversation = message_crud.create_conversation(
+            db,
+            participant_ids=[owner.id, other.id],
+            conversation_type=conversation_type,
+            related_id=related.id
+        )
+        for j in range(3):
+            message_crud.create_message(
+                db,
+                message=MessageCreate(content=f"Message {j}", conversation_id=conversation.id),
+                sender_id=other.id if j % 2 else owner.id
+            )
+    return owner.id
+
+
+@pytest.mark.parametrize("conversations_count", [1, 10, 50])
+def test_inbox_query_count_is_constant(db, conversations_count):
+    user_id = seed_inbox(db, conversations_count)
+    db.expire_all()
+    db.query_count = 0
+
+    conversations = message_crud.get_user_conversations(db, user_id=user_id, limit=100)
+
+    assert len(conversations) == conversations_count
+    assert db.query_count <= 4
+
+
+def test_inbox_content(db):
+    user_id = seed_inbox(db, 2)
+
+    conversations = message_crud.get_user_conversations(db, user_id=user_id)
+    by_type = {conversation["type"]: conversation for conversation in conversations}
+
+    plant_care = by_type["plant_care"]
+    assert plant_care["last_message"]["content"] == "Message 2"
+    assert plant_care["unread_count"] == 1
+    assert [p["prenom"] for p in plant_care["participants"]] == ["Pierre 0"]
+    assert plant_care["plant_info"]["nom"] == "Rose"
+    assert plant_care["plant_care_info"]["owner_id"] == user_id
+    assert plant_care["advice_info"] is None
+
+    advice = by_type["botanical_advice"]
+    assert advice["plant_info"]["nom"] == "Rose"
+    assert advice["advice_info"]["botanist_id"] == advice["participants"][0]["id"]
@@ -0,0 +1,62 @@
+"""Tests du cache d'appartenance aux conversations."""
+import pytest
+
+from crud.message import message as message_crud
+from models.message import ConversationType
+from services.monitoring_service import monitoring_service
+from utils.membership_cache import MembershipCache
+from conftest import create_conversation
+
+
+def lookups(result):
+    return monitoring_service.membership_cache_requests.labels(result=result)._value.get()
+
+
+def test_membership_is_read_once(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    hits, misses = lookups("hit"), lookups("miss")
+
+    assert message_crud.is_participant(db, conversation_id, owner_id)
+    queries = db.query_count
+    assert message_crud.is_participant(db, conversation_id, owner_id)
+    assert not message_crud.is_participant(db, conversation_id + 1, owner_id)
+    assert not message_crud.is_participant(db, conversation_id + 1, owner_id)
+
+    assert db.query_count == queries + 1  # Seul le premier refus lit la base
+    assert (lookups("hit") - hits, lookups("miss") - misses) == (2, 2)
+
+
+def test_created_conversation_invalidates_cached_refusal(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    assert not message_crud.is_participant(db, conversation_id + 1, owner_id)
+
+    created = message_crud.create_conversation(
+        db, participant_ids=[owner_id, caretaker_id], conversation_type=ConversationType.PLANT_CARE
+    )
+    assert created.id == conversation_id + 1
+    assert message_crud.is_participant(db, created.id, owner_id)
+
+
+def test_refusal_expires_and_least_recent_entries_are_evicted():
+    cache = MembershipCache(max_entries=2, negative_ttl=0)
+    cache.set(1, 7, False)
+    assert cache.get(1, 7) is None
+
+    cache.set(1, 7, True)
+    cache.set(2, 7, True)
+    cache.get(1, 7)
+    cache.set(3, 7, True)
+    assert (cache.get(1, 7), cache.get(2, 7), len(cache)) == (True, None, 2)
+
+
+@pytest.mark.asyncio
+async def test_websocket_check_stays_on_the_loop_once_cached(connection_manager, db, monkeypatch):
+    conversation_id, owner_id, _ = create_conversation(db)
+    assert await connection_manager.is_participant(owner_id, conversation_id)
+
+    async def no_database(*args, **kwargs):
+        raise AssertionError("appartenance relue en base")
+
+    monkeypatch.setattr(connection_manager, "run_in_session", no_database)
+    assert await connection_manager.is_participant(owner_id, conversation_id)
+    await connection_manager.shutdown()
@@ -0,0 +1,92 @@
+"""Tests de l'archivage des conversations terminées."""
+from datetime import datetime, timedelta
+
+from models.user import User
+from models.plant import Plant
+from models.plant_care import PlantCare
+from models.message import Message, MessageArchive, ConversationType, ConversationSummary
+from schemas.message import MessageCreate
+from crud.message import message as message_crud
+
+LATER = datetime.utcnow() + timedelta(days=400)  # Date d'archivage simulée
+
+
+def create_care_conversation(db, end_in_days=7):
+    owner = User(email=f"owner{end_in_days}@example.com", nom="Martin", prenom="Julie")
+    caretaker = User(email=f"caretaker{end_in_days}@example.com", nom="Dubois", prenom="Pierre")
+    db.add_all([owner, caretaker])
+    db.flush()
+    plant = Plant(nom="Rose", espece="Rosa", owner_id=owner.id)
+    db.add(plant)
+    db.flush()
+    now = datetime.utcnow()
+    care = PlantCare(
+        plant_id=plant.id,
+        owner_id=owner.id,
+        caretaker_id=caretaker.id,
+        start_date=now,
+        end_date=now + timedelta(days=end_in_days)
+    )
+    db.add(care)
+    db.flush()
+    conversation = message_crud.create_conversation(
+        db,
+        participant_ids=[owner.id, caretaker.id],
+        conversation_type=ConversationType.PLANT_CARE,
+        related_id=care.id
+    )
+    sent = [
+        message_crud.create_message(
+            db,
+            message=MessageCreate(content=f"Message {i}", conversation_id=conversation.id),
+            sender_id=owner.id
+        )
+        for i in range(5)
+    ]
+    return conversation.id, owner.id, [m.id for m in sent]
+
+
+def page(db, conversation_id, **kwargs):
+    return [m["id"] for m in message_crud.get_conversation_messages(db, conversation_id, **kwargs)]
+
+
+def test_finished_care_is_archived_and_read_transparently(db):
+    conversation_id, owner_id, ids = create_care_conversation(db)
+
+    assert message_crud.archive_finished_conversations(db, 6, now=LATER) == {conversation_id: 5}
+    assert db.query(Message).count() == 0
+    assert db.get(MessageArchive, conversation_id).message_count == 5
+
+    new = message_crud.create_message(
+        db, message=MessageCreate(content="De retour !", conversation_id=conversation_id), sender_id=owner_id
+    )
+    assert page(db, conversation_id, limit=3) == [new.id, ids[4], ids[3]]
+    assert page(db, conversation_id, limit=2, skip=2) == [ids[3], ids[2]]
+    assert page(db, conversation_id, limit=10) == [new.id] + ids[::-1]
+    assert page(db, conversation_id, limit=3, before_id=ids[3]) == [ids[2], ids[1], ids[0]]
+    assert page(db, conversation_id, limit=3, before_id=new.id) == [ids[4], ids[3], ids[2]]
+    assert page(db, conversation_id, limit=3, after_id=ids[1]) == [ids[4], ids[3], ids[2]]
+    assert page(db, conversation_id, limit=3, after_id=ids[3]) == [new.id, ids[4]]
+    assert message_crud.get_conversation_messages_count(db, conversation_id) == 6
+
+
+def test_inbox_and_rebuild_use_archived_last_message(db):
+    conversation_id, owner_id, ids = create_care_conversation(db)
+    message_crud.archive_finished_conversations(db, 6, now=LATER)
+
+    inbox = message_crud.get_user_conversations(db, owner_id)
+    assert inbox[0]["last_message"]["id"] == ids[-1]
+    assert inbox[0]["last_message"]["content"] == "Message 4"
+
+    db.query(ConversationSummary).delete()
+    db.commit()
+    message_crud.rebuild_summaries(db)
+    summary = db.get(ConversationSummary, conversation_id)
+    assert (summary.message_count, summary.last_message_id) == (5, ids[-1])
+
+
+def test_ongoing_care_is_not_archived(db):
+    create_care_conversation(db, end_in_days=400)
+
+    assert message_crud.archive_finished_conversations(db, 6, now=LATER) == {}
+    assert db.query(Message).count() == 5
@@ -0,0 +1,101 @@
+"""Tests de l'envoi groupé et idempotent de messages."""
+from models.message import Message, ConversationSummary, ConversationType
+from schemas.message import MessageCreate, MessageBatchItem
+from crud.message import message as message_crud
+
+from conftest import create_conversation, unread_counts
+
+
+def batch(*client_msg_ids):
+    return [MessageBatchItem(content=f"Message {client_msg_id}", client_msg_id=client_msg_id) for client_msg_id in client_msg_ids]
+
+
+def test_batch_is_inserted_in_one_transaction(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+
+    messages, created = message_crud.create_messages(
+        db, conversation_id=conversation_id, messages=batch("a", "b", "c"), sender_id=owner_id
+    )
+
+    assert [m.client_msg_id for m in messages] == ["a", "b", "c"]
+    assert created == messages
+    summary = db.get(ConversationSummary, conversation_id)
+    assert summary.message_count == 3
+    assert summary.last_message_id == messages[-1].id
+    assert unread_counts(db, conversation_id) == {owner_id: 0, caretaker_id: 3}
+
+
+def test_resent_client_ids_are_ignored(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    first, _ = message_crud.create_messages(
+        db, conversation_id=conversation_id, messages=batch("a", "b"), sender_id=owner_id
+    )
+
+    messages, created = message_crud.create_messages(
+        db, conversation_id=conversation_id, messages=batch("b", "c", "c"), sender_id=owner_id
+    )
+
+    assert messages[0].id == first[1].id
+    assert [m.client_msg_id for m in created] == ["c"]
+    assert messages[1] is messages[2]
+    assert db.query(Message).count() == 3
+    assert unread_counts(db, conversation_id)[caretaker_id] == 3
+
+
+def test_single_send_is_idempotent(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    message_in = MessageCreate(content="Bonjour", conversation_id=conversation_id, client_msg_id="retry-1")
+
+    first = message_crud.create_message(db, message=message_in, sender_id=owner_id)
+    second = message_crud.create_message(db, message=message_in, sender_id=owner_id)
+
+    assert first.id == second.id
+    assert db.get(ConversationSummary, conversation_id).message_count == 1
+
+
+def test_same_client_id_in_other_conversation_is_a_new_message(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_conversation = message_crud.create_conversation(
+        db, participant_ids=[owner_id, caretaker_id], conversation_type=ConversationType.PLANT_CARE
+    )
+
+    message_crud.create_messages(db, conversation_id=conversation_id, messages=batch("a"), sender_id=owner_id)
+    _, created = message_crud.create_messages(
+        db, conversation_id=other_conversation.id, messages=batch("a"), sender_id=owner_id
+    )
+
+    assert len(created) == 1
+
+
+def test_same_client_id_from_another_sender_is_a_new_message(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    sent, _ = message_crud.create_messages(db, conversation_id=conversation_id, messages=batch("a"), sender_id=owner_id)
+
+    messages, created = message_crud.create_messages(
+        db, conversation_id=conversation_id, messages=batch("a"), sender_id=caretaker_id
+    )
+
+    assert created == messages
+    assert messages[0].id != sent[0].id
+    assert messages[0].sender_id == caretaker_id
+
+
+def test_grouped_writes_lock_conversations_in_id_order(db, monkeypatch):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_conversation = message_crud.create_conversation(
+        db, participant_ids=[owner_id, caretaker_id], conversation_type=ConversationType.PLANT_CARE
+    )
+    locked = []
+    allocate_seq = message_crud.allocate_seq
+    monkeypatch.setattr(
+        message_crud, "allocate_seq",
+        lambda db, conversation_id, count=1: locked.append(conversation_id) or allocate_seq(db, conversation_id, count)
+    )
+
+    results = message_crud.create_message_groups(db, [
+        (other_conversation.id, batch("b"), caretaker_id),
+        (conversation_id, batch("a"), owner_id)
+    ])
+
+    assert locked == [conversation_id, other_conversation.id]
+    assert [messages[0].client_msg_id for messages, _ in results] == ["b", "a"]  # Résultats dans l'ordre des groupes
@@ -0,0 +1,93 @@
+"""Tests du tampon des derniers messages par conversation."""
+from datetime import datetime
+
+from models.message import Message
+from services.monitoring_service import monitoring_service
+from crud.message import message as message_crud
+from utils.message_buffer import RecentMessageBuffer
+from utils.settings import MESSAGE_PAGE_SIZE
+from conftest import create_conversation, send
+
+
+def buffer_hits():
+    return monitoring_service.message_buffer_requests.labels(result="hit")._value.get()
+
+
+def first_page(db, conversation_id, limit=50):
+    return [m["content"] for m in message_crud.get_conversation_messages(db, conversation_id, limit=limit)]
+
+
+def test_first_page_is_served_from_buffer(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+
+    assert first_page(db, conversation_id) == ["Bonjour"]  # Remplit le tampon
+    hits = buffer_hits()
+    send(db, conversation_id, caretaker_id, "Bonjour !")
+    db.query_count = 0
+
+    assert first_page(db, conversation_id) == ["Bonjour !", "Bonjour"]
+    assert buffer_hits() == hits + 1
+    assert db.query_count == 2  # Conversation et filigranes, sans lecture des messages
+
+
+def test_default_history_page_fits_in_buffer(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    for i in range(MESSAGE_PAGE_SIZE + 10):
+        send(db, conversation_id, owner_id, f"Message {i}")
+    # La route lit une ligne de plus que la page pour calculer has_more
+    first_page(db, conversation_id, limit=MESSAGE_PAGE_SIZE + 1)
+    hits = buffer_hits()
+
+    assert len(first_page(db, conversation_id, limit=MESSAGE_PAGE_SIZE + 1)) == MESSAGE_PAGE_SIZE + 1
+    assert buffer_hits() == hits + 1
+
+
+def test_buffer_is_bypassed_when_another_worker_wrote(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    first_page(db, conversation_id)
+
+    # Message écrit par un autre worker : le tampon local n'est pas alimenté
+    db_message = Message(content="Depuis un autre worker", conversation_id=conversation_id, sender_id=caretaker_id)
+    db.add(db_message)
+    db.flush()
+    message_crud._record_new_messages(db, conversation_id, [db_message])
+    db.commit()
+    hits = buffer_hits()
+
+    assert first_page(db, conversation_id) == ["Depuis un autre worker", "Bonjour"]
+    assert buffer_hits() == hits
+
+
+def test_partial_buffer_serves_smaller_pages_only(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    for i in range(5):
+        send(db, conversation_id, owner_id, f"Message {i}")
+    first_page(db, conversation_id, limit=2)
+    hits = buffer_hits()
+
+    assert first_page(db, conversation_id, limit=2) == ["Message 4", "Message 3"]
+    assert first_page(db, conversation_id, limit=3) == ["Message 4", "Message 3", "Message 2"]
+    assert buffer_hits() == hits + 1
+
+
+def test_ring_buffer_eviction():
+    now = datetime.utcnow()
+    rows = lambda conversation_id, ids: [("x" * 100, i, 1, conversation_id, now, now, None) for i in ids]
+    buffer = RecentMessageBuffer(size=3, max_conversations=2, max_bytes=10_000)
+
+    buffer.fill(1, rows(1, [2, 1]), message_count=2, complete=True)
+    buffer.append(1, rows(1, [3, 4]))
+    assert [row[1] for row in buffer.get(1, 4, 4, limit=3)] == [4, 3, 2]
+    assert buffer.get(1, 4, 4, limit=4) is None  # Le message 1 est sorti de l'anneau
+
+    buffer.fill(2, rows(2, [5]), message_count=1, complete=True)
+    buffer.fill(3, rows(3, [6]), message_count=1, complete=True)
+    assert len(buffer) == 2
+    assert buffer.get(1, 4, 4, limit=1) is None  # Conversation la moins récemment utilisée
+
+    buffer.max_bytes = 600
+    buffer.fill(4, rows(4, [7]), message_count=1, complete=True)
+    assert len(buffer) == 1
+    assert buffer.bytes <= 600
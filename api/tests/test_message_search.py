@@ -0,0 +1,67 @@
+"""Tests de la recherche plein texte des messages."""
+from models.message import ConversationType, Message
+from models.user import User
+from crud.message import message as message_crud
+
+from conftest import create_conversation, send
+
+
+def test_search_highlights_matches_in_user_conversations(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour, la clé est sous le pot de basilic")
+    watering = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine, sans excès")
+
+    results = message_crud.search_messages(db, caretaker_id, "arrosage")
+
+    assert [r["id"] for r in results] == [watering.id]
+    assert "<mark>Arrosage</mark>" in results[0]["snippet"]
+
+
+def test_search_snippet_escapes_message_content(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "<img src=x onerror=alert(1)> arrosage")
+
+    snippet = message_crud.search_messages(db, caretaker_id, "arrosage")[0]["snippet"]
+
+    assert snippet == "&lt;img src=x onerror=alert(1)&gt; <mark>arrosage</mark>"
+
+
+def test_like_fallback_matches_wildcards_literally(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    send(db, conversation_id, owner_id, "Engrais dilué à 500 ml")
+    discount = send(db, conversation_id, owner_id, "Engrais dilué à 50% <b>")
+    filters = [Message.conversation_id == conversation_id]
+
+    rows = message_crud._search_like(db, "50%", filters, limit=10)
+
+    assert [row.id for row in rows] == [discount.id]
+    assert message_crud._search_like(db, "a_b", filters, limit=10) == []
+    assert message_crud._highlight(rows[0].snippet) == "Engrais dilué à 50% &lt;b&gt;"
+
+
+def test_search_is_accent_insensitive_and_prefix_based(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    message = send(db, conversation_id, owner_id, "Éviter l'exposition plein soleil")
+
+    assert [r["id"] for r in message_crud.search_messages(db, caretaker_id, "eviter expo")] == [message.id]
+
+
+def test_search_excludes_other_conversations(db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    send(db, conversation_id, owner_id, "Arrosage le lundi")
+    outsider = User(email="outsider@example.com", nom="Petit", prenom="Léa")
+    db.add(outsider)
+    db.flush()
+    message_crud.create_conversation(db, participant_ids=[outsider.id], conversation_type=ConversationType.PLANT_CARE)
+
+    assert message_crud.search_messages(db, outsider.id, "arrosage") == []
+
+
+def test_search_paginates_by_cursor(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    sent = [send(db, conversation_id, owner_id, f"Arrosage numéro {i}") for i in range(3)]
+
+    first = message_crud.search_messages(db, caretaker_id, "arrosage", limit=2)
+    rest = message_crud.search_messages(db, caretaker_id, "arrosage", before_id=first[-1]["id"], limit=2)
+
+    assert [r["id"] for r in first + rest] == [m.id for m in reversed(sent)]
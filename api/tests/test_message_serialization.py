@@ -0,0 +1,25 @@
+"""Le chemin rapide de sérialisation doit garder le format du schéma Message."""
+from typing import List
+
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
+
+from schemas.message import Message as MessageSchema
+from crud.message import message as message_crud
+
+from conftest import create_conversation, send
+
+messages_adapter = TypeAdapter(List[MessageSchema])
+
+
+def test_fast_path_matches_response_model(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour, merci de garder ma plante")
+    send(db, conversation_id, caretaker_id, "Avec plaisir ! Arrosage à l'eau de pluie ?")
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id)
+
+    messages = message_crud.get_conversation_messages(db, conversation_id)
+    expected = messages_adapter.dump_json(messages_adapter.validate_python(messages))
+
+    assert ORJSONResponse(messages).body == expected
+    assert [m["is_read"] for m in messages] == [False, True]
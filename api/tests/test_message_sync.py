@@ -0,0 +1,57 @@
+"""Tests de la synchronisation différentielle des messages."""
+from datetime import datetime, timedelta
+
+from crud.message import message as message_crud
+
+from conftest import create_conversation, send
+
+
+def test_sync_pages_through_messages_of_all_conversations(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    sent = [send(db, conversation_id, owner_id, f"Message {i}") for i in range(3)]
+    until = datetime.utcnow() + timedelta(seconds=1)
+
+    first = message_crud.get_sync_changes(db, caretaker_id, since=None, until=until, limit=2)
+    assert [m["id"] for m in first["messages"]] == [sent[0].id, sent[1].id]
+    assert first["has_more"] is True
+    assert [c["id"] for c in first["conversations"]] == [conversation_id]
+    assert {w["user_id"] for w in first["read_watermarks"]} == {owner_id, caretaker_id}
+
+    rest = message_crud.get_sync_changes(
+        db, caretaker_id, since=None, until=until, after=first["last_position"], limit=2
+    )
+    assert [m["id"] for m in rest["messages"]] == [sent[2].id]
+    assert rest["has_more"] is False
+    assert rest["conversations"] == []
+
+
+def test_sync_since_returns_only_changes(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    since = datetime.utcnow()
+    last = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id)
+
+    changes = message_crud.get_sync_changes(
+        db, owner_id, since=since, until=datetime.utcnow() + timedelta(seconds=1)
+    )
+
+    assert [m["id"] for m in changes["messages"]] == [last.id]
+    assert changes["messages"][0]["is_read"] is True
+    assert changes["read_watermarks"] == [{
+        "conversation_id": conversation_id,
+        "user_id": caretaker_id,
+        "last_read_message_id": last.id,
+        "last_read_at": changes["read_watermarks"][0]["last_read_at"]
+    }]
+    assert [c["id"] for c in changes["conversations"]] == [conversation_id]
+
+
+def test_sync_ignores_other_users_conversations(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+
+    changes = message_crud.get_sync_changes(db, caretaker_id + 1000, since=None, until=datetime.utcnow())
+
+    assert changes["messages"] == []
+    assert changes["conversations"] == []
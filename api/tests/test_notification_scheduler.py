@@ -0,0 +1,96 @@
+"""Tests des emails de nouveaux messages regroupés, hors ligne uniquement et retentés."""
+import pytest
+
+from services.email.notification_scheduler import NotificationScheduler
+from conftest import connect, create_conversation
+
+WINDOW = 60
+RETRY_DELAY = 30
+
+
+class FakeClock:
+    """Horloge avancée à la main : les échéances ne dépendent pas de la durée réelle des tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def outbox(connection_manager):
+    """Horloge manuelle et envoi SMTP remplacé par une liste"""
+    sent, failures, clock = [], [], FakeClock()
+
+    async def send_new_messages_digest(**kwargs):
+        if failures:
+            raise failures.pop(0)
+        sent.append(kwargs)
+
+    scheduler = NotificationScheduler(
+        connection_manager.presence,
+        connection_manager.run_in_session,
+        window=WINDOW,
+        retry_delay=RETRY_DELAY,
+        clock=clock
+    )
+    scheduler.email_service.send_new_messages_digest = send_new_messages_digest
+    connection_manager.notifications = scheduler
+    return sent, failures, clock
+
+
+@pytest.mark.asyncio
+async def test_burst_is_sent_as_one_digest_to_offline_recipient(connection_manager, outbox, db):
+    sent, _, clock = outbox
+    scheduler = connection_manager.notifications
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    for i in range(10):
+        await connection_manager.handle_message(owner_id, conversation_id, f"Message {i}")
+    await connection_manager.handle_message(caretaker_id, conversation_id, "Réponse")
+    clock.advance(WINDOW - 1)
+    await scheduler.flush()
+    assert sent == []  # Rien n'est envoyé pendant la fenêtre
+
+    clock.advance(1)
+    await scheduler.flush()
+    assert sorted((email["recipient_email"], email["message_count"]) for email in sent) == [
+        ("caretaker@example.com", 10),
+        ("owner@example.com", 1)
+    ]
+    assert {email["recipient_email"]: email["sender_names"] for email in sent}["caretaker@example.com"] == ["Julie Martin"]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_connected_recipient_gets_no_email(connection_manager, outbox, db):
+    sent, _, clock = outbox
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    await connect(connection_manager, caretaker_id)
+    await connection_manager.handle_message(owner_id, conversation_id, "Bonjour")
+
+    clock.advance(WINDOW)
+    await connection_manager.notifications.flush()
+    assert sent == []
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_email_is_retried(connection_manager, outbox, db):
+    sent, failures, clock = outbox
+    scheduler = connection_manager.notifications
+    failures.append(ConnectionError("SMTP indisponible"))
+    conversation_id, owner_id, _ = create_conversation(db)
+    await connection_manager.handle_message(owner_id, conversation_id, "Bonjour")
+
+    clock.advance(WINDOW)
+    await scheduler.flush()
+    assert (failures, sent) == ([], [])  # Échec : nouvelle tentative dans RETRY_DELAY
+
+    clock.advance(RETRY_DELAY)
+    await scheduler.flush()
+    assert [email["recipient_email"] for email in sent] == ["caretaker@example.com"]
+    await connection_manager.shutdown()
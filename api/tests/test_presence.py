@@ -0,0 +1,103 @@
+"""Tests de la présence à durée de vie limitée et de son écriture en base par lots."""
+import asyncio
+
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+
+from crud.message import message as message_crud
+from models.user import User
+from models.user_status import UserPresence, UserStatus
+from services.websocket.presence import InMemoryPresenceStore, RedisPresenceStore
+from conftest import REDIS_HOST, REDIS_PORT, connect, create_conversation, flush, redis_available
+
+
+async def check_sockets_and_expiry(store, db):
+    assert await store.connect(1, "phone")  # Passage en ligne
+    assert not await store.connect(1, "tablet")
+    assert not await store.disconnect(1, "phone")  # La tablette reste connectée
+    assert (await store.get_presence(db, [1]))[1]["status"] == "online"
+    assert await store.disconnect(1, "tablet")
+
+    # Une socket qui n'est plus renouvelée expire (worker arrêté)
+    await store.connect(2, "a")
+    await store.connect(3, "b")
+    await asyncio.sleep(0.15)
+    await store.heartbeat([(3, "b")])
+    await asyncio.sleep(0.1)
+    presence = await store.get_presence(db, [1, 2, 3])
+    assert [presence[user_id]["status"] for user_id in (1, 2, 3)] == ["offline", "offline", "online"]
+    assert all(presence[user_id]["last_seen_at"] is not None for user_id in (1, 2, 3))
+
+
+@pytest.mark.asyncio
+async def test_in_memory_presence_tracks_sockets_and_expires(db):
+    await check_sockets_and_expiry(InMemoryPresenceStore(ttl=0.2), db)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not redis_available(), reason="Redis local indisponible")
+async def test_redis_presence_tracks_sockets_and_expires(db):
+    client = AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    keys = ["presence:1", "presence:2", "presence:3", RedisPresenceStore.LAST_SEEN_KEY]
+    await client.delete(*keys)
+    try:
+        await check_sockets_and_expiry(RedisPresenceStore(ttl=0.2, redis_client=client), db)
+    finally:
+        await client.delete(*keys)
+        await client.aclose()
+
+
+def test_presence_is_limited_to_shared_conversations(db):
+    _, owner_id, caretaker_id = create_conversation(db)
+    stranger = User(email="stranger@example.com", nom="Petit", prenom="Léa")
+    db.add(stranger)
+    db.flush()
+
+    contacts = message_crud.get_contact_ids(db, owner_id, [owner_id, caretaker_id, stranger.id, 999])
+
+    assert sorted(contacts) == [owner_id, caretaker_id]
+    assert message_crud.get_contact_ids(db, stranger.id, [owner_id]) == []
+
+
+@pytest.mark.asyncio
+async def test_last_seen_is_written_in_batches(connection_manager, db):
+    _, owner_id, caretaker_id = create_conversation(db)
+    await connect(connection_manager, owner_id, "phone")
+    await connect(connection_manager, owner_id, "tablet")
+    await connect(connection_manager, caretaker_id)
+    await connection_manager.disconnect(caretaker_id, f"socket-{caretaker_id}")
+    assert db.query(UserPresence).count() == 0  # Aucune écriture à la connexion
+
+    queries = db.query_count
+    await connection_manager.flush_presence()
+    db.expire_all()
+    stored = {presence.user_id: presence for presence in db.query(UserPresence)}
+    assert {user_id: presence.status for user_id, presence in stored.items()} == {
+        owner_id: UserStatus.ONLINE,
+        caretaker_id: UserStatus.OFFLINE
+    }
+    assert db.query_count - queries <= 4  # Lecture, insertion groupée et commit
+
+    # Un gestionnaire sans état (autre worker) retrouve last_seen_at en base
+    fresh = type(connection_manager.presence)()
+    presence = await fresh.get_presence(db, [caretaker_id])
+    assert presence[caretaker_id]["status"] == "offline"
+    assert presence[caretaker_id]["last_seen_at"] == stored[caretaker_id].last_seen_at
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_user_offline_is_broadcast_when_the_last_socket_closes(connection_manager):
+    phone, tablet = await connect(connection_manager, 1, "phone"), await connect(connection_manager, 1, "tablet")
+    reader = await connect(connection_manager, 2)
+    for connection in (phone, tablet, reader):
+        await connection_manager.join_conversation(connection, 7)
+
+    await connection_manager.release(phone)
+    await flush()
+    assert [event["type"] for event in reader.websocket.sent] == []  # La tablette reste connectée
+
+    await connection_manager.release(tablet)
+    await flush()
+    assert reader.websocket.sent == [{"type": "user_offline", "user_id": 1}]
+    await connection_manager.shutdown()
@@ -0,0 +1,99 @@
+"""Tests des filigranes de lecture (last_read_message_id)."""
+import pytest
+
+from models.message import Message, ConversationParticipant, ConversationType
+from crud.message import message as message_crud
+from scripts.migrate_read_watermarks import derive_read_watermarks
+
+from conftest import create_conversation, send, unread_counts
+
+
+def watermark(db, conversation_id, user_id):
+    return (
+        db.query(ConversationParticipant.last_read_message_id)
+        .filter(
+            ConversationParticipant.conversation_id == conversation_id,
+            ConversationParticipant.user_id == user_id
+        )
+        .scalar()
+    )
+
+
+def test_mark_as_read_moves_watermark_without_touching_messages(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    last = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+
+    assert message_crud.mark_messages_as_read(db, conversation_id, caretaker_id) == last.id
+
+    assert watermark(db, conversation_id, caretaker_id) == last.id
+    assert db.query(Message).filter(Message.is_read == True).count() == 0
+    assert unread_counts(db, conversation_id)[caretaker_id] == 0
+
+
+def test_watermark_never_moves_backwards(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    first = send(db, conversation_id, owner_id, "Bonjour")
+    last = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id)
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id, up_to_message_id=first.id)
+
+    assert watermark(db, conversation_id, caretaker_id) == last.id
+
+
+@pytest.mark.parametrize("message_id", ["other", 10 ** 9, "1", True])
+def test_read_up_to_an_unknown_message_is_refused(db, message_id):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    send(db, conversation_id, owner_id, "Bonjour")
+    other = message_crud.create_conversation(
+        db, participant_ids=[owner_id, caretaker_id], conversation_type=ConversationType.BOTANICAL_ADVICE
+    )
+    if message_id == "other":
+        message_id = send(db, other.id, owner_id, "Ailleurs").id
+
+    with pytest.raises(ValueError):
+        message_crud.mark_messages_as_read(db, conversation_id, caretaker_id, up_to_message_id=message_id)
+
+    assert watermark(db, conversation_id, caretaker_id) is None
+    assert unread_counts(db, conversation_id)[caretaker_id] == 1
+
+
+def test_partial_read_recounts_unread(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    first = send(db, conversation_id, owner_id, "Bonjour")
+    send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id, up_to_message_id=first.id)
+
+    assert unread_counts(db, conversation_id)[caretaker_id] == 1
+
+
+def test_is_read_and_receipts_follow_watermarks(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    first = send(db, conversation_id, owner_id, "Bonjour")
+    last = send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+    message_crud.mark_messages_as_read(db, conversation_id, caretaker_id, up_to_message_id=first.id)
+
+    messages = message_crud.get_conversation_messages(db, conversation_id)
+    assert {m["id"]: m["is_read"] for m in messages} == {first.id: True, last.id: False}
+
+    receipts = message_crud.get_read_receipts(db, conversation_id, message_id=first.id)
+    assert receipts["read_by"] == [caretaker_id]
+    assert message_crud.get_read_receipts(db, conversation_id, message_id=last.id)["read_by"] == []
+
+
+def test_migration_derives_watermarks_from_is_read(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    first = send(db, conversation_id, owner_id, "Bonjour")
+    send(db, conversation_id, owner_id, "Arrosage deux fois par semaine")
+
+    # État hérité : lecture portée par la ligne du message
+    db.query(Message).filter(Message.id == first.id).update({"is_read": True})
+    db.query(ConversationParticipant).update({"last_read_at": None, "last_read_message_id": None})
+    db.commit()
+
+    assert derive_read_watermarks(db) == 2
+
+    assert watermark(db, conversation_id, caretaker_id) == first.id
+    assert unread_counts(db, conversation_id) == {owner_id: 0, caretaker_id: 1}
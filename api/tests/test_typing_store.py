@@ -0,0 +1,62 @@
+"""Tests de l'état « en train d'écrire » éphémère et de son anti-rebond."""
+import asyncio
+
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+
+from services.websocket.typing_store import InMemoryTypingStore, RedisTypingStore
+from conftest import REDIS_HOST, REDIS_PORT, connect, flush, redis_available
+
+
+async def check_transitions(store):
+    assert await store.set_typing(7, 1, True)  # Début de frappe
+    assert not await store.set_typing(7, 1, True)  # Rafale fusionnée
+    assert not await store.set_typing(7, 1, True)
+    assert [user_id for user_id, _ in await store.get_typing_users(7)] == [1]
+
+    assert await store.set_typing(7, 1, False)  # Fin de frappe
+    assert not await store.set_typing(7, 1, False)
+    assert await store.get_typing_users(7) == []
+
+    # Après la fenêtre d'anti-rebond, la trame prolonge l'état sans transition
+    assert await store.set_typing(7, 2, True)
+    await asyncio.sleep(0.06)
+    assert not await store.set_typing(7, 2, True)
+
+    # Sans nouvelle trame, l'état expire
+    await asyncio.sleep(0.25)
+    assert await store.get_typing_users(7) == []
+    assert await store.set_typing(7, 2, True)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_store_reports_only_transitions():
+    await check_transitions(InMemoryTypingStore(ttl=0.2, debounce=0.05))
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not redis_available(), reason="Redis local indisponible")
+async def test_redis_store_reports_only_transitions():
+    client = AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    await client.delete("typing:7")
+    try:
+        await check_transitions(RedisTypingStore(ttl=0.2, debounce=0.05, redis_client=client))
+    finally:
+        await client.delete("typing:7")
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_typing_bursts_broadcast_start_and_stop_once(connection_manager):
+    typist, reader = await connect(connection_manager, 1), await connect(connection_manager, 2)
+    await connection_manager.join_conversation(typist, 7)
+    await connection_manager.join_conversation(reader, 7)
+
+    for _ in range(20):
+        await connection_manager.handle_typing_status(1, 7, True)
+    await connection_manager.handle_typing_status(1, 7, False)
+    await flush()
+
+    assert [event["is_typing"] for event in reader.websocket.sent] == [True, False]
+    assert typist.websocket.sent == []
+    await connection_manager.shutdown()
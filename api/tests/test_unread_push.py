@@ -0,0 +1,72 @@
+"""Tests des badges de non lus poussés sur les WebSockets (`unread_changed`)."""
+import pytest
+
+from crud.message import message as message_crud
+from models.message import ConversationType
+from conftest import connect, create_conversation, flush, send
+
+
+def badges(connection):
+    return [
+        (event["conversations"], event["total"], event["snapshot"])
+        for event in connection.websocket.sent if event["type"] == "unread_changed"
+    ]
+
+
+def create_second_conversation(db, owner_id, caretaker_id):
+    """Seconde conversation du même couple, avec un message non lu du gardien"""
+    conversation = message_crud.create_conversation(
+        db, participant_ids=[owner_id, caretaker_id], conversation_type=ConversationType.BOTANICAL_ADVICE
+    )
+    send(db, conversation.id, owner_id, "Photo de la plante")
+    return conversation.id
+
+
+def test_unread_changes_are_read_in_one_query(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_id = create_second_conversation(db, owner_id, caretaker_id)
+    send(db, conversation_id, owner_id, "Bonjour")
+    db.query_count = 0
+
+    changes = message_crud.get_unread_changes(db, conversation_id, exclude_user_ids=[owner_id])
+
+    assert changes == [{"user_id": caretaker_id, "unread_count": 1, "total": 2}]
+    assert message_crud.get_unread_changes(db, other_id, user_ids=[owner_id]) == [
+        {"user_id": owner_id, "unread_count": 0, "total": 0}
+    ]
+    assert db.query_count == 2
+
+
+@pytest.mark.asyncio
+async def test_new_message_pushes_recipient_badges(connection_manager, db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_id = create_second_conversation(db, owner_id, caretaker_id)
+    sender, reader = await connect(connection_manager, owner_id), await connect(connection_manager, caretaker_id)
+
+    await connection_manager.handle_message(owner_id, conversation_id, "Bonjour")
+    await flush()
+
+    # Le destinataire reçoit son badge même sans être abonné à la conversation
+    assert badges(reader) == [({str(conversation_id): 1}, 2, False)]
+    assert badges(sender) == []
+
+    await connection_manager.handle_read(caretaker_id, other_id)
+    await flush()
+    assert badges(reader)[-1] == ({str(other_id): 0}, 1, False)
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_opening_socket_receives_unread_snapshot(connection_manager, db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_id = create_second_conversation(db, owner_id, caretaker_id)
+    send(db, other_id, owner_id, "Arrosage fait ?")
+    owner, caretaker = await connect(connection_manager, owner_id), await connect(connection_manager, caretaker_id)
+
+    await connection_manager.send_unread_snapshot(owner)
+    await connection_manager.send_unread_snapshot(caretaker)
+    await flush()
+
+    assert badges(owner) == [({}, 0, True)]
+    assert badges(caretaker) == [({str(other_id): 2}, 2, True)]
+    await connection_manager.shutdown()
@@ -0,0 +1,51 @@
+"""Tests des accès base WebSocket exécutés hors de la boucle d'événements."""
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import event
+
+from conftest import connect, create_conversation, flush
+
+SLOW_COMMIT_SECONDS = 0.3
+
+
+@pytest.mark.asyncio
+async def test_slow_write_does_not_stall_other_sockets(connection_manager, db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    writer, reader = await connect(connection_manager, owner_id), await connect(connection_manager, caretaker_id)
+    await connection_manager.join_conversation(writer, conversation_id)
+    await connection_manager.join_conversation(reader, conversation_id)
+    emails = []
+
+    async def send_new_messages_digest(**kwargs):
+        emails.append(kwargs["recipient_email"])
+
+    connection_manager.notifications.email_service.send_new_messages_digest = send_new_messages_digest
+
+    @event.listens_for(connection_manager.session_factory, "before_commit")
+    def slow_commit(session):
+        time.sleep(SLOW_COMMIT_SECONDS)
+
+    sending = asyncio.create_task(connection_manager.handle_message(owner_id, conversation_id, "Bonjour"))
+    await asyncio.sleep(0.05)  # L'écriture est en cours dans le pool
+
+    # Pendant le commit, la boucle continue de servir les autres sockets
+    started = time.perf_counter()
+    await connection_manager.broadcast_to_conversation(
+        {"type": "typing_status", "user_id": owner_id, "conversation_id": conversation_id, "is_typing": True},
+        conversation_id,
+        exclude_user_id=owner_id
+    )
+    await flush()
+    latency = time.perf_counter() - started
+
+    assert not sending.done()
+    assert [event["type"] for event in reader.websocket.sent] == ["typing_status"]
+    assert latency < SLOW_COMMIT_SECONDS / 3
+
+    await asyncio.wait_for(sending, timeout=5)
+    await flush()
+    assert [event["type"] for event in reader.websocket.sent] == ["typing_status", "new_message", "unread_changed"]
+    await connection_manager.shutdown()
+    assert emails == []  # Le destinataire est connecté : pas d'email
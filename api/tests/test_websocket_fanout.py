@@ -0,0 +1,94 @@
+"""Tests de la diffusion des événements WebSocket entre workers."""
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+
+from services.websocket.fanout import RedisFanout
+from conftest import REDIS_HOST, REDIS_PORT, connect, flush, redis_available
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+# Second worker : publie des événements de la conversation 7 et de l'utilisateur 1 via son propre gestionnaire
+PUBLISHER = """
+import asyncio
+from services.websocket.ws_manager import ConnectionManager
+from services.websocket.fanout import RedisFanout
+
+async def main():
+    manager = ConnectionManager()
+    manager.fanout = RedisFanout()
+    await manager.broadcast_to_conversation(
+        {"type": "typing_status", "user_id": 2, "conversation_id": 7, "is_typing": True}, 7, exclude_user_id=2
+    )
+    await manager.broadcast_to_conversation(
+        {"type": "new_message", "message": {"id": 1, "content": "Bonjour"}}, 7, exclude_user_id=None
+    )
+    await manager.send_to_user(1, {"type": "conversation_created", "conversation_id": 9})
+
+asyncio.run(main())
+"""
+
+
+@pytest.mark.asyncio
+async def test_in_process_broadcast_reaches_local_sockets(connection_manager):
+    sender, reader = await connect(connection_manager, 1), await connect(connection_manager, 2)
+    await connection_manager.join_conversation(sender, 7)
+    await connection_manager.join_conversation(reader, 7)
+
+    await connection_manager.broadcast_to_conversation({"type": "user_offline", "user_id": 1}, 7, exclude_user_id=1)
+    await connection_manager.leave_conversation(reader, 7)
+    await connection_manager.broadcast_to_conversation({"type": "user_offline", "user_id": 3}, 7)
+    await flush()
+    await connection_manager.shutdown()
+
+    assert reader.websocket.sent == [{"type": "user_offline", "user_id": 1}]
+    assert sender.websocket.sent == [{"type": "user_offline", "user_id": 3}]
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not redis_available(), reason="Redis local indisponible")
+async def test_redis_fanout_across_processes(connection_manager):
+    connection_manager.fanout = RedisFanout(
+        redis_client=AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    )
+    reader, typist = await connect(connection_manager, 1), await connect(connection_manager, 2)
+    await connection_manager.join_conversation(reader, 7)
+    await connection_manager.join_conversation(typist, 7)
+    await connection_manager.join_conversation(reader, 8)
+    try:
+        env = dict(
+            os.environ,
+            REDIS_HOST=REDIS_HOST,
+            REDIS_PORT=str(REDIS_PORT),
+            MAIL_USERNAME="test@example.com",
+            MAIL_PASSWORD="test",
+            MAIL_FROM="test@example.com"
+        )
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", PUBLISHER, cwd=str(API_DIR), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout=30)
+        assert process.returncode == 0, stderr.decode()
+
+        for _ in range(50):
+            if len(reader.websocket.sent) == 3:
+                break
+            await asyncio.sleep(0.1)
+
+        assert [event["type"] for event in reader.websocket.sent] == [
+            "typing_status", "new_message", "conversation_created"
+        ]
+        assert [event["type"] for event in typist.websocket.sent] == ["new_message"]  # L'auteur est exclu
+
+        # Le worker se désabonne au départ du dernier participant local
+        await connection_manager.leave_conversation(reader, 7)
+        await connection_manager.leave_conversation(typist, 7)
+        assert connection_manager.fanout.channels == {"ws:conversation:8", "ws:user:1", "ws:user:2"}
+    finally:
+        await connection_manager.shutdown()
@@ -0,0 +1,94 @@
+"""Tests de la socket unique multiplexée entre les conversations."""
+import pytest
+
+from conftest import connect, create_conversation, flush
+
+
+def types(connection):
+    return [event["type"] for event in connection.websocket.sent]
+
+
+@pytest.mark.asyncio
+async def test_sockets_receive_only_subscribed_conversations(connection_manager):
+    phone = await connect(connection_manager, 1, "phone")
+    tablet = await connect(connection_manager, 1, "tablet")
+    other = await connect(connection_manager, 2)
+    await connection_manager.join_conversation(phone, 7)
+    await connection_manager.join_conversation(phone, 8)
+    await connection_manager.join_conversation(tablet, 7)
+    await connection_manager.join_conversation(other, 7)
+
+    await connection_manager.broadcast_to_conversation({"type": "new_message", "conversation_id": 8}, 8)
+    await connection_manager.broadcast_to_conversation({"type": "new_message", "conversation_id": 7}, 7)
+    await connection_manager.send_to_user(1, {"type": "conversation_created", "conversation_id": 9})
+    await flush()
+
+    assert types(phone) == ["new_message", "new_message", "conversation_created"]
+    assert types(tablet) == ["new_message", "conversation_created"]
+    assert types(other) == ["new_message"]
+
+    # L'utilisateur reste participant local tant qu'une de ses sockets suit la conversation
+    await connection_manager.leave_conversation(phone, 7)
+    assert connection_manager.conversation_participants[7] == {1, 2}
+    assert await connection_manager.disconnect(1, "tablet") == ({7}, False)  # Le téléphone reste connecté
+    assert connection_manager.conversation_participants == {7: {2}, 8: {1}}
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_frame_requires_participation(connection_manager, db, monkeypatch):
+    from routers import ws
+
+    monkeypatch.setattr(ws, "manager", connection_manager)
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    outsider = await connect(connection_manager, caretaker_id + 1)
+    owner = await connect(connection_manager, owner_id)
+
+    await ws.handle_frame(outsider, {"type": "subscribe", "conversation_id": conversation_id})
+    await ws.handle_frame(owner, {"type": "typing", "conversation_id": conversation_id, "is_typing": True})
+    await ws.handle_frame(owner, {"type": "subscribe", "conversation_id": conversation_id})
+    await ws.handle_frame(owner, {"type": "unsubscribe", "conversation_id": conversation_id})
+    await flush()
+
+    assert types(outsider) == ["error"]
+    assert outsider.conversations == set()
+    assert types(owner) == ["error", "subscribed", "unsubscribed"]
+    assert connection_manager.conversation_participants == {}
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_malformed_messages_are_refused_without_closing_the_socket(connection_manager, db, monkeypatch):
+    from routers import ws
+
+    monkeypatch.setattr(ws, "manager", connection_manager)
+    conversation_id, owner_id, _ = create_conversation(db)
+    owner = await connect(connection_manager, owner_id)
+    await ws.handle_frame(owner, {"type": "subscribe", "conversation_id": conversation_id})
+
+    await ws.handle_frame(owner, {"type": "messages", "conversation_id": conversation_id, "messages": [{"client_msg_id": "a"}]})
+    await ws.handle_frame(owner, {"type": "message", "conversation_id": conversation_id, "content": "Bonjour", "client_msg_id": 123})
+    await ws.handle_frame(owner, {"type": "message", "conversation_id": conversation_id, "content": "x" * 2001})
+    await flush()
+
+    assert types(owner) == ["subscribed", "error", "error", "error"]
+    assert owner.websocket.sent[-1]["conversation_id"] == conversation_id
+    assert owner.socket_id in connection_manager.active_connections[owner_id]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_read_frame_past_the_conversation_is_refused(connection_manager, db, monkeypatch):
+    from routers import ws
+
+    monkeypatch.setattr(ws, "manager", connection_manager)
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    reader = await connect(connection_manager, caretaker_id)
+    await ws.handle_frame(reader, {"type": "subscribe", "conversation_id": conversation_id})
+
+    await ws.handle_frame(reader, {"type": "read", "conversation_id": conversation_id, "message_id": 10 ** 9})
+    await flush()
+
+    assert types(reader) == ["subscribed", "error"]
+    assert reader.websocket.sent[-1]["detail"] == "Message non trouvé dans cette conversation"
+    await connection_manager.shutdown()
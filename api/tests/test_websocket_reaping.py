@@ -0,0 +1,68 @@
+"""Tests du ping serveur, de la fermeture des sockets silencieuses et du plafond par utilisateur."""
+import asyncio
+
+import pytest
+
+from services.monitoring_service import monitoring_service
+from conftest import FakeWebSocket
+
+# Codes de services.websocket.ws_manager (importé après la configuration email de test)
+IDLE_CLOSE_CODE, CONNECTION_LIMIT_CLOSE_CODE = 1001, 1008
+
+
+class ClosableWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.close_code = None
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def connect(manager, user_id, socket_id):
+    return await manager.connect(ClosableWebSocket(), user_id, socket_id)
+
+
+@pytest.mark.asyncio
+async def test_silent_socket_is_pinged_then_closed(connection_manager):
+    connection_manager.ping_interval, connection_manager.idle_timeout = 0.05, 0.2
+    silent, alive = await connect(connection_manager, 1, "silent"), await connect(connection_manager, 2, "alive")
+    await connection_manager.join_conversation(silent, 7)
+    await connection_manager.join_conversation(alive, 7)
+
+    for _ in range(8):
+        await asyncio.sleep(0.05)
+        alive.touch()  # Le client répond aux pings
+
+    assert {"type": "ping"} in silent.websocket.sent
+    assert silent.websocket.close_code == IDLE_CLOSE_CODE
+    assert alive.websocket.close_code is None
+    assert list(connection_manager.active_connections) == [2]
+    assert {"type": "user_offline", "user_id": 1} in alive.websocket.sent
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_connection_cap_closes_oldest_socket(connection_manager):
+    connection_manager.max_connections_per_user = 2
+    first = await connect(connection_manager, 1, "first")
+    second = await connect(connection_manager, 1, "second")
+    await asyncio.sleep(0.01)
+    second.touch()
+    third = await connect(connection_manager, 1, "third")
+
+    assert first.websocket.close_code == CONNECTION_LIMIT_CLOSE_CODE
+    assert set(connection_manager.active_connections[1]) == {"second", "third"}
+    assert third.websocket.close_code is None
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_connection_record_is_compact(connection_manager):
+    connection = await connect(connection_manager, 1, "socket")
+    await connection_manager.join_conversation(connection, 7)
+    await connection_manager.sweep_connections()
+
+    assert not hasattr(connection, "__dict__")
+    assert 0 < monitoring_service.websocket_connection_memory._value.get() < 4096
+    await connection_manager.shutdown()
@@ -0,0 +1,142 @@
+"""Tests des numéros de séquence par conversation et de la reprise des flux WebSocket."""
+import asyncio
+
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+
+from crud.message import message as message_crud
+from schemas.message import MessageBatchItem
+from services.websocket.replay_log import InMemoryReplayLog, RedisReplayLog
+from conftest import REDIS_HOST, REDIS_PORT, connect, create_conversation, create_conversation_with, events, flush, redis_available
+
+
+async def check_log(log):
+    for seq in (1, 2, 4, 3, 5):  # Commits diffusés dans le désordre
+        await log.append(7, seq, f'{{"seq":{seq}}}', exclude_user_id=seq)
+    assert [entry[0] for entry in await log.since(7, 1)] == [3, 4, 5]  # Taille 3
+    assert (await log.since(7, 4))[0] == (5, '{"seq":5}', 5)
+    assert await log.since(8, 0) == []
+
+
+@pytest.mark.asyncio
+async def test_in_memory_replay_log_keeps_last_events_in_order():
+    await check_log(InMemoryReplayLog(size=3))
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not redis_available(), reason="Redis local indisponible")
+async def test_redis_replay_log_keeps_last_events_in_order():
+    client = AsyncRedis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    await client.delete("replay:7")
+    try:
+        await check_log(RedisReplayLog(size=3, redis_client=client))
+    finally:
+        await client.delete("replay:7")
+        await client.aclose()
+
+
+def test_sequence_numbers_are_contiguous_per_conversation(db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_id, _, _ = create_conversation_with(db, "other")
+    items = [MessageBatchItem(content=f"Message {i}", client_msg_id=f"c{i}") for i in range(3)]
+    messages, created = message_crud.create_messages(db, conversation_id=conversation_id, messages=items, sender_id=owner_id)
+    assert [db_message.seq for db_message in messages] == [1, 2, 3]
+
+    # Un renvoi ne consomme pas de numéro ; une autre conversation a sa propre suite
+    _, created = message_crud.create_messages(db, conversation_id=conversation_id, messages=items[:1], sender_id=owner_id)
+    assert created == []
+    messages, _ = message_crud.create_messages(
+        db, conversation_id=other_id, messages=[MessageBatchItem(content="Bonjour", client_msg_id="x")], sender_id=None
+    )
+    assert messages[0].seq == 1
+    assert message_crud.allocate_seq(db, conversation_id) == 4
+    assert message_crud.get_last_seq(db, conversation_id) == 4
+
+
+async def miss_events(manager, db):
+    """Le lecteur reçoit les messages 1-2, se déconnecte, puis manque 3, 4 et un accusé de lecture"""
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    writer, reader = await connect(manager, owner_id), await connect(manager, caretaker_id)
+    await manager.join_conversation(writer, conversation_id)
+    await manager.join_conversation(reader, conversation_id)
+    for i in (1, 2):
+        await manager.handle_message(owner_id, conversation_id, f"Message {i}")
+    await flush()
+    assert events(reader) == [("new_message", 1), ("new_message", 2)]
+
+    await manager.disconnect(caretaker_id, reader.socket_id)
+    for i in (3, 4):
+        await manager.handle_message(owner_id, conversation_id, f"Message {i}")
+    await manager.handle_read(caretaker_id, conversation_id)  # Lu depuis un autre appareil
+    return conversation_id, owner_id, caretaker_id
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_gap_from_log(connection_manager, db):
+    conversation_id, _, caretaker_id = await miss_events(connection_manager, db)
+
+    reader = await connect(connection_manager, caretaker_id, "reconnected")
+    await connection_manager.resume_conversation(reader, conversation_id, last_seq=2)
+    await flush()
+    # L'accusé du lecteur lui-même (seq 5) n'est pas rejoué
+    assert events(reader) == [("new_message", 3), ("new_message", 4), ("resumed", 5)]
+    assert reader.websocket.sent[-1]["source"] == "log"
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_falls_back_to_database(connection_manager, db):
+    conversation_id, owner_id, caretaker_id = await miss_events(connection_manager, db)
+    connection_manager.replay_log = InMemoryReplayLog()  # Worker redémarré
+
+    reader = await connect(connection_manager, caretaker_id, "reconnected")
+    await connection_manager.resume_conversation(reader, conversation_id, last_seq=2)
+    await flush()
+    assert events(reader) == [("new_message", 3), ("new_message", 4), ("resumed", 5)]
+    resumed = reader.websocket.sent[-1]
+    assert resumed["source"] == "database"
+    assert resumed["read_watermarks"][str(caretaker_id)] == reader.websocket.sent[1]["message"]["id"]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_live_events_during_resume_follow_the_replay(connection_manager, db, monkeypatch):
+    conversation_id, owner_id, caretaker_id = await miss_events(connection_manager, db)
+    reading, release = asyncio.Event(), asyncio.Event()
+    since = connection_manager.replay_log.since
+
+    async def slow_since(*args):
+        reading.set()
+        await release.wait()
+        return await since(*args)
+
+    monkeypatch.setattr(connection_manager.replay_log, "since", slow_since)
+    reader = await connect(connection_manager, caretaker_id, "reconnected")
+    resuming = asyncio.create_task(connection_manager.resume_conversation(reader, conversation_id, last_seq=2))
+    await reading.wait()
+    await connection_manager.handle_message(owner_id, conversation_id, "En direct")
+    await flush()
+    assert events(reader) == []  # Retenu jusqu'à la fin de la reprise (le badge suit le flux utilisateur)
+
+    release.set()
+    await resuming
+    await flush()
+    assert events(reader) == [("new_message", 3), ("new_message", 4), ("resumed", 5), ("new_message", 6)]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_large_gap_asks_for_http_resync(connection_manager, db, monkeypatch):
+    from services.websocket import ws_manager
+
+    conversation_id, _, caretaker_id = await miss_events(connection_manager, db)
+    connection_manager.replay_log = InMemoryReplayLog()
+    monkeypatch.setattr(ws_manager, "WEBSOCKET_REPLAY_MAX_MESSAGES", 2)
+
+    reader = await connect(connection_manager, caretaker_id, "reconnected")
+    await connection_manager.resume_conversation(reader, conversation_id, last_seq=0)
+    await flush()
+    assert reader.websocket.sent == [{
+        "type": "resumed", "conversation_id": conversation_id, "source": "none", "complete": False, "seq": 5
+    }]
+    await connection_manager.shutdown()
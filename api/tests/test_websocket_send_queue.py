@@ -0,0 +1,100 @@
+"""Tests des files d'envoi WebSocket et de la politique des clients lents."""
+import asyncio
+import json
+
+import pytest
+
+from services.monitoring_service import monitoring_service
+from services.websocket.connection import ClientConnection, SLOW_CONSUMER_CLOSE_CODE
+from conftest import FakeWebSocket, connect, flush
+
+
+class SlowWebSocket(FakeWebSocket):
+    """Socket dont les envois restent bloqués jusqu'à `release`"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.close_code = None
+
+    async def send_text(self, text):
+        await self.release.wait()
+        await super().send_text(text)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def dropped(reason):
+    return monitoring_service.websocket_dropped_frames.labels(reason=reason)._value.get()
+
+
+def frame(event_type, **fields):
+    return json.dumps({"type": event_type, **fields})
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_delay_other_participants(connection_manager):
+    fast = await connect(connection_manager, 1)
+    slow = SlowWebSocket()
+    slow_connection = await connection_manager.connect(slow, 2, "socket-2")
+    await connection_manager.join_conversation(fast, 7)
+    await connection_manager.join_conversation(slow_connection, 7)
+
+    for i in range(3):
+        await asyncio.wait_for(
+            connection_manager.broadcast_to_conversation({"type": "new_message", "message": {"id": i}}, 7),
+            timeout=1
+        )
+    await flush()
+
+    assert [event["message"]["id"] for event in fast.websocket.sent] == [0, 1, 2]
+    assert slow.sent == []
+    slow.release.set()
+    await asyncio.sleep(0.01)
+    assert [event["message"]["id"] for event in slow.sent] == [0, 1, 2]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_typing_frames_are_dropped_before_disconnecting():
+    websocket = SlowWebSocket()
+    connection = ClientConnection(websocket, user_id=1, socket_id="a", max_size=4)
+    connection.start()
+    typing_dropped, slow_dropped = dropped("typing"), dropped("slow_consumer")
+
+    assert connection.enqueue(frame("new_message", id=1))
+    await flush()  # La tâche d'écriture est bloquée sur le premier envoi
+    assert connection.enqueue(frame("typing_status"), droppable=True)
+    assert connection.enqueue(frame("typing_status"), droppable=True)
+    assert not connection.enqueue(frame("typing_status"), droppable=True)  # File à moitié pleine
+    assert connection.enqueue(frame("new_message", id=2))
+    assert connection.enqueue(frame("new_message", id=3))
+    assert connection.enqueue(frame("new_message", id=4))  # File pleine : les frappes en attente sautent
+    assert connection.depth == 3
+    assert dropped("typing") == typing_dropped + 3
+
+    assert connection.enqueue(frame("new_message", id=5))
+    assert not connection.enqueue(frame("new_message", id=6))  # Rien à jeter : déconnexion
+    assert dropped("slow_consumer") == slow_dropped + 1
+
+    websocket.release.set()
+    await asyncio.sleep(0.01)
+    assert websocket.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert connection.closed
+    assert [event["id"] for event in websocket.sent] == [1]
+    await connection.stop()
+
+
+@pytest.mark.asyncio
+async def test_stalled_send_closes_connection():
+    websocket = SlowWebSocket()
+    connection = ClientConnection(websocket, user_id=1, socket_id="a", send_timeout=0.05)
+    connection.start()
+
+    connection.enqueue(frame("new_message", id=1))
+    await asyncio.sleep(0.2)
+
+    assert websocket.close_code == SLOW_CONSUMER_CLOSE_CODE
+    assert not connection.enqueue(frame("new_message", id=2))
+    await connection.stop()
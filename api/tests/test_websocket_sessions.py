@@ -0,0 +1,106 @@
+"""Tests des sessions base courtes des WebSockets (aucune connexion gardée par une socket)."""
+import asyncio
+
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models.user import User
+from models.user_status import UserPresence, UserStatus
+from services.monitoring_service import monitoring_service
+from utils.security import create_access_token
+from utils.settings import WEBSOCKET_DB_WORKERS
+from conftest import FakeWebSocket
+
+IDLE_SOCKETS = 500
+POOL_SIZE, MAX_OVERFLOW = 5, 10  # Valeurs par défaut de SQLAlchemy
+
+
+class IdleWebSocket(FakeWebSocket):
+    """Socket qui n'envoie rien jusqu'à la déconnexion du client"""
+
+    def __init__(self, hang_up):
+        super().__init__()
+        self.hang_up = hang_up
+        self.close_code = None
+
+    async def receive_json(self):
+        await self.hang_up.wait()
+        raise WebSocketDisconnect(1000)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def pending_db_operations():
+    return monitoring_service.websocket_db_pending._value.get()
+
+
+@pytest.fixture
+def pooled_engine(tmp_path):
+    """Base SQLite fichier avec le pool par défaut (QueuePool 5 + 10)"""
+    from utils.database import Base
+    from scripts.upgrade_schema import upgrade_schema
+    import models  # noqa: F401
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'soak.db'}",
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=1
+    )
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_idle_sockets_hold_no_pooled_connection(connection_manager, pooled_engine, monkeypatch):
+    from routers import ws
+
+    monkeypatch.setattr(ws, "manager", connection_manager)
+    connection_manager.session_factory = sessionmaker(bind=pooled_engine)
+    with connection_manager.session_factory() as db:
+        users = [User(email=f"idle{i}@example.com", nom="Martin", prenom=f"Julie {i}") for i in range(IDLE_SOCKETS)]
+        db.add_all(users)
+        db.commit()
+        tokens = [create_access_token({"sub": str(user.id)}) for user in users]
+
+    peak = {"in_use": 0}
+
+    @event.listens_for(pooled_engine, "checkout")
+    def track_peak(*args):
+        peak["in_use"] = max(peak["in_use"], pooled_engine.pool.checkedout())
+
+    hang_up = asyncio.Event()
+    sockets = [IdleWebSocket(hang_up) for _ in tokens]
+    endpoints = [
+        asyncio.create_task(ws.multiplexed_websocket_endpoint(websocket, token=token))
+        for websocket, token in zip(sockets, tokens)
+    ]
+    for _ in range(300):
+        if len(connection_manager.active_connections) == IDLE_SOCKETS and not pending_db_operations():
+            break
+        await asyncio.sleep(0.05)
+    assert len(connection_manager.active_connections) == IDLE_SOCKETS
+    assert pending_db_operations() == 0
+
+    # Les sockets ouvertes ne gardent aucune connexion : une requête HTTP en obtient une aussitôt
+    assert pooled_engine.pool.checkedout() == 0
+    with pooled_engine.connect() as conn:
+        # La présence n'est écrite en base que par lots
+        assert conn.exec_driver_sql("SELECT count(*) FROM user_presence").scalar() == 0
+
+    hang_up.set()
+    await asyncio.wait_for(asyncio.gather(*endpoints), timeout=60)
+
+    assert connection_manager.active_connections == {}
+    assert pooled_engine.pool.checkedout() == 0
+    assert peak["in_use"] <= WEBSOCKET_DB_WORKERS < POOL_SIZE + MAX_OVERFLOW
+    assert all(websocket.close_code is None for websocket in sockets)
+    await connection_manager.flush_presence()
+    with connection_manager.session_factory() as db:
+        assert db.query(UserPresence).filter(UserPresence.status == UserStatus.OFFLINE).count() == IDLE_SOCKETS
+    await connection_manager.shutdown()
@@ -0,0 +1,75 @@
+"""Tests de l'écriture groupée des messages WebSocket."""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from services.websocket.write_coalescer import MessageWriteCoalescer
+from conftest import connect, create_conversation, create_conversation_with, events, flush
+
+WINDOW = 0.05
+
+
+@pytest.fixture
+def commits(connection_manager):
+    """Fenêtre d'écriture groupée active ; compte les commits des sessions WebSocket"""
+    connection_manager.writes = MessageWriteCoalescer(connection_manager.run_in_session, window=WINDOW)
+    count = [0]
+
+    @event.listens_for(connection_manager.session_factory, "after_commit")
+    def count_commit(session):
+        count[0] += 1
+
+    yield count
+    event.remove(connection_manager.session_factory, "after_commit", count_commit)
+
+
+@pytest.mark.asyncio
+async def test_burst_is_written_in_one_commit(connection_manager, commits, db):
+    conversation_id, owner_id, caretaker_id = create_conversation(db)
+    other_id, other_sender_id, _ = create_conversation_with(db, "other")
+    reader = await connect(connection_manager, caretaker_id)
+    await connection_manager.join_conversation(reader, conversation_id)
+
+    sent = await asyncio.gather(
+        *(
+            connection_manager.handle_message(user_id, conversation_id, f"Message {i}", client_msg_id=f"c{i}")
+            for i, user_id in enumerate([owner_id, caretaker_id] * 3)
+        ),
+        connection_manager.handle_message(other_sender_id, other_id, "Ailleurs")
+    )
+    await flush()
+
+    assert commits[0] == 1
+    assert [db_message.seq for db_message in sent] == [1, 2, 3, 4, 5, 6, 1]
+    assert len({db_message.id for db_message in sent}) == 7
+    assert [seq for kind, seq in events(reader) if kind == "new_message"] == [1, 2, 3, 4, 5, 6]
+    acks = [event for event in reader.websocket.sent if event["type"] == "messages_ack"]
+    assert [ack["messages"][0]["id"] for ack in acks] == [sent[i].id for i in (1, 3, 5)]
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_resent_message_in_the_same_batch_is_created_once(connection_manager, commits, db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    first, resent = await asyncio.gather(
+        connection_manager.handle_message(owner_id, conversation_id, "Bonjour", client_msg_id="c1"),
+        connection_manager.handle_message(owner_id, conversation_id, "Bonjour", client_msg_id="c1")
+    )
+    assert first.id == resent.id
+    assert first.seq == 1
+    await connection_manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_does_not_fail_the_batch(connection_manager, commits, db):
+    conversation_id, owner_id, _ = create_conversation(db)
+    sent, missing = await asyncio.gather(
+        connection_manager.handle_message(owner_id, conversation_id, "Bonjour"),
+        connection_manager.handle_message(owner_id, 999, "Perdu"),
+        return_exceptions=True
+    )
+    assert sent.seq == 1
+    assert isinstance(missing, ValueError)
+    assert "Conversation non trouvée" in str(missing)
+    await connection_manager.shutdown()
@@ -1,7 +1,7 @@
 from .photo_validators import verify_photo_list, validate_photo_response
 from .care_validators import validate_care_response
 from .message_validators import validate_message_response, validate_messages_list_response, validate_unread_count_response
-from .conversation_validators import validate_conversation_response
+from .conversation_validators import validate_conversation_response, validate_inbox_response
 from .advice_validators import validate_advice_response
 
 __all__ = [
@@ -12,5 +12,6 @@ __all__ = [
     'validate_messages_list_response',
     'validate_unread_count_response',
     'validate_conversation_response',
+    'validate_inbox_response',
     'validate_advice_response',
 ] 
\ No newline at end of file
@@ -39,4 +39,31 @@ def validate_conversation_response(response, expected_participants_count=None, e
         assert data["type"] == conversation_type, \
             f"Type de conversation incorrect. Attendu: {conversation_type}, Reçu: {data['type']}"
     
-    return True 
\ No newline at end of file
+    return True 
+def validate_inbox_response(response, conversation_id, expected_last_content=None, expected_unread_count=None):
+    """Valide la boîte de réception et la conversation attendue"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    assert isinstance(data, list), "La réponse devrait être une liste"
+    
+    conversation = next((c for c in data if c["id"] == int(conversation_id)), None)
+    assert conversation is not None, f"La conversation {conversation_id} est absente de la boîte de réception"
+    
+    required_fields = ["id", "type", "related_id", "created_at", "updated_at", "unread_count",
+                       "last_message", "participants", "plant_info", "plant_care_info"]
+    for field in required_fields:
+        assert field in conversation, f"Le champ {field} est manquant dans la conversation"
+    
+    assert len(conversation["participants"]) >= 1, "La conversation devrait avoir au moins un autre participant"
+    
+    if expected_last_content is not None:
+        assert conversation["last_message"] is not None, "Le dernier message est manquant"
+        assert conversation["last_message"]["content"] == expected_last_content, \
+            f"Dernier message incorrect. Attendu: {expected_last_content}, Reçu: {conversation['last_message']['content']}"
+    
+    if expected_unread_count is not None:
+        assert conversation["unread_count"] == int(expected_unread_count), \
+            f"Nombre de non lus incorrect. Attendu: {expected_unread_count}, Reçu: {conversation['unread_count']}"
+    
+    return True
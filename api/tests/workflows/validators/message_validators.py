@@ -408,4 +408,117 @@ def validate_read_status_response(response):
     assert "status" in data, "La réponse devrait contenir un statut"
     assert data["status"] == "success", f"Le statut devrait être 'success', mais est '{data.get('status')}'"
     
-    return True 
\ No newline at end of file
+    return True 
+def validate_history_response(response, page_size, expected_first_content=None, expect_next_cursor=None, expect_prev_cursor=None):
+    """Valide une page d'historique (mode page ou mode curseur)"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    required_fields = ["messages", "page_size", "has_more", "next_cursor", "prev_cursor", "total_messages"]
+    for field in required_fields:
+        assert field in data, f"Le champ {field} est manquant"
+    
+    assert len(data["messages"]) <= int(page_size), "Trop de messages retournés"
+    for message in data["messages"]:
+        validate_message_structure(message)
+    
+    if expected_first_content is not None:
+        assert data["messages"], "La page ne devrait pas être vide"
+        assert data["messages"][0]["content"] == expected_first_content, \
+            f"Premier message incorrect. Attendu: {expected_first_content}, Reçu: {data['messages'][0]['content']}"
+    
+    if expect_next_cursor is not None:
+        assert (data["next_cursor"] is not None) == expect_next_cursor, "Curseur suivant inattendu"
+        assert data["has_more"] == expect_next_cursor, "Indicateur has_more incorrect"
+    
+    if expect_prev_cursor is not None:
+        assert (data["prev_cursor"] is not None) == expect_prev_cursor, "Curseur précédent inattendu"
+    
+    return True
+
+def validate_read_receipts_response(response, message_id, expected_reader_id=None):
+    """Valide les accusés de lecture d'un message"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    for field in ["conversation_id", "participants", "message_id", "read_by"]:
+        assert field in data, f"Le champ {field} est manquant"
+    
+    assert data["message_id"] == int(message_id), "Message des accusés incorrect"
+    for participant in data["participants"]:
+        assert "user_id" in participant, "Le champ user_id est manquant"
+        assert "last_read_message_id" in participant, "Le champ last_read_message_id est manquant"
+    
+    if expected_reader_id is not None:
+        assert int(expected_reader_id) in data["read_by"], \
+            f"L'utilisateur {expected_reader_id} devrait avoir lu le message, lecteurs: {data['read_by']}"
+    
+    return True
+
+def validate_sync_response(response, conversation_id=None, min_messages=None):
+    """Valide une réponse de synchronisation différentielle"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    for field in ["messages", "read_watermarks", "conversations", "has_more", "next_token"]:
+        assert field in data, f"Le champ {field} est manquant"
+    
+    assert data["next_token"], "Le jeton de synchronisation est manquant"
+    for message in data["messages"]:
+        validate_message_structure(message)
+    
+    if min_messages is not None:
+        assert len(data["messages"]) >= int(min_messages), \
+            f"Au moins {min_messages} messages attendus, reçu {len(data['messages'])}"
+    
+    if conversation_id is not None:
+        conversation_ids = [conversation["id"] for conversation in data["conversations"]]
+        assert int(conversation_id) in conversation_ids, \
+            f"La conversation {conversation_id} devrait être synchronisée"
+    
+    return True
+
+def validate_batch_response(response, expected_count, expected_duplicates=None):
+    """Valide la réponse d'un envoi groupé de messages"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    assert "messages" in data, "Le champ messages est manquant"
+    assert "duplicates" in data, "Le champ duplicates est manquant"
+    assert len(data["messages"]) == int(expected_count), \
+        f"{expected_count} messages attendus, reçu {len(data['messages'])}"
+    
+    for message in data["messages"]:
+        validate_message_structure(message)
+        assert message["client_msg_id"], "Chaque message devrait porter son client_msg_id"
+    
+    if expected_duplicates is not None:
+        expected = [item for item in expected_duplicates.split(",") if item]
+        assert sorted(data["duplicates"]) == sorted(expected), \
+            f"Doublons attendus: {expected}, reçus: {data['duplicates']}"
+    
+    return True
+
+def validate_search_response(response, expected_count=None, expected_term=None, expect_next_cursor=None):
+    """Valide une page de résultats de recherche"""
+    assert response.status_code == 200
+    data = response.json()
+    
+    assert "results" in data, "Le champ results est manquant"
+    assert "next_cursor" in data, "Le champ next_cursor est manquant"
+    
+    for result in data["results"]:
+        validate_message_structure(result)
+        assert "snippet" in result, "Le champ snippet est manquant"
+        if expected_term is not None:
+            assert f"<mark>{expected_term}</mark>".lower() in result["snippet"].lower(), \
+                f"Le terme {expected_term} devrait être surligné: {result['snippet']}"
+    
+    if expected_count is not None:
+        assert len(data["results"]) == int(expected_count), \
+            f"{expected_count} résultats attendus, reçu {len(data['results'])}"
+    
+    if expect_next_cursor is not None:
+        assert (data["next_cursor"] is not None) == expect_next_cursor, "Curseur suivant inattendu"
+    
+    return True
@@ -0,0 +1,40 @@
+"""Curseurs opaques pour la pagination par clé."""
+import base64
+import json
+from typing import Any, Dict, Iterable, Optional
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    """Encode un curseur opaque transmis tel quel par les clients"""
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Décode un curseur produit par `encode_cursor`
+
+    Raises:
+        ValueError: Si le curseur est invalide
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except Exception:
+        raise ValueError("Curseur invalide")
+    if not isinstance(payload, dict):
+        raise ValueError("Curseur invalide")
+    return payload
+
+def decode_id_cursor(cursor: str, keys: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Décode un curseur de position dont les clés `keys`, si présentes, sont des IDs
+
+    Raises:
+        ValueError: Si le curseur est invalide ou si un ID n'est pas un entier positif
+    """
+    payload = decode_cursor(cursor)
+    ids = {}
+    for key in keys:
+        value = payload.get(key)
+        # bool est un int en Python : refusé explicitement
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value <= 0):
+            raise ValueError("Curseur invalide")
+        ids[key] = value
+    return ids
@@ -0,0 +1,60 @@
+"""Exécution des accès base synchrones hors de la boucle d'événements."""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from sqlalchemy.orm import Session
+
+from services.monitoring_service import monitoring_service
+from utils.settings import WEBSOCKET_DB_WORKERS
+
+T = TypeVar("T")
+
+# Pool borné : au plus `WEBSOCKET_DB_WORKERS` connexions prises au pool SQLAlchemy
+_executor = ThreadPoolExecutor(max_workers=WEBSOCKET_DB_WORKERS, thread_name_prefix="ws-db")
+
+async def run_db(func: Callable[..., T], *args, **kwargs) -> T:
+    """Exécute une fonction d'accès base synchrone dans le pool dédié
+
+    Contrat :
+
+    - `func` fait tout son travail base (requêtes, commit, chargement des
+      attributs utilisés ensuite) et retourne des objets déjà chargés ;
+    - une même `Session` n'est jamais passée à deux appels simultanés :
+      chaque socket attend le résultat avant sa trame suivante ;
+    - au-delà de `WEBSOCKET_DB_WORKERS` appels en cours, les suivants
+      attendent un thread libre sans bloquer la boucle.
+    """
+    return await _run(func.__name__, functools.partial(func, *args, **kwargs))
+
+async def run_in_session(
+    session_factory: Callable[[], Session],
+    func: Callable[..., T],
+    *args,
+    **kwargs
+) -> T:
+    """Exécute `func(db, ...)` dans le pool avec une session ouverte pour ce seul appel
+
+    La session est fermée avant de rendre la main : sa connexion retourne au
+    pool, et les objets retournés sont détachés (attributs déjà chargés).
+    """
+    def call():
+        db = session_factory()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    return await _run(func.__name__, call)
+
+async def _run(operation: str, call: Callable[[], T]) -> T:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    monitoring_service.websocket_db_pending.inc()
+    try:
+        return await loop.run_in_executor(_executor, call)
+    finally:
+        monitoring_service.websocket_db_pending.dec()
+        monitoring_service.websocket_db_duration.labels(operation=operation).observe(time.perf_counter() - started)
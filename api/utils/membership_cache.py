@@ -0,0 +1,69 @@
+"""Cache en mémoire de l'appartenance des utilisateurs aux conversations."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from services.monitoring_service import monitoring_service
+from utils.settings import MEMBERSHIP_CACHE_MAX_ENTRIES, MEMBERSHIP_CACHE_NEGATIVE_TTL_SECONDS
+
+class MembershipCache:
+    """Réponses de `is_participant` par (user_id, conversation_id), une instance par worker
+
+    Les participants d'une conversation ne sont ajoutés que par
+    `create_conversation`, qui invalide leurs entrées : une appartenance
+    connue reste valable. Un refus expire après `negative_ttl` secondes, le
+    temps qu'une conversation créée par un autre worker soit visible. Les
+    entrées les moins récemment utilisées sont évincées au-delà de
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MEMBERSHIP_CACHE_MAX_ENTRIES,
+        negative_ttl: float = MEMBERSHIP_CACHE_NEGATIVE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        # {(user_id, conversation_id): échéance monotone (None : membre)}
+        self._entries: "OrderedDict[Tuple[int, int], Optional[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, conversation_id: int) -> Optional[bool]:
+        """Appartenance connue, ou None s'il faut la lire en base"""
+        key = (user_id, conversation_id)
+        with self._lock:
+            if key in self._entries:
+                expires_at = self._entries[key]
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    monitoring_service.membership_cache_requests.labels(result="hit").inc()
+                    return expires_at is None
+                del self._entries[key]
+        monitoring_service.membership_cache_requests.labels(result="miss").inc()
+        return None
+
+    def set(self, user_id: int, conversation_id: int, is_member: bool) -> None:
+        with self._lock:
+            self._entries[(user_id, conversation_id)] = None if is_member else time.monotonic() + self.negative_ttl
+            self._entries.move_to_end((user_id, conversation_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            monitoring_service.membership_cache_entries.set(len(self._entries))
+
+    def invalidate(self, conversation_id: int, user_ids: Iterable[int]) -> None:
+        """Oublie les entrées de participants ajoutés à une conversation"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop((user_id, conversation_id), None)
+            monitoring_service.membership_cache_entries.set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            monitoring_service.membership_cache_entries.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+membership_cache = MembershipCache()
@@ -0,0 +1,58 @@
+"""Format de stockage compressé des messages archivés (table `message_archives`)."""
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import orjson
+
+ARCHIVE_COMPRESSION_LEVEL = 6
+ARCHIVE_CACHE_SIZE = 32  # archives décompressées gardées en mémoire
+
+def pack_messages(rows: List[Tuple]) -> bytes:
+    """Compresse des lignes (content, id, sender_id, conversation_id, created_at, updated_at, client_msg_id)
+
+    L'ID de conversation, porté par la ligne d'archive, n'est pas répété.
+    """
+    payload = [
+        [content, message_id, sender_id, created_at, updated_at, client_msg_id]
+        for content, message_id, sender_id, _, created_at, updated_at, client_msg_id in rows
+    ]
+    return zlib.compress(orjson.dumps(payload), ARCHIVE_COMPRESSION_LEVEL)
+
+def unpack_messages(payload: bytes, conversation_id: int) -> List[Tuple]:
+    """Décompresse une archive en lignes au format de `pack_messages`"""
+    return [
+        (
+            content,
+            message_id,
+            sender_id,
+            conversation_id,
+            datetime.fromisoformat(created_at),
+            datetime.fromisoformat(updated_at),
+            client_msg_id
+        )
+        for content, message_id, sender_id, created_at, updated_at, client_msg_id in orjson.loads(zlib.decompress(payload))
+    ]
+
+class ArchiveCache:
+    """Cache LRU des archives décompressées, invalidé par la date d'archivage"""
+
+    def __init__(self, max_size: int = ARCHIVE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[datetime, List[Tuple]]]" = OrderedDict()
+
+    def get(self, conversation_id: int, archived_at: datetime) -> Optional[List[Tuple]]:
+        entry = self._entries.get(conversation_id)
+        if entry is None or entry[0] != archived_at:
+            return None
+        self._entries.move_to_end(conversation_id)
+        return entry[1]
+
+    def put(self, conversation_id: int, archived_at: datetime, rows: List[Tuple]) -> None:
+        self._entries[conversation_id] = (archived_at, rows)
+        self._entries.move_to_end(conversation_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+archive_cache = ArchiveCache()
@@ -0,0 +1,141 @@
+"""Tampon en mémoire des derniers messages des conversations actives."""
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from services.monitoring_service import monitoring_service
+from utils.settings import MESSAGE_BUFFER_SIZE, MESSAGE_BUFFER_MAX_CONVERSATIONS, MESSAGE_BUFFER_MAX_BYTES
+
+ROW_OVERHEAD_BYTES = 400  # tuple, dates et entiers d'une ligne, hors contenu
+
+def _row_size(row: Tuple) -> int:
+    return ROW_OVERHEAD_BYTES + len(row[0])
+
+class _BufferEntry:
+    __slots__ = ("rows", "message_count", "complete", "size")
+
+    def __init__(self, rows: Deque[Tuple], message_count: int, complete: bool):
+        self.rows = rows  # du plus ancien au plus récent
+        self.message_count = message_count
+        self.complete = complete  # Tout l'historique de la conversation est présent
+        self.size = sum(_row_size(row) for row in rows)
+
+class RecentMessageBuffer:
+    """Derniers messages (lignes `MESSAGE_COLUMNS`) des conversations récemment actives
+
+    Chaque worker garde ses propres tampons : une entrée n'est servie que si
+    elle correspond au résumé de la conversation (dernier message et nombre
+    de messages). Un message écrit par un autre worker rend donc l'entrée
+    obsolète au lieu de servir une page incomplète. Les conversations les
+    moins récemment utilisées sont évincées au-delà de `max_conversations`
+    ou de `max_bytes` (estimation).
+    """
+
+    def __init__(
+        self,
+        size: int = MESSAGE_BUFFER_SIZE,
+        max_conversations: int = MESSAGE_BUFFER_MAX_CONVERSATIONS,
+        max_bytes: int = MESSAGE_BUFFER_MAX_BYTES
+    ):
+        self.size = size
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[int, _BufferEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        conversation_id: int,
+        last_message_id: Optional[int],
+        message_count: int,
+        limit: int
+    ) -> Optional[List[Tuple]]:
+        """Retourne les `limit` derniers messages, du plus récent au plus ancien, si le tampon est à jour"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if (
+                entry is None
+                or not entry.rows
+                or entry.rows[-1][1] != last_message_id
+                or entry.message_count != message_count
+                or (limit > len(entry.rows) and not entry.complete)
+            ):
+                monitoring_service.message_buffer_requests.labels(result="miss").inc()
+                return None
+            self._entries.move_to_end(conversation_id)
+            rows = list(entry.rows)
+        monitoring_service.message_buffer_requests.labels(result="hit").inc()
+        rows.reverse()
+        return rows[:limit]
+
+    def fill(self, conversation_id: int, rows: List[Tuple], message_count: int, complete: bool) -> None:
+        """Remplace le tampon par une première page lue en base (du plus récent au plus ancien)"""
+        if not rows or self.size <= 0:
+            return
+        kept = rows[:self.size]
+        entry = _BufferEntry(deque(reversed(kept), maxlen=self.size), message_count, complete and len(kept) == len(rows))
+        with self._lock:
+            self._discard(conversation_id)
+            self._entries[conversation_id] = entry
+            self.bytes += entry.size
+            self._evict()
+
+    def append(self, conversation_id: int, rows: List[Tuple]) -> None:
+        """Ajoute des messages créés par ce worker (du plus ancien au plus récent)
+
+        Sans entrée pour la conversation, rien n'est fait : la prochaine
+        lecture remplira le tampon.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            if entry.rows and rows[0][1] <= entry.rows[-1][1]:
+                # Écritures concurrentes arrivées dans le désordre
+                self._discard(conversation_id)
+                self._update_gauges()
+                return
+            self.bytes -= entry.size
+            for row in rows:
+                if len(entry.rows) == entry.rows.maxlen:
+                    # Le plus ancien message sort de l'anneau
+                    entry.size -= _row_size(entry.rows[0])
+                    entry.complete = False
+                entry.rows.append(row)
+                entry.size += _row_size(row)
+            entry.message_count += len(rows)
+            self.bytes += entry.size
+            self._entries.move_to_end(conversation_id)
+            self._evict()
+
+    def invalidate(self, conversation_id: int) -> None:
+        with self._lock:
+            self._discard(conversation_id)
+            self._update_gauges()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self._update_gauges()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, conversation_id: int) -> None:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_conversations or self.bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self.bytes -= entry.size
+        self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        monitoring_service.message_buffer_conversations.set(len(self._entries))
+        monitoring_service.message_buffer_bytes.set(self.bytes)
+
+message_buffer = RecentMessageBuffer()
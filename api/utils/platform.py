@@ -1,5 +1,5 @@
 from enum import Enum
-from fastapi import Request
+from starlette.requests import HTTPConnection
 
 class Platform(str, Enum):
     IOS = "ios"
@@ -7,8 +7,8 @@ class Platform(str, Enum):
     WEB = "web"
     UNKNOWN = "unknown"
 
-def detect_platform(request: Request) -> Platform:
-    """Détecte la plateforme à partir des headers de la requête"""
+def detect_platform(request: HTTPConnection) -> Platform:
+    """Détecte la plateforme à partir des headers de la requête ou de la WebSocket"""
     # Vérifier le header personnalisé X-Platform
     platform = request.headers.get("X-Platform")
     if platform:
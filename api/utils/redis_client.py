@@ -1,4 +1,6 @@
+from typing import Optional
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 from utils.settings import REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_USERNAME, REDIS_PASSWORD
 
 # Connexion à Redis avec les paramètres de configuration
@@ -13,4 +15,21 @@ redis_client = Redis(
 
 def get_redis_client() -> Redis:
     """Retourne une instance du client Redis"""
-    return redis_client 
\ No newline at end of file
+    return redis_client 
+
+# Client asynchrone (pub/sub WebSocket), créé à la première utilisation
+async_redis_client: Optional[AsyncRedis] = None
+
+def get_async_redis_client() -> AsyncRedis:
+    """Retourne le client Redis asynchrone partagé"""
+    global async_redis_client
+    if async_redis_client is None:
+        async_redis_client = AsyncRedis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            username=REDIS_USERNAME,
+            password=REDIS_PASSWORD,
+            decode_responses=True
+        )
+    return async_redis_client
@@ -56,9 +56,11 @@ async def get_current_active_user(
     """Vérifie que l'utilisateur est actif"""
     return current_user
 
-async def get_current_user_ws(token: str, db: Session) -> dict:
+def get_current_user_ws(token: str, db: Session) -> dict:
     """
     Authentifie un utilisateur via son token JWT pour les WebSockets
+
+    Synchrone : appelée hors de la boucle d'événements via `run_in_session`.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
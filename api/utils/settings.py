@@ -12,6 +12,17 @@ DEBUG_MODE = True  # Désactiver en production
 PROJECT_NAME = "A'rosa-je API"
 VERSION = "1.0.0"
 
+# Stockage des messages
+MESSAGE_ARCHIVE_AFTER_MONTHS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_MONTHS", "6"))  # après la fin de la garde
+MESSAGE_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "3"))  # partitions mensuelles créées à l'avance
+MESSAGE_PAGE_SIZE = 50  # messages par page d'historique par défaut
+# Derniers messages gardés par conversation : une page plus la ligne qui indique s'il en reste
+MESSAGE_BUFFER_SIZE = int(os.getenv("MESSAGE_BUFFER_SIZE", str(MESSAGE_PAGE_SIZE + 1)))
+MESSAGE_BUFFER_MAX_CONVERSATIONS = int(os.getenv("MESSAGE_BUFFER_MAX_CONVERSATIONS", "1000"))
+MESSAGE_BUFFER_MAX_BYTES = int(os.getenv("MESSAGE_BUFFER_MAX_BYTES", str(16 * 1024 * 1024)))  # par worker
+MEMBERSHIP_CACHE_MAX_ENTRIES = int(os.getenv("MEMBERSHIP_CACHE_MAX_ENTRIES", "100000"))  # couples (utilisateur, conversation) par worker
+MEMBERSHIP_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("MEMBERSHIP_CACHE_NEGATIVE_TTL_SECONDS", "30"))  # durée d'un refus en cache
+
 # Sécurité
 SECRET_KEY = os.getenv("SECRET_KEY", "root")  # À changer pour la prod
 ALGORITHM = "HS256"
@@ -24,6 +35,32 @@ REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 REDIS_USERNAME = os.getenv("REDIS_USERNAME")
 
+# Diffusion WebSocket entre workers : "memory" (un seul worker) ou "redis"
+WEBSOCKET_FANOUT_BACKEND = os.getenv("WEBSOCKET_FANOUT_BACKEND", "memory")
+WEBSOCKET_SEND_QUEUE_SIZE = int(os.getenv("WEBSOCKET_SEND_QUEUE_SIZE", "256"))  # trames en attente par socket
+WEBSOCKET_SEND_TIMEOUT = float(os.getenv("WEBSOCKET_SEND_TIMEOUT", "10"))  # secondes par trame
+WEBSOCKET_DB_WORKERS = int(os.getenv("WEBSOCKET_DB_WORKERS", "8"))  # threads des accès base WebSocket, sous la taille du pool
+WEBSOCKET_PING_INTERVAL_SECONDS = float(os.getenv("WEBSOCKET_PING_INTERVAL_SECONDS", "25"))  # ping envoyé à une socket silencieuse
+WEBSOCKET_IDLE_TIMEOUT_SECONDS = float(os.getenv("WEBSOCKET_IDLE_TIMEOUT_SECONDS", "70"))  # socket fermée sans trame reçue depuis ce délai
+WEBSOCKET_MAX_CONNECTIONS_PER_USER = int(os.getenv("WEBSOCKET_MAX_CONNECTIONS_PER_USER", "5"))  # au-delà, la socket la plus ancienne est fermée
+WEBSOCKET_REPLAY_LOG_SIZE = int(os.getenv("WEBSOCKET_REPLAY_LOG_SIZE", "200"))  # derniers événements gardés par conversation pour la reprise
+WEBSOCKET_REPLAY_LOG_CONVERSATIONS = int(os.getenv("WEBSOCKET_REPLAY_LOG_CONVERSATIONS", "1000"))  # conversations gardées en mémoire (backend memory)
+WEBSOCKET_REPLAY_LOG_TTL_SECONDS = int(os.getenv("WEBSOCKET_REPLAY_LOG_TTL_SECONDS", "3600"))  # durée de vie d'un journal inactif (backend redis)
+WEBSOCKET_REPLAY_MAX_MESSAGES = int(os.getenv("WEBSOCKET_REPLAY_MAX_MESSAGES", "500"))  # au-delà, le client se resynchronise en HTTP
+WEBSOCKET_WRITE_COALESCE_MS = float(os.getenv("WEBSOCKET_WRITE_COALESCE_MS", "0"))  # messages reçus dans cette fenêtre validés en un commit (0 : désactivé)
+WEBSOCKET_WRITE_COALESCE_MAX_BATCH = int(os.getenv("WEBSOCKET_WRITE_COALESCE_MAX_BATCH", "100"))  # écritures au plus par commit groupé
+WEBSOCKET_SLOW_DELIVERY_SECONDS = float(os.getenv("WEBSOCKET_SLOW_DELIVERY_SECONDS", "0.5"))  # livraison d'un message candidate au journal des lentes
+WEBSOCKET_SLOW_DELIVERY_SAMPLES = int(os.getenv("WEBSOCKET_SLOW_DELIVERY_SAMPLES", "10"))  # livraisons les plus lentes journalisées par période
+WEBSOCKET_SLOW_DELIVERY_LOG_SECONDS = float(os.getenv("WEBSOCKET_SLOW_DELIVERY_LOG_SECONDS", "60"))  # période du journal des livraisons lentes
+TYPING_TTL_SECONDS = int(os.getenv("TYPING_TTL_SECONDS", "30"))  # durée de vie d'un état « en train d'écrire »
+TYPING_DEBOUNCE_SECONDS = float(os.getenv("TYPING_DEBOUNCE_SECONDS", "3"))  # trames de frappe fusionnées dans cette fenêtre
+PRESENCE_TTL_SECONDS = int(os.getenv("PRESENCE_TTL_SECONDS", "60"))  # une socket sans battement depuis ce délai est hors ligne
+PRESENCE_HEARTBEAT_SECONDS = float(os.getenv("PRESENCE_HEARTBEAT_SECONDS", "20"))  # rafraîchissement des sockets locales
+PRESENCE_FLUSH_SECONDS = float(os.getenv("PRESENCE_FLUSH_SECONDS", "60"))  # écriture groupée de last_seen_at en base
+NOTIFICATION_DIGEST_SECONDS = float(os.getenv("NOTIFICATION_DIGEST_SECONDS", "120"))  # messages regroupés dans un même email
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "3"))  # tentatives d'envoi d'un email de notification
+NOTIFICATION_RETRY_SECONDS = float(os.getenv("NOTIFICATION_RETRY_SECONDS", "30"))  # délai avant la 1re nouvelle tentative, doublé ensuite
+
 # Configuration Email
 MAIL_USERNAME = os.getenv("MAIL_USERNAME")
 MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")